@@ -0,0 +1,118 @@
+const cluster = require('cluster');
+const os = require('os');
+const path = require('path');
+require('dotenv').config();
+
+const logger = require('./utils/logger');
+const clusterBus = require('./utils/clusterBus');
+const { createRateLimitHandlers } = require('./middleware/rateLimiter');
+
+// Runs server.js on every core. The primary holds state all workers share
+// (rate-limit counters), relays cache invalidations between them, restarts
+// workers that crash, and does a zero-downtime rolling restart on SIGHUP.
+const WORKERS = parseInt(process.env.CLUSTER_WORKERS) || os.cpus().length;
+const SHUTDOWN_TIMEOUT_MS = parseInt(process.env.CLUSTER_SHUTDOWN_TIMEOUT_MS) || 35000;
+const RESTART_BACKOFF_MAX_MS = parseInt(process.env.CLUSTER_RESTART_BACKOFF_MAX_MS) || 30000;
+// A worker that dies sooner than this after starting counts as a crash loop
+const MIN_UPTIME_MS = 10000;
+
+cluster.setupPrimary({ exec: path.join(__dirname, 'server.js') });
+clusterBus.attachPrimary(createRateLimitHandlers());
+
+let stopping = false;
+let restarting = false;
+let crashCount = 0;
+// Workers we asked to exit; their exit isn't a crash
+const retiring = new Set();
+const startedAt = new Map();
+
+function fork() {
+    const worker = cluster.fork();
+    startedAt.set(worker.id, Date.now());
+    return worker;
+}
+
+function retire(worker) {
+    retiring.add(worker.id);
+    return new Promise((resolve) => {
+        const timer = setTimeout(() => worker.process.kill('SIGKILL'), SHUTDOWN_TIMEOUT_MS);
+        worker.once('exit', () => {
+            clearTimeout(timer);
+            resolve();
+        });
+        if (worker.isConnected()) {
+            worker.send({ speakaiCluster: 'shutdown' });
+        } else {
+            worker.process.kill('SIGTERM');
+        }
+    });
+}
+
+function waitForListening(worker) {
+    return new Promise((resolve, reject) => {
+        const onListening = () => {
+            worker.removeListener('exit', onExit);
+            resolve();
+        };
+        const onExit = () => {
+            worker.removeListener('listening', onListening);
+            reject(new Error(`Worker ${worker.process.pid} exited before listening`));
+        };
+        worker.once('listening', onListening);
+        worker.once('exit', onExit);
+    });
+}
+
+cluster.on('exit', (worker, code, signal) => {
+    const uptime = Date.now() - (startedAt.get(worker.id) || 0);
+    startedAt.delete(worker.id);
+    if (retiring.delete(worker.id) || stopping) return;
+
+    crashCount = uptime < MIN_UPTIME_MS ? crashCount + 1 : 0;
+    const delay = crashCount > 0 ? Math.min(RESTART_BACKOFF_MAX_MS, 1000 * 2 ** (crashCount - 1)) : 0;
+    logger.error(`Worker ${worker.process.pid} died (${signal || code}), restarting in ${delay}ms`);
+    setTimeout(() => stopping || fork(), delay);
+});
+
+// Replace workers one at a time, each only once its successor is accepting
+// connections, so there is always capacity serving requests.
+async function rollingRestart() {
+    if (restarting || stopping) return;
+    restarting = true;
+    logger.info('Rolling restart of cluster workers...');
+
+    try {
+        for (const worker of Object.values(cluster.workers)) {
+            if (stopping) break;
+            if (!worker || retiring.has(worker.id)) continue;
+
+            const replacement = fork();
+            await waitForListening(replacement);
+            await retire(worker);
+        }
+        logger.info('Rolling restart complete');
+    } catch (error) {
+        logger.error('Rolling restart aborted:', error);
+    } finally {
+        restarting = false;
+    }
+}
+
+async function shutdown(reason) {
+    if (stopping) return;
+    stopping = true;
+    logger.info(`${reason} received. Draining ${Object.keys(cluster.workers).length} workers...`);
+
+    await Promise.all(Object.values(cluster.workers).filter(Boolean).map(retire));
+    logger.info('Cluster stopped');
+    process.exit(0);
+}
+
+process.on('SIGHUP', rollingRestart);
+process.on('SIGTERM', () => shutdown('SIGTERM'));
+process.on('SIGINT', () => shutdown('SIGINT'));
+
+logger.info(`Starting ${WORKERS} SpeakAI workers (primary ${process.pid})`);
+for (let i = 0; i < WORKERS; i++) {
+    fork();
+}
@@ -0,0 +1,45 @@
+const morgan = require('morgan');
+const logger = require('../utils/logger');
+
+function envFloat(name, fallback) {
+    const value = parseFloat(process.env[name]);
+    return Number.isNaN(value) ? fallback : value;
+}
+
+// Share of ordinary (fast, successful) requests that get an access log
+// line; errors and slow requests are always logged.
+const SAMPLE_RATE = envFloat('ACCESS_LOG_SAMPLE_RATE', 1);
+const SLOW_MS = parseInt(process.env.ACCESS_LOG_SLOW_MS) || 1000;
+
+const stats = {
+    logged: 0,
+    sampledOut: 0
+};
+
+function skip(req, res) {
+    const keep = res.statusCode >= 400
+        || parseFloat(morgan['response-time'](req, res)) >= SLOW_MS
+        || Math.random() < SAMPLE_RATE;
+
+    if (keep) {
+        stats.logged += 1;
+    } else {
+        stats.sampledOut += 1;
+    }
+    return !keep;
+}
+
+const accessLog = morgan('combined', { stream: logger.stream, skip });
+
+function getStats() {
+    return {
+        sampleRate: SAMPLE_RATE,
+        slowMs: SLOW_MS,
+        ...stats
+    };
+}
+
+module.exports = {
+    accessLog,
+    getStats
+};
@@ -1,13 +1,34 @@
 const jwt = require('jsonwebtoken');
-const User = require('../models/User');
+const { getPrincipal } = require('../services/principalCache');
 const logger = require('../utils/logger');
 
-const authMiddleware = async (req, res, next) => {
-    try {
+// Verifies the request's access token once and keeps the outcome on the
+// request, so the rate limiter (which runs first, to key on the user) and
+// authMiddleware share a single jwt.verify.
+function verifyRequestToken(req) {
+    if (!req.tokenVerification) {
         const authHeader = req.header('Authorization');
-        const token = authHeader && authHeader.startsWith('Bearer ') 
-            ? authHeader.substring(7) 
+        const token = authHeader && authHeader.startsWith('Bearer ')
+            ? authHeader.substring(7)
             : authHeader;
+        let payload = null;
+        let error = null;
+
+        if (token) {
+            try {
+                payload = jwt.verify(token, process.env.JWT_SECRET);
+            } catch (verifyError) {
+                error = verifyError;
+            }
+        }
+        req.tokenVerification = { token, payload, error };
+    }
+    return req.tokenVerification;
+}
+
+const authMiddleware = async (req, res, next) => {
+    try {
+        const { token, payload, error } = verifyRequestToken(req);
 
         if (!token) {
             return res.status(401).json({
@@ -17,9 +38,12 @@ const authMiddleware = async (req, res, next) => {
             });
         }
 
-        const decoded = jwt.verify(token, process.env.JWT_SECRET);
+        if (error) throw error;
+        const decoded = payload;
 
-        const user = await User.findById(decoded.userId);
+        // Cached plain-object user (see services/principalCache.js);
+        // handlers that need to save changes load the full document themselves.
+        const user = await getPrincipal(decoded.userId);
         if (!user || !user.isActive) {
             return res.status(401).json({
                 success: false,
@@ -61,3 +85,4 @@ const authMiddleware = async (req, res, next) => {
 };
 
 module.exports = authMiddleware;
+module.exports.verifyRequestToken = verifyRequestToken;
@@ -1,27 +1,119 @@
-const rateLimit = require('express-rate-limit');
+const { verifyRequestToken } = require('./auth');
+const { STORE, getStore, MemoryBucketStore } = require('../services/rateLimitStore');
 const logger = require('../utils/logger');
 
-const rateLimiter = rateLimit({
-    windowMs: parseInt(process.env.RATE_LIMIT_WINDOW_MS) || 15 * 60 * 1000,
-    max: parseInt(process.env.RATE_LIMIT_MAX) || 100,
-    message: {
-        success: false,
-        message: 'Too many requests from this IP, please try again later',
-        code: 'RATE_LIMIT_EXCEEDED'
-    },
-    standardHeaders: true,
-    legacyHeaders: false,
-    handler: (req, res) => {
-        logger.warn(`Rate limit exceeded for IP: ${req.ip}`);
-
-        res.status(429).json({
-            success: false,
-            message: 'Too many requests from this IP, please try again later',
-            code: 'RATE_LIMIT_EXCEEDED'
-        });
+// Token bucket per client per route class. A bucket holds up to `capacity`
+// tokens and refills completely over `refillMs`; each request takes `cost`.
+// Expensive routes have their own, smaller buckets, so a burst of uploads
+// can't starve dashboard reads and vice versa.
+function routeClass(name, { capacity, refillMs, cost }) {
+    const prefix = `RATE_LIMIT_${name.toUpperCase()}`;
+    return {
+        name,
+        capacity: parseInt(process.env[`${prefix}_CAPACITY`]) || capacity,
+        refillMs: parseInt(process.env[`${prefix}_REFILL_MS`]) || refillMs,
+        cost
+    };
+}
+
+const ROUTE_CLASSES = {
+    // Login / register: keyed by IP, slow to refill against credential stuffing
+    auth: routeClass('auth', { capacity: 20, refillMs: 15 * 60 * 1000, cost: 1 }),
+    // Whole-file upload or finalize: each one runs a speech analysis
+    analysis: routeClass('analysis', { capacity: 100, refillMs: 10 * 60 * 1000, cost: 10 }),
+    // Resumable upload chunks and bookkeeping
+    upload: routeClass('upload', { capacity: 200, refillMs: 60 * 1000, cost: 2 }),
+    write: routeClass('write', { capacity: 100, refillMs: 60 * 1000, cost: 1 }),
+    read: routeClass('read', { capacity: 300, refillMs: 60 * 1000, cost: 1 })
+};
+
+// `req.path` is relative to the /api mount point
+function classify(req) {
+    if (/^\/auth\/(login|register)\/?$/.test(req.path)) return ROUTE_CLASSES.auth;
+    if (req.method === 'POST' && /^\/sessions\/[^/]+\/(upload|uploads\/finalize)\/?$/.test(req.path)) {
+        return ROUTE_CLASSES.analysis;
+    }
+    if (/^\/sessions\/[^/]+\/uploads\/?$/.test(req.path) && req.method !== 'GET') return ROUTE_CLASSES.upload;
+    if (req.method === 'GET' || req.method === 'HEAD') return ROUTE_CLASSES.read;
+    return ROUTE_CLASSES.write;
+}
+
+// Authenticated requests are limited per user, so users sharing an address
+// (NAT, offices) don't share a budget. The verified token is left on the
+// request for authMiddleware, which still rejects it if it's no good.
+function clientKey(req, routeClassName) {
+    if (routeClassName !== 'auth') {
+        const { payload } = verifyRequestToken(req);
+        if (payload && payload.userId) return `${routeClassName}:user:${payload.userId}`;
+    }
+    return `${routeClassName}:ip:${req.ip}`;
+}
+
+const stats = {
+    allowed: 0,
+    limited: 0,
+    storeErrors: 0,
+    limitedByClass: Object.fromEntries(Object.keys(ROUTE_CLASSES).map(name => [name, 0]))
+};
+
+const rateLimiter = async (req, res, next) => {
+    const policy = classify(req);
+    const key = clientKey(req, policy.name);
+    let result;
+
+    try {
+        result = await getStore().take(key, policy);
+    } catch (error) {
+        // If the shared store is unreachable, let requests through rather than fail them
+        stats.storeErrors += 1;
+        logger.warn(`Rate limit store (${STORE}) failed: ${error.message}`);
+        return next();
     }
-});
+
+    const refillPerMs = policy.capacity / policy.refillMs;
+    res.set({
+        'RateLimit-Limit': String(policy.capacity),
+        'RateLimit-Remaining': String(Math.floor(result.tokens)),
+        'RateLimit-Reset': String(Math.ceil((policy.capacity - result.tokens) / refillPerMs / 1000))
+    });
+
+    if (result.allowed) {
+        stats.allowed += 1;
+        return next();
+    }
+
+    stats.limited += 1;
+    stats.limitedByClass[policy.name] += 1;
+    const retryAfter = Math.ceil((policy.cost - result.tokens) / refillPerMs / 1000);
+    logger.warn(`Rate limit exceeded for ${key}`);
+
+    res.set('Retry-After', String(retryAfter));
+    res.status(429).json({
+        success: false,
+        message: 'Too many requests, please try again later',
+        code: 'RATE_LIMIT_EXCEEDED',
+        retryAfter
+    });
+};
+
+// Cluster primary side of the 'cluster' store (see cluster.js).
+function createRateLimitHandlers(buckets = new MemoryBucketStore()) {
+    return {
+        'rateLimit.take': ({ key, capacity, refillMs, cost }) => buckets.takeSync(key, { capacity, refillMs, cost })
+    };
+}
+
+function getStats() {
+    return {
+        store: STORE,
+        ...stats
+    };
+}
 
 module.exports = {
-    rateLimiter
+    rateLimiter,
+    createRateLimitHandlers,
+    getStats,
+    ROUTE_CLASSES,
+    classify
 };
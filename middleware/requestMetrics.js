@@ -0,0 +1,27 @@
+const metrics = require('../utils/metrics');
+
+const requestDuration = metrics.histogram({
+    name: 'http_request_duration_seconds',
+    help: 'HTTP request latency by route',
+    labelNames: ['method', 'route', 'status']
+});
+
+// Labels requests with the matched route pattern (e.g.
+// /api/sessions/:sessionId/upload) rather than the raw URL, which would
+// create a series per session id.
+const requestMetrics = (req, res, next) => {
+    const done = requestDuration.startTimer({ method: req.method });
+
+    res.on('finish', () => {
+        done({
+            route: req.route ? `${req.baseUrl}${req.route.path}` : 'unmatched',
+            status: res.statusCode
+        });
+    });
+    next();
+};
+
+module.exports = {
+    requestMetrics,
+    requestDuration
+};
@@ -0,0 +1,158 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { Transform, pipeline } = require('stream');
+const multer = require('multer');
+const { v4: uuidv4 } = require('uuid');
+const metrics = require('../utils/metrics');
+const logger = require('../utils/logger');
+
+const UPLOAD_TMP_DIR = process.env.UPLOAD_TMP_DIR || path.join(os.tmpdir(), 'speakai-uploads');
+const MB = 1024 * 1024;
+
+// Upload size limit per practice type; presentations may run up to the
+// Session schema's 3600 s maximum.
+const UPLOAD_LIMITS = {
+    freestyle: (parseInt(process.env.UPLOAD_LIMIT_FREESTYLE_MB) || 10) * MB,
+    guided: (parseInt(process.env.UPLOAD_LIMIT_GUIDED_MB) || 10) * MB,
+    interview: (parseInt(process.env.UPLOAD_LIMIT_INTERVIEW_MB) || 25) * MB,
+    presentation: (parseInt(process.env.UPLOAD_LIMIT_PRESENTATION_MB) || 200) * MB
+};
+
+const ALLOWED_TYPES = ['audio/wav', 'audio/mp3', 'audio/mp4', 'audio/mpeg', 'audio/webm'];
+
+// Bytes of uploads still being received, so slow clients or a slow disk
+// show up as a growing gauge rather than only as request latency.
+const uploadBytesInFlight = metrics.gauge({
+    name: 'upload_bytes_in_flight',
+    help: 'Bytes received for uploads that have not finished',
+    labelNames: ['kind']
+});
+const uploadBytesTotal = metrics.counter({
+    name: 'upload_bytes_total',
+    help: 'Bytes received for uploads',
+    labelNames: ['kind']
+});
+
+// Multer storage engine that streams each file straight to a temp file,
+// hashing it on the way through, so the audio is never held in memory.
+// Adds `path` and `sha256` to req.file.
+class HashingDiskStorage {
+    constructor(dir) {
+        this.dir = dir;
+        fs.mkdirSync(dir, { recursive: true });
+    }
+
+    _handleFile(req, file, cb) {
+        const target = path.join(this.dir, uuidv4());
+        const hash = crypto.createHash('sha256');
+        let size = 0;
+
+        const hasher = new Transform({
+            transform(chunk, encoding, done) {
+                hash.update(chunk);
+                size += chunk.length;
+                uploadBytesInFlight.inc({ kind: 'file' }, chunk.length);
+                done(null, chunk);
+            }
+        });
+
+        pipeline(file.stream, hasher, fs.createWriteStream(target), (error) => {
+            uploadBytesInFlight.dec({ kind: 'file' }, size);
+            uploadBytesTotal.inc({ kind: 'file' }, size);
+            if (error) {
+                fs.unlink(target, () => cb(error));
+                return;
+            }
+            cb(null, { path: target, size, sha256: hash.digest('hex') });
+        });
+    }
+
+    _removeFile(req, file, cb) {
+        fs.unlink(file.path, () => cb(null));
+    }
+}
+
+const storage = new HashingDiskStorage(UPLOAD_TMP_DIR);
+const uploaders = {};
+
+function getUploader(practiceType) {
+    const limit = UPLOAD_LIMITS[practiceType] || UPLOAD_LIMITS.freestyle;
+    if (!uploaders[limit]) {
+        uploaders[limit] = multer({
+            storage,
+            limits: {
+                fileSize: limit,
+                files: 1
+            },
+            fileFilter: (req, file, cb) => {
+                if (ALLOWED_TYPES.includes(file.mimetype)) {
+                    cb(null, true);
+                } else {
+                    cb(new Error('Invalid file type. Only audio files are allowed.'), false);
+                }
+            }
+        });
+    }
+    return { limit, uploader: uploaders[limit] };
+}
+
+// Accepts a single audio file, sized by the practice type of the session
+// loaded earlier into req.uploadSession.
+function audioUpload(fieldName) {
+    return (req, res, next) => {
+        const practiceType = req.uploadSession && req.uploadSession.practiceType;
+        const { limit, uploader } = getUploader(practiceType);
+
+        uploader.single(fieldName)(req, res, (error) => {
+            if (!error) return next();
+
+            if (error.code === 'LIMIT_FILE_SIZE') {
+                return res.status(413).json({
+                    success: false,
+                    message: `Audio file exceeds the ${Math.round(limit / MB)}MB limit for ${practiceType || 'this'} sessions`,
+                    code: 'FILE_TOO_LARGE'
+                });
+            }
+
+            if (error instanceof multer.MulterError) {
+                return res.status(400).json({
+                    success: false,
+                    message: error.message,
+                    code: 'UPLOAD_INVALID'
+                });
+            }
+
+            if (error.message && error.message.startsWith('Invalid file type')) {
+                return res.status(400).json({
+                    success: false,
+                    message: error.message,
+                    code: 'INVALID_FILE_TYPE'
+                });
+            }
+
+            next(error);
+        });
+    };
+}
+
+function discardUpload(file) {
+    if (!file || !file.path) return Promise.resolve();
+    return fs.promises.unlink(file.path).catch((error) => {
+        if (error.code !== 'ENOENT') {
+            logger.warn(`Failed to remove upload ${file.path}: ${error.message}`);
+        }
+    });
+}
+
+module.exports = {
+    ALLOWED_TYPES,
+    audioUpload,
+    discardUpload,
+    HashingDiskStorage,
+    UPLOAD_LIMITS,
+    UPLOAD_TMP_DIR,
+    uploadBytesInFlight,
+    uploadBytesTotal
+};
@@ -0,0 +1,479 @@
+"""Acoustic speech analysis for the SpeakAI backend.
+
+Everything here works on whole-signal NumPy arrays: the PCM is framed with
+cumulative sums and strided views, so there are no per-sample Python loops.
+The result dictionary mirrors what services/speechAnalysisService.js expects
+from ``POST /analyze-speech`` (the same keys ``generateMockAnalysis`` emits).
+"""
+
+import io
+import wave
+
+import numpy as np
+
+FRAME_MS = 25
+HOP_MS = 10
+# Spectral flux only needs the speech band, so it is computed on a block-
+# averaged copy of the signal at roughly this rate to keep the FFTs small.
+FLUX_RATE = 8000
+
+MIN_PAUSE_S = 0.25
+MIN_GAP_S = 0.10
+MIN_SPEECH_S = 0.05
+SYLLABLE_SPACING_S = 0.10
+SYLLABLES_PER_WORD = 1.4
+FILLER_MIN_S = 0.20
+FILLER_MAX_S = 1.20
+UM_MIN_S = 0.40
+
+# Higher levels judge pace, pauses and fillers against tighter tolerances.
+LEVEL_TOLERANCE = {
+    'easy': 1.25,
+    'medium': 1.0,
+    'hard': 0.8
+}
+
+EPS = 1e-10
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+def decode_wav(data):
+    """Decode a PCM WAV payload into mono float32 samples in [-1, 1]."""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as error:
+        raise AudioDecodeError(f'Unsupported audio format: {error}') from error
+
+    return pcm_to_float(raw, width, channels), sample_rate
+
+
+def pcm_to_float(raw, width, channels=1):
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = packed[:, 0] | (packed[:, 1] << 8) | (packed[:, 2] << 16)
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / float(1 << 31)
+    else:
+        raise AudioDecodeError(f'Unsupported sample width: {width} bytes')
+
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    return samples
+
+
+def frame_geometry(sample_rate):
+    frame_len = max(1, int(sample_rate * FRAME_MS / 1000))
+    hop = max(1, int(sample_rate * HOP_MS / 1000))
+    return frame_len, hop
+
+
+def frame_starts(n_samples, frame_len, hop):
+    if n_samples < frame_len:
+        return np.zeros(0, dtype=np.int64)
+    return np.arange(0, n_samples - frame_len + 1, hop, dtype=np.int64)
+
+
+def frame_features(samples, sample_rate, prev_spectrum=None):
+    """Per-frame RMS (dBFS), zero-crossing rate and spectral flux.
+
+    ``prev_spectrum`` lets a caller that feeds the signal in windows carry
+    the last normalised spectrum across window boundaries so flux stays
+    continuous. Returns ``(features, last_spectrum)``.
+    """
+    frame_len, hop = frame_geometry(sample_rate)
+    starts = frame_starts(len(samples), frame_len, hop)
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.float64)
+        return {'db': empty, 'zcr': empty, 'flux': empty}, prev_spectrum
+
+    x = samples.astype(np.float64, copy=False)
+    ends = starts + frame_len
+
+    energy = np.concatenate(([0.0], np.cumsum(x * x)))
+    rms = np.sqrt(np.maximum(energy[ends] - energy[starts], 0.0) / frame_len)
+    db = 20.0 * np.log10(rms + EPS)
+
+    signs = np.signbit(samples)
+    crossings = np.concatenate(([0], np.cumsum(signs[1:] != signs[:-1])))
+    zcr = (crossings[ends - 1] - crossings[starts]) / max(1, frame_len - 1)
+
+    spectrum = normalised_spectra(samples, sample_rate, starts, frame_len)
+
+    if prev_spectrum is None:
+        prev = np.vstack((spectrum[:1], spectrum[:-1]))
+    else:
+        prev = np.vstack((prev_spectrum[None, :], spectrum[:-1]))
+    flux = np.maximum(spectrum - prev, 0.0).sum(axis=1)
+
+    return {'db': db, 'zcr': zcr, 'flux': flux}, spectrum[-1]
+
+
+def normalised_spectra(samples, sample_rate, starts, frame_len):
+    """Magnitude spectra of each frame, normalised to unit sum."""
+    factor = max(1, sample_rate // FLUX_RATE)
+    usable = len(samples) - len(samples) % factor
+    reduced = samples[:usable].reshape(-1, factor).mean(axis=1, dtype=np.float32)
+
+    width = max(2, frame_len // factor)
+    offsets = np.minimum(starts // factor, max(0, len(reduced) - width))
+    frames = reduced[offsets[:, None] + np.arange(width)]
+
+    window = np.hanning(width).astype(np.float32)
+    spectrum = np.abs(np.fft.rfft(frames * window, axis=1))
+    spectrum /= spectrum.sum(axis=1, keepdims=True) + EPS
+    return spectrum
+
+
+def runs(mask):
+    """Start and end (exclusive) indices of the True runs in ``mask``."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def close_gaps(mask, min_gap):
+    """Fill False runs shorter than ``min_gap`` frames between True runs."""
+    starts, ends = runs(~mask)
+    interior = (starts > 0) & (ends < len(mask)) & (ends - starts < min_gap)
+    filled = mask.copy()
+    for start, end in zip(starts[interior], ends[interior]):
+        filled[start:end] = True
+    return filled
+
+
+def drop_short(mask, min_len):
+    starts, ends = runs(mask)
+    short = ends - starts < min_len
+    kept = mask.copy()
+    for start, end in zip(starts[short], ends[short]):
+        kept[start:end] = False
+    return kept
+
+
+def speech_threshold(db):
+    """Adaptive energy gate between the noise floor and the speech peaks."""
+    return gate_level(np.percentile(db, 10), np.percentile(db, 95))
+
+
+def gate_level(floor, peak):
+    return max(floor + 0.35 * (peak - floor), floor + 6.0, -55.0), floor, peak
+
+
+def detect_speech(db, threshold, frames_per_second):
+    speech = db > threshold
+    speech = close_gaps(speech, int(MIN_GAP_S * frames_per_second))
+    return drop_short(speech, max(1, int(MIN_SPEECH_S * frames_per_second)))
+
+
+def syllable_peaks(db, speech, threshold, frames_per_second):
+    """Mark energy-envelope maxima inside speech as syllable nuclei.
+
+    Flat tops mark every frame of the plateau; see ``first_of_plateau``.
+    """
+    envelope = np.convolve(db, np.ones(5) / 5.0, mode='same')
+    half = syllable_half_width(frames_per_second)
+    padded = np.pad(envelope, half, mode='edge')
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1).max(axis=1)
+    return (envelope >= local_max) & speech & (envelope > threshold + 2.0)
+
+
+def syllable_half_width(frames_per_second):
+    return max(1, int(SYLLABLE_SPACING_S * frames_per_second) // 2)
+
+
+def first_of_plateau(peaks, previous=False):
+    return peaks & ~np.concatenate(([previous], peaks[:-1]))
+
+
+def count_syllables(db, speech, threshold, frames_per_second):
+    if len(db) < 3:
+        return 0
+    peaks = syllable_peaks(db, speech, threshold, frames_per_second)
+    return int(first_of_plateau(peaks).sum())
+
+
+def pause_statistics(speech, frames_per_second):
+    starts, ends = runs(~speech)
+    spoken = np.flatnonzero(speech)
+    if len(spoken) == 0:
+        return summarize_pauses(0, 0.0, 0.0, 0.0, 0.0)
+
+    interior = (starts > spoken[0]) & (ends <= spoken[-1])
+    lengths = (ends - starts)[interior] / frames_per_second
+    lengths = lengths[lengths >= MIN_PAUSE_S]
+    span = (spoken[-1] - spoken[0] + 1) / frames_per_second
+
+    return summarize_pauses(len(lengths), lengths.sum(), lengths.max() if len(lengths) else 0.0,
+                            len(spoken) / frames_per_second, span)
+
+
+def summarize_pauses(count, total, longest, speech_seconds, span):
+    if span <= 0:
+        return {'count': 0, 'total_seconds': 0.0, 'mean_seconds': 0.0,
+                'longest_seconds': 0.0, 'speech_ratio': 0.0}
+    return {
+        'count': int(count),
+        'total_seconds': round(float(total), 2),
+        'mean_seconds': round(float(total / count), 2) if count else 0.0,
+        'longest_seconds': round(float(longest), 2),
+        'speech_ratio': round(float(speech_seconds / span), 3)
+    }
+
+
+def filler_candidates(features, speech, frames_per_second):
+    """Find sustained, spectrally stable voiced stretches ("um", "uh").
+
+    Filled pauses hold one vowel or nasal, so they show low spectral flux and
+    low zero-crossing rate for longer than ordinary syllables. Lexical fillers
+    such as "like" need a transcript and are not detected acoustically.
+    """
+    breakdown = {'um': 0, 'uh': 0, 'like': 0, 'you_know': 0}
+    if speech.sum() < 2:
+        return breakdown
+
+    flux_limit = np.percentile(features['flux'][speech], 30)
+    zcr_limit = np.percentile(features['zcr'][speech], 50)
+    stable = speech & (features['flux'] <= flux_limit) & (features['zcr'] <= zcr_limit)
+    stable = close_gaps(stable, 3)
+
+    starts, ends = runs(stable)
+    return classify_fillers((ends - starts) / frames_per_second, breakdown)
+
+
+def classify_fillers(seconds, breakdown):
+    """Count stable stretches of filler length, splitting "um" from "uh"."""
+    fillers = seconds[(seconds >= FILLER_MIN_S) & (seconds <= FILLER_MAX_S)]
+    breakdown['um'] += int((fillers >= UM_MIN_S).sum())
+    breakdown['uh'] += int((fillers < UM_MIN_S).sum())
+    return breakdown
+
+
+def clip01(value):
+    return float(min(1.0, max(0.0, value)))
+
+
+def score_metrics(metrics, level='easy'):
+    """Turn raw acoustic measurements into the 0-100 scores the API reports."""
+    tolerance = LEVEL_TOLERANCE.get(level, LEVEL_TOLERANCE['easy'])
+
+    if metrics['speech_seconds'] <= 0:
+        return {'confidence_score': 0, 'clarity_score': 0, 'volume_stability_score': 0}
+
+    volume_stability = 100.0 * np.exp(-metrics['loudness_std_db'] / 20.0)
+
+    snr_score = clip01((metrics['dynamic_range_db'] - 10.0) / 30.0)
+    articulation_score = clip01(metrics['median_flux'] / 0.4)
+    clarity = 100.0 * (0.6 * snr_score + 0.4 * articulation_score)
+
+    minutes = max(metrics['duration_seconds'] / 60.0, 1e-3)
+    pace_score = 1.0 - clip01(abs(metrics['pace_wpm'] - 140) / (80.0 * tolerance))
+    pause_score = 1.0 - clip01((metrics['pause_ratio'] - 0.15) / (0.35 * tolerance))
+    filler_score = 1.0 - clip01(metrics['filler_count'] / minutes / (10.0 * tolerance))
+    loudness_score = clip01((metrics['mean_speech_db'] + 40.0) / 25.0)
+
+    confidence = 100.0 * (
+        0.25 * volume_stability / 100.0 +
+        0.25 * pace_score +
+        0.20 * pause_score +
+        0.15 * filler_score +
+        0.15 * loudness_score
+    )
+
+    return {
+        'confidence_score': int(round(min(100.0, confidence))),
+        'clarity_score': int(round(min(100.0, clarity))),
+        'volume_stability_score': int(round(min(100.0, volume_stability)))
+    }
+
+
+def measure(features, sample_rate, n_samples):
+    """Aggregate per-frame features into whole-recording measurements."""
+    _, hop = frame_geometry(sample_rate)
+    frames_per_second = sample_rate / hop
+    duration = n_samples / float(sample_rate)
+    db = features['db']
+
+    if len(db) == 0:
+        speech = np.zeros(0, dtype=bool)
+        threshold, floor, peak = -55.0, -100.0, -100.0
+    else:
+        threshold, floor, peak = speech_threshold(db)
+        speech = detect_speech(db, threshold, frames_per_second)
+
+    pauses = pause_statistics(speech, frames_per_second)
+    breakdown = filler_candidates(features, speech, frames_per_second)
+    syllables = count_syllables(db, speech, threshold, frames_per_second)
+
+    spoken = np.flatnonzero(speech)
+    span = (spoken[-1] - spoken[0] + 1) / frames_per_second if len(spoken) else 0.0
+
+    return summarize(
+        duration=duration,
+        speech_seconds=len(spoken) / frames_per_second,
+        span=span,
+        syllables=syllables,
+        pauses=pauses,
+        breakdown=breakdown,
+        loudness_mean=float(db[speech].mean()) if len(spoken) else -100.0,
+        loudness_std=float(db[speech].std()) if len(spoken) else 0.0,
+        dynamic_range=float(peak - floor),
+        median_flux=float(np.median(features['flux'][speech])) if len(spoken) else 0.0
+    )
+
+
+def summarize(duration, speech_seconds, span, syllables, pauses, breakdown,
+              loudness_mean, loudness_std, dynamic_range, median_flux):
+    """Whole-recording measurements consumed by ``score_metrics``."""
+    pace = (syllables / SYLLABLES_PER_WORD) / (span / 60.0) if span > 0 else 0.0
+
+    return {
+        'duration_seconds': duration,
+        'speech_seconds': speech_seconds,
+        'pace_wpm': int(round(min(500.0, pace))),
+        'pause_ratio': pauses['total_seconds'] / span if span > 0 else 0.0,
+        'pauses': pauses,
+        'filler_breakdown': breakdown,
+        'filler_count': sum(breakdown.values()),
+        'loudness_std_db': loudness_std,
+        'mean_speech_db': loudness_mean,
+        'dynamic_range_db': dynamic_range,
+        'median_flux': median_flux
+    }
+
+
+def analyze_samples(samples, sample_rate, options=None):
+    options = options or {}
+    features, _ = frame_features(samples, sample_rate)
+    metrics = measure(features, sample_rate, len(samples))
+    return build_result(metrics, options)
+
+
+def analyze_wav(data, options=None):
+    samples, sample_rate = decode_wav(data)
+    return analyze_samples(samples, sample_rate, options)
+
+
+def build_result(metrics, options):
+    scores = score_metrics(metrics, options.get('level', 'easy'))
+    pace = metrics['pace_wpm']
+    total_fillers = metrics['filler_count']
+
+    return {
+        'success': True,
+        'transcript': None,
+        'confidence_score': scores['confidence_score'],
+        'clarity_score': scores['clarity_score'],
+        'volume_stability_score': scores['volume_stability_score'],
+        'pace_wpm': pace,
+        'total_filler_count': total_fillers,
+        'filler_breakdown': metrics['filler_breakdown'],
+        'pause_stats': metrics['pauses'],
+        'duration_seconds': round(metrics['duration_seconds'], 2),
+        'feedback': generate_feedback(scores['confidence_score'], scores['clarity_score'], pace),
+        'improvements': generate_improvements(
+            scores['confidence_score'],
+            scores['clarity_score'],
+            pace,
+            total_fillers,
+            scores['volume_stability_score']
+        )
+    }
+
+
+# Feedback wording matches generateFeedback/generateImprovements in
+# services/speechAnalysisService.js so real and mock results read the same.
+def generate_feedback(confidence, clarity, pace):
+    feedback = {}
+
+    if 120 <= pace <= 160:
+        feedback['pace'] = {'status': 'excellent', 'message': f'Perfect pace at {pace} WPM!', 'value': f'{pace} WPM'}
+    elif pace < 120:
+        feedback['pace'] = {'status': 'slow', 'message': f'Try speaking faster. Current: {pace} WPM', 'value': f'{pace} WPM'}
+    else:
+        feedback['pace'] = {'status': 'fast', 'message': f'Slow down slightly. Current: {pace} WPM', 'value': f'{pace} WPM'}
+
+    if confidence >= 80:
+        feedback['confidence'] = {'status': 'excellent', 'message': 'Great confidence level!', 'value': f'{confidence}%'}
+    elif confidence >= 60:
+        feedback['confidence'] = {'status': 'good', 'message': 'Good confidence, keep practicing!', 'value': f'{confidence}%'}
+    else:
+        feedback['confidence'] = {'status': 'needs_work', 'message': 'Focus on building confidence', 'value': f'{confidence}%'}
+
+    if clarity >= 80:
+        feedback['clarity'] = {'status': 'excellent', 'message': 'Very clear speech!', 'value': f'{clarity}%'}
+    elif clarity >= 60:
+        feedback['clarity'] = {'status': 'good', 'message': 'Good clarity, minor improvements possible', 'value': f'{clarity}%'}
+    else:
+        feedback['clarity'] = {'status': 'needs_work', 'message': 'Focus on enunciation and clarity', 'value': f'{clarity}%'}
+
+    avg_score = (confidence + clarity) / 2
+    if avg_score >= 80:
+        feedback['overall'] = {'status': 'excellent', 'message': 'Outstanding performance! Keep up the great work.'}
+    elif avg_score >= 60:
+        feedback['overall'] = {'status': 'good', 'message': 'Good progress! Continue practicing to improve further.'}
+    else:
+        feedback['overall'] = {'status': 'needs_work', 'message': 'Keep practicing! Focus on the highlighted areas for improvement.'}
+
+    return feedback
+
+
+def generate_improvements(confidence, clarity, pace, filler_count, volume_stability=100):
+    improvements = []
+
+    if confidence < 70:
+        improvements.append({
+            'area': 'Confidence',
+            'suggestion': 'Practice deep breathing before speaking and maintain good posture',
+            'priority': 'high'
+        })
+
+    if filler_count > 5:
+        improvements.append({
+            'area': 'Filler Words',
+            'suggestion': 'Pause instead of using filler words like "um" and "like"',
+            'priority': 'medium'
+        })
+
+    if clarity < 70:
+        improvements.append({
+            'area': 'Clarity',
+            'suggestion': 'Speak more slowly and focus on clear enunciation of each word',
+            'priority': 'high'
+        })
+
+    if pace > 180:
+        improvements.append({
+            'area': 'Pace',
+            'suggestion': 'Slow down your speaking rate for better comprehension',
+            'priority': 'medium'
+        })
+
+    if volume_stability < 60:
+        improvements.append({
+            'area': 'Volume',
+            'suggestion': 'Keep a steady distance from the microphone and project evenly',
+            'priority': 'medium'
+        })
+
+    if not improvements:
+        improvements.append({
+            'area': 'Practice',
+            'suggestion': 'Continue regular practice sessions to maintain and improve your skills',
+            'priority': 'low'
+        })
+
+    return improvements
@@ -0,0 +1,97 @@
+"""Batch analysis across a pool of worker processes.
+
+``analyze_batch`` fans clips out to a ``ProcessPoolExecutor`` shared by all
+requests, so one batch keeps every core busy instead of running clips one
+after another on the request thread, and yields each clip's outcome as soon
+as it finishes rather than in submission order.
+
+A worker that dies (killed, out of memory) breaks a ``ProcessPoolExecutor``
+for good, so a broken shared pool is discarded and the next clip starts a
+fresh one; clips lost with the old pool fail on their own.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import analyzer
+
+BATCH_WORKERS = int(os.environ.get('ML_BATCH_WORKERS', os.cpu_count() or 1))
+MAX_BATCH_CLIPS = int(os.environ.get('ML_MAX_BATCH_CLIPS', 64))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the server process is multi-threaded.
+            _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def discard_pool(pool):
+    """Shut down a broken ``pool``, replacing it if it is the shared one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def failed_outcome(clip_id, error):
+    return {'id': clip_id, 'success': False,
+            'message': f'Speech analysis failed: {error}', 'code': 'ANALYSIS_FAILED'}
+
+
+def analyze_clip(clip_id, data, options):
+    """Worker entry point; returns a JSON-ready outcome for one clip."""
+    try:
+        return {'id': clip_id, 'success': True, 'result': analyzer.analyze_wav(data, options)}
+    except analyzer.AudioDecodeError as error:
+        return {'id': clip_id, 'success': False, 'message': str(error), 'code': 'UNSUPPORTED_AUDIO'}
+
+
+def analyze_batch(clips, pool=None):
+    """Yield one outcome per ``(clip_id, data, options)`` in completion order."""
+    shared = pool is None
+    pool = pool or get_pool()
+    futures = {}
+    for clip_id, data, options in clips:
+        try:
+            try:
+                future = pool.submit(analyze_clip, clip_id, data, options)
+            except BrokenProcessPool:
+                if not shared:
+                    raise
+                discard_pool(pool)
+                pool = get_pool()
+                future = pool.submit(analyze_clip, clip_id, data, options)
+        except Exception as error:
+            yield failed_outcome(clip_id, error)
+            continue
+        futures[future] = (clip_id, pool)
+
+    for future in as_completed(futures):
+        clip_id, owner = futures[future]
+        try:
+            yield future.result()
+        except BrokenProcessPool as error:
+            if shared:
+                discard_pool(owner)
+            yield failed_outcome(clip_id, error)
+        except Exception as error:
+            yield failed_outcome(clip_id, error)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
@@ -0,0 +1,322 @@
+"""HTTP front end for the speech analyzer.
+
+Implements the ``POST /analyze-speech`` endpoint that
+services/speechAnalysisService.js calls at ``ML_SERVICE_URL``. The request is
+the multipart form the Node side builds: an ``audio`` file part (PCM WAV)
+plus an optional ``options`` JSON part carrying level/duration/practiceType.
+
+``POST /analyze-speech/stream`` takes the raw WAV as the request body
+(``Content-Length`` or chunked transfer encoding) with the options in the
+query string, and analyzes it window by window as the bytes arrive.
+
+``POST /analyze-speech/batch`` takes many clips in one multipart body: one
+``audio`` part per clip (its filename is the clip id) plus an optional
+``options`` JSON part, ``{"defaults": {...}, "clips": {"<id>": {...}}}``.
+Clips are analyzed in a process pool and the response is NDJSON, one line per
+clip written as soon as that clip finishes.
+
+Run with ``python server.py`` (``ML_SERVICE_PORT`` defaults to 8000).
+"""
+
+import json
+import logging
+import os
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import analyzer
+import batch
+import streaming
+
+PORT = int(os.environ.get('ML_SERVICE_PORT', 8000))
+MAX_UPLOAD_BYTES = int(os.environ.get('ML_MAX_UPLOAD_BYTES', 50 * 1024 * 1024))
+MAX_BATCH_BYTES = int(os.environ.get('ML_MAX_BATCH_BYTES', 512 * 1024 * 1024))
+
+logger = logging.getLogger('speakai-ml')
+
+
+class RequestError(Exception):
+    def __init__(self, status, message, code):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.code = code
+
+
+def parse_multipart_parts(content_type, body):
+    """Return ``[(field name, filename, bytes)]`` for a multipart body."""
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    if not message.is_multipart():
+        raise RequestError(400, 'Malformed multipart body', 'INVALID_MULTIPART')
+
+    parts = []
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name:
+            parts.append((name, part.get_filename(), part.get_payload(decode=True) or b''))
+    return parts
+
+
+def parse_multipart(content_type, body):
+    """Return ``{field name: (filename, bytes)}`` for a multipart body."""
+    return {name: (filename, data) for name, filename, data in parse_multipart_parts(content_type, body)}
+
+
+def parse_options(raw):
+    try:
+        options = json.loads(raw or b'{}')
+    except ValueError:
+        raise RequestError(400, 'Options must be valid JSON', 'INVALID_OPTIONS')
+    if not isinstance(options, dict):
+        raise RequestError(400, 'Options must be a JSON object', 'INVALID_OPTIONS')
+    return options
+
+
+def read_analysis_request(content_type, body):
+    """Extract the audio bytes and options dict from a request body."""
+    if content_type.startswith('multipart/form-data'):
+        fields = parse_multipart(content_type, body)
+        if 'audio' not in fields:
+            raise RequestError(400, 'Audio file is required', 'AUDIO_FILE_REQUIRED')
+        options = parse_options(fields['options'][1]) if 'options' in fields else {}
+        return fields['audio'][1], options
+
+    if content_type.startswith('audio/'):
+        return body, {}
+
+    raise RequestError(415, 'Expected multipart/form-data or audio/wav', 'UNSUPPORTED_MEDIA_TYPE')
+
+
+def read_batch_request(content_type, body):
+    """Return ``[(clip id, audio bytes, options)]`` for a batch request."""
+    if not content_type.startswith('multipart/form-data'):
+        raise RequestError(415, 'Expected multipart/form-data', 'UNSUPPORTED_MEDIA_TYPE')
+
+    parts = parse_multipart_parts(content_type, body)
+    options = {}
+    for name, _, data in parts:
+        if name == 'options':
+            options = parse_options(data)
+    defaults = options.get('defaults') or {}
+    per_clip = options.get('clips') or {}
+
+    clips = []
+    seen = set()
+    for name, filename, data in parts:
+        if name != 'audio':
+            continue
+        clip_id = filename or str(len(clips))
+        if clip_id in seen:
+            raise RequestError(400, f'Duplicate clip id: {clip_id}', 'DUPLICATE_CLIP_ID')
+        seen.add(clip_id)
+        clips.append((clip_id, data, {**defaults, **(per_clip.get(clip_id) or {})}))
+
+    if not clips:
+        raise RequestError(400, 'At least one audio clip is required', 'AUDIO_FILE_REQUIRED')
+    if len(clips) > batch.MAX_BATCH_CLIPS:
+        raise RequestError(413, f'A batch may contain at most {batch.MAX_BATCH_CLIPS} clips', 'BATCH_TOO_LARGE')
+    return clips
+
+
+class LimitedReader:
+    """File-like view over exactly ``length`` bytes of the request body."""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size):
+        if self.remaining <= 0:
+            return b''
+        data = self.stream.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+
+class ChunkedReader:
+    """File-like decoder for a ``Transfer-Encoding: chunked`` body."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.left = 0
+        self.done = False
+
+    def read(self, size):
+        if self.done:
+            return b''
+        if self.left == 0:
+            line = self.stream.readline(1024)
+            try:
+                self.left = int(line.split(b';', 1)[0].strip() or b'0', 16)
+            except ValueError:
+                raise RequestError(400, 'Malformed chunked body', 'INVALID_CHUNK')
+            if self.left == 0:
+                # Skip trailers up to the terminating blank line.
+                while self.stream.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.done = True
+                return b''
+        data = self.stream.read(min(size, self.left))
+        self.left -= len(data)
+        if self.left == 0:
+            self.stream.readline(8)
+        return data
+
+
+def stream_options(path):
+    query = dict(parse_qsl(urlsplit(path).query))
+    if 'duration' in query:
+        try:
+            query['duration'] = int(query['duration'])
+        except ValueError:
+            del query['duration']
+    return query
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SpeakAIAnalyzer/1.0'
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self.send_json(200, {'status': 'healthy', 'service': 'speakai-ml'})
+        self.send_json(404, {'success': False, 'message': 'Endpoint not found', 'path': self.path})
+
+    def do_POST(self):
+        if urlsplit(self.path).path == '/analyze-speech/stream':
+            return self.analyze_stream()
+        if self.path == '/analyze-speech/batch':
+            return self.analyze_batch()
+
+        try:
+            if self.path != '/analyze-speech':
+                raise RequestError(404, 'Endpoint not found', 'NOT_FOUND')
+
+            audio, options = read_analysis_request(
+                self.headers.get('Content-Type', ''),
+                self.read_body()
+            )
+            result = analyzer.analyze_wav(audio, options)
+            logger.info('Analyzed %d bytes: confidence=%s%%', len(audio), result['confidence_score'])
+            self.send_json(200, result)
+
+        except RequestError as error:
+            # The body may not have been consumed, so the connection can't be reused.
+            self.close_connection = True
+            self.send_json(error.status, {'success': False, 'message': error.message, 'code': error.code})
+        except analyzer.AudioDecodeError as error:
+            self.send_json(415, {'success': False, 'message': str(error), 'code': 'UNSUPPORTED_AUDIO'})
+        except Exception:
+            logger.exception('Speech analysis failed')
+            self.send_json(500, {'success': False, 'message': 'Speech analysis failed', 'code': 'ANALYSIS_FAILED'})
+
+    def analyze_stream(self):
+        try:
+            result = streaming.analyze_stream(self.body_stream(), stream_options(self.path))
+            logger.info('Stream-analyzed %.1fs of audio: confidence=%s%%',
+                        result['duration_seconds'], result['confidence_score'])
+            self.send_json(200, result)
+
+        except RequestError as error:
+            self.close_connection = True
+            self.send_json(error.status, {'success': False, 'message': error.message, 'code': error.code})
+        except streaming.StreamTooLong as error:
+            self.close_connection = True
+            self.send_json(413, {'success': False, 'message': str(error), 'code': 'PAYLOAD_TOO_LARGE'})
+        except analyzer.AudioDecodeError as error:
+            self.close_connection = True
+            self.send_json(415, {'success': False, 'message': str(error), 'code': 'UNSUPPORTED_AUDIO'})
+        except Exception:
+            logger.exception('Streaming speech analysis failed')
+            self.close_connection = True
+            self.send_json(500, {'success': False, 'message': 'Speech analysis failed', 'code': 'ANALYSIS_FAILED'})
+
+    def analyze_batch(self):
+        try:
+            clips = read_batch_request(
+                self.headers.get('Content-Type', ''),
+                self.read_body(MAX_BATCH_BYTES)
+            )
+        except RequestError as error:
+            self.close_connection = True
+            return self.send_json(error.status, {'success': False, 'message': error.message, 'code': error.code})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        failed = 0
+        try:
+            for outcome in batch.analyze_batch(clips):
+                failed += not outcome['success']
+                self.send_chunk(json.dumps(outcome).encode('utf-8') + b'\n')
+            self.send_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning('Client went away during a batch of %d clips', len(clips))
+            self.close_connection = True
+            return
+        except Exception:
+            # The 200 is already sent: end the chunked body so the client sees
+            # a complete stream missing some clips rather than a hung one.
+            logger.exception('Batch analysis of %d clips failed', len(clips))
+            self.close_connection = True
+            try:
+                self.send_chunk(b'')
+            except OSError:
+                pass
+            return
+        logger.info('Batch-analyzed %d clips (%d failed)', len(clips), failed)
+
+    def send_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def body_stream(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return ChunkedReader(self.rfile)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            raise RequestError(411, 'Content-Length or chunked encoding is required', 'LENGTH_REQUIRED')
+        return LimitedReader(self.rfile, length)
+
+    def read_body(self, limit=MAX_UPLOAD_BYTES):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            raise RequestError(411, 'Content-Length is required', 'LENGTH_REQUIRED')
+        if length > limit:
+            raise RequestError(413, 'Audio file is too large', 'PAYLOAD_TOO_LARGE')
+        return self.rfile.read(length)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+def main():
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s: %(message)s')
+    server = ThreadingHTTPServer(('0.0.0.0', PORT), AnalysisHandler)
+    logger.info('SpeakAI analysis service listening on port %d', PORT)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batch.shutdown()
+
+
+if __name__ == '__main__':
+    main()
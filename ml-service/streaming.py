@@ -0,0 +1,319 @@
+"""Windowed speech analysis for long recordings.
+
+``StreamingAnalyzer`` consumes PCM in fixed-size windows and folds each
+window's frame features into running accumulators (histograms, moments and
+run-length state), so memory stays O(window) no matter how long the
+recording is. ``finish()`` produces the same result dictionary as
+``analyzer.analyze_wav``.
+"""
+
+import struct
+
+import numpy as np
+
+import analyzer
+
+WINDOW_SECONDS = 10
+MAX_STREAM_SECONDS = 3600
+
+
+class RunningHistogram:
+    """Fixed-bin histogram that answers approximate percentiles."""
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        self.width = (high - low) / bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        index = ((np.asarray(values) - self.low) / self.width).astype(np.int64)
+        np.clip(index, 0, len(self.counts) - 1, out=index)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def percentile(self, q):
+        total = self.total
+        if total == 0:
+            return self.low
+        position = np.searchsorted(np.cumsum(self.counts), q / 100.0 * total)
+        return self.low + (min(position, len(self.counts) - 1) + 0.5) * self.width
+
+
+class RunningMoments:
+    """Count, mean and variance merged window by window (Chan et al.)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values):
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+class StreamingAnalyzer:
+    def __init__(self, sample_rate, options=None):
+        self.sample_rate = sample_rate
+        self.options = options or {}
+        self.frame_len, self.hop = analyzer.frame_geometry(sample_rate)
+        self.frames_per_second = sample_rate / self.hop
+
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.prev_spectrum = None
+        self.n_samples = 0
+        self.n_frames = 0
+
+        self.db_hist = RunningHistogram(-120.0, 0.0, 480)
+        self.flux_hist = RunningHistogram(0.0, 1.0, 400)
+        self.zcr_hist = RunningHistogram(0.0, 1.0, 400)
+        self.loudness = RunningMoments()
+
+        self.speech_frames = 0
+        self.first_speech = None
+        self.last_speech = None
+        self.silence_run = 0
+        self.pause_count = 0
+        self.pause_total = 0.0
+        self.pause_longest = 0.0
+
+        # Syllable peaks need a few frames of context on either side, so the
+        # last ``context`` frames of each window are scored with the next one.
+        self.context = analyzer.syllable_half_width(self.frames_per_second) + 2
+        self.syllable_db = np.zeros(0)
+        self.syllable_speech = np.zeros(0, dtype=bool)
+        self.syllable_threshold = -55.0
+        self.syllable_pending = 0
+        self.last_peak = False
+        self.syllables = 0
+
+        self.stable_run = 0
+        self.breakdown = {'um': 0, 'uh': 0, 'like': 0, 'you_know': 0}
+
+    def feed(self, samples):
+        """Analyze the next window of mono float32 samples."""
+        self.n_samples += len(samples)
+        buffer = np.concatenate((self.tail, samples)) if len(self.tail) else samples
+
+        features, spectrum = analyzer.frame_features(buffer, self.sample_rate, self.prev_spectrum)
+        count = len(features['db'])
+        if count == 0:
+            self.tail = buffer
+            return
+
+        self.tail = buffer[count * self.hop:].copy()
+        self.prev_spectrum = spectrum
+        self.fold(features)
+        self.n_frames += count
+
+    def fold(self, features):
+        db = features['db']
+        self.db_hist.add(db)
+        threshold, _, _ = analyzer.gate_level(self.db_hist.percentile(10), self.db_hist.percentile(95))
+        speech = analyzer.detect_speech(db, threshold, self.frames_per_second)
+
+        self.speech_frames += int(speech.sum())
+        self.loudness.add(db[speech])
+        self.flux_hist.add(features['flux'][speech])
+        self.zcr_hist.add(features['zcr'][speech])
+
+        self.fold_pauses(speech)
+        self.fold_syllables(db, speech, threshold)
+        self.fold_fillers(features, speech)
+
+    def fold_pauses(self, speech):
+        starts, ends = analyzer.runs(speech)
+        if len(starts) == 0:
+            self.silence_run += len(speech)
+            return
+
+        gaps = starts - np.concatenate(([-self.silence_run], ends[:-1]))
+        if self.first_speech is None:
+            self.first_speech = self.n_frames + int(starts[0])
+            gaps = gaps[1:]
+
+        seconds = gaps / self.frames_per_second
+        seconds = seconds[seconds >= analyzer.MIN_PAUSE_S]
+        if len(seconds):
+            self.pause_count += len(seconds)
+            self.pause_total += float(seconds.sum())
+            self.pause_longest = max(self.pause_longest, float(seconds.max()))
+
+        self.last_speech = self.n_frames + int(ends[-1]) - 1
+        self.silence_run = len(speech) - int(ends[-1])
+
+    def fold_syllables(self, db, speech, threshold, final=False):
+        added = len(db)
+        db = np.concatenate((self.syllable_db, db))
+        speech = np.concatenate((self.syllable_speech, speech))
+        if len(db) < 3:
+            self.syllable_db, self.syllable_speech = db, speech
+            self.syllable_pending += added
+            return
+
+        # Frames before ``start`` were scored last time; the newest
+        # ``context`` frames wait for the next window unless this is the end.
+        start = len(self.syllable_db) - self.syllable_pending
+        stop = len(db) if final else max(start, len(db) - self.context)
+        self.syllable_threshold = threshold
+        peaks = analyzer.syllable_peaks(db, speech, threshold, self.frames_per_second)[start:stop]
+        if len(peaks):
+            self.syllables += int(analyzer.first_of_plateau(peaks, self.last_peak).sum())
+            self.last_peak = bool(peaks[-1])
+
+        keep = 2 * self.context
+        self.syllable_pending = len(db) - stop
+        self.syllable_db, self.syllable_speech = db[-keep:], speech[-keep:]
+
+    def fold_fillers(self, features, speech):
+        if self.flux_hist.total < 2:
+            return
+        stable = (speech &
+                  (features['flux'] <= self.flux_hist.percentile(30)) &
+                  (features['zcr'] <= self.zcr_hist.percentile(50)))
+        stable = analyzer.close_gaps(stable, 3)
+
+        starts, ends = analyzer.runs(stable)
+        lengths = ends - starts
+        if len(starts) and starts[0] == 0:
+            lengths[0] += self.stable_run
+        elif self.stable_run:
+            lengths = np.concatenate(([self.stable_run], lengths))
+
+        if len(starts) and ends[-1] == len(stable):
+            self.stable_run = int(lengths[-1])
+            lengths = lengths[:-1]
+        else:
+            self.stable_run = 0
+
+        analyzer.classify_fillers(lengths / self.frames_per_second, self.breakdown)
+
+    def finish(self):
+        """Flush carried state and return the API result dictionary."""
+        if self.syllable_pending:
+            self.fold_syllables(np.zeros(0), np.zeros(0, dtype=bool), self.syllable_threshold, final=True)
+        if self.stable_run:
+            analyzer.classify_fillers(np.array([self.stable_run / self.frames_per_second]), self.breakdown)
+            self.stable_run = 0
+
+        fps = self.frames_per_second
+        span = (self.last_speech - self.first_speech + 1) / fps if self.first_speech is not None else 0.0
+        speech_seconds = self.speech_frames / fps
+
+        metrics = analyzer.summarize(
+            duration=self.n_samples / float(self.sample_rate),
+            speech_seconds=speech_seconds,
+            span=span,
+            syllables=self.syllables,
+            pauses=analyzer.summarize_pauses(self.pause_count, self.pause_total, self.pause_longest,
+                                             speech_seconds, span),
+            breakdown=self.breakdown,
+            loudness_mean=self.loudness.mean if self.loudness.count else -100.0,
+            loudness_std=self.loudness.std,
+            dynamic_range=self.db_hist.percentile(95) - self.db_hist.percentile(10),
+            median_flux=self.flux_hist.percentile(50) if self.flux_hist.total else 0.0
+        )
+        return analyzer.build_result(metrics, self.options)
+
+
+def read_exact(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class WavStream:
+    """Incremental PCM WAV reader over a file-like object.
+
+    Only the header is parsed up front; ``windows()`` then reads the data
+    chunk a window at a time. Streaming encoders often write a zero or
+    0xFFFFFFFF data size, in which case samples are read until EOF.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        riff = read_exact(stream, 12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise analyzer.AudioDecodeError('Unsupported audio format: expected a RIFF/WAVE stream')
+
+        fmt = None
+        while True:
+            header = read_exact(stream, 8)
+            if len(header) < 8:
+                raise analyzer.AudioDecodeError('Unsupported audio format: missing data chunk')
+            chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+            if chunk_id == b'data':
+                break
+            body = read_exact(stream, size + (size & 1))
+            if chunk_id == b'fmt ':
+                fmt = body
+
+        if fmt is None or len(fmt) < 16:
+            raise analyzer.AudioDecodeError('Unsupported audio format: missing fmt chunk')
+
+        audio_format, self.channels, self.sample_rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+        if audio_format not in (1, 0xFFFE):
+            raise analyzer.AudioDecodeError('Unsupported audio format: only PCM WAV is supported')
+        if self.channels < 1 or bits not in (8, 16, 24, 32) or self.sample_rate <= 0:
+            raise analyzer.AudioDecodeError(
+                f'Unsupported audio format: {self.channels} channels, {bits}-bit, {self.sample_rate} Hz')
+
+        self.width = bits // 8
+        self.frame_bytes = self.width * self.channels
+        self.remaining = None if size in (0, 0xFFFFFFFF) else size
+
+    def windows(self, seconds=WINDOW_SECONDS):
+        """Yield successive windows of mono float32 samples."""
+        window_bytes = max(1, int(seconds * self.sample_rate)) * self.frame_bytes
+        carry = b''
+        while self.remaining is None or self.remaining > 0:
+            want = window_bytes if self.remaining is None else min(window_bytes, self.remaining)
+            data = read_exact(self.stream, want - len(carry))
+            if self.remaining is not None:
+                self.remaining -= len(data)
+            data = carry + data
+            usable = len(data) - len(data) % self.frame_bytes
+            carry = data[usable:]
+            if usable:
+                yield analyzer.pcm_to_float(data[:usable], self.width, self.channels)
+            if len(data) < want:
+                break
+
+
+def analyze_stream(stream, options=None, window_seconds=WINDOW_SECONDS, max_seconds=MAX_STREAM_SECONDS):
+    """Analyze a WAV byte stream window by window."""
+    wav = WavStream(stream)
+    engine = StreamingAnalyzer(wav.sample_rate, options)
+    limit = max_seconds * wav.sample_rate
+    for samples in wav.windows(window_seconds):
+        engine.feed(samples)
+        if engine.n_samples > limit:
+            raise StreamTooLong(f'Recording exceeds {max_seconds} seconds')
+    return engine.finish()
+
+
+class StreamTooLong(ValueError):
+    pass
@@ -0,0 +1,43 @@
+"""Batch analysis over the shared worker pool."""
+
+import os
+import signal
+import time
+
+import batch
+from test_streaming import speech_like, to_wav
+
+
+def clips(count):
+    data = to_wav(speech_like(2, seed=1))
+    return [(f'clip-{i}', data, {}) for i in range(count)]
+
+
+def test_every_clip_gets_an_outcome():
+    try:
+        outcomes = list(batch.analyze_batch(clips(3) + [('bad', b'not a wav', {})]))
+    finally:
+        batch.shutdown()
+
+    by_id = {outcome['id']: outcome for outcome in outcomes}
+    assert sorted(by_id) == ['bad', 'clip-0', 'clip-1', 'clip-2']
+    assert all(by_id[f'clip-{i}']['success'] for i in range(3))
+    assert by_id['bad']['code'] == 'UNSUPPORTED_AUDIO'
+
+
+def test_next_batch_succeeds_after_a_worker_dies():
+    try:
+        assert all(outcome['success'] for outcome in batch.analyze_batch(clips(2)))
+        pool = batch.get_pool()
+        os.kill(next(iter(pool._processes)), signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while not pool._broken and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool._broken
+
+        outcomes = list(batch.analyze_batch(clips(2)))
+
+        assert [outcome['success'] for outcome in outcomes] == [True, True]
+        assert batch.get_pool() is not pool
+    finally:
+        batch.shutdown()
@@ -0,0 +1,173 @@
+"""The streaming accumulators against the whole-recording analysis."""
+
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import analyzer
+import streaming
+
+SAMPLE_RATE = 16000
+
+
+def speech_like(seconds, seed=0, fillers=False):
+    """Words of enveloped voiced tone separated by short and long pauses;
+    with ``fillers``, a sustained 0.7 s hum ('um') every 9 s."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    samples = np.zeros(len(t), dtype=np.float32)
+    position = 0.0
+    while position < seconds:
+        word = rng.uniform(0.2, 0.6)
+        start, end = int(position * SAMPLE_RATE), int(min(seconds, position + word) * SAMPLE_RATE)
+        segment = t[start:end]
+        if len(segment):
+            envelope = np.sin(np.pi * 4 * (segment - segment[0]) / word) ** 2
+            tone = np.sin(2 * np.pi * rng.uniform(120, 220) * segment)
+            samples[start:end] = 0.3 * envelope * tone + 0.05 * rng.standard_normal(len(segment))
+        position += word + rng.choice([0.1, 0.15, 0.8])
+    samples += 0.002 * rng.standard_normal(len(samples)).astype(np.float32)
+
+    if fillers:
+        hum = (0.2 * np.sin(2 * np.pi * 150 * t[:int(0.7 * SAMPLE_RATE)])).astype(np.float32)
+        for second in range(3, int(seconds) - 2, 9):
+            start = second * SAMPLE_RATE
+            samples[start:start + len(hum)] = hum
+    return samples
+
+
+def stream_windows(samples, window_seconds):
+    engine = streaming.StreamingAnalyzer(SAMPLE_RATE)
+    size = int(window_seconds * SAMPLE_RATE)
+    for start in range(0, len(samples), size):
+        engine.feed(samples[start:start + size])
+    return engine.finish()
+
+
+def to_wav(samples, data_size=None):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+    data = buffer.getvalue()
+    if data_size is not None:
+        # Header as written by a streaming encoder that didn't know the length
+        data = data[:40] + data_size.to_bytes(4, 'little') + data[44:]
+    return data
+
+
+class TrickleReader(io.BytesIO):
+    """Returns at most 3 bytes per read, like a slow socket."""
+
+    def read(self, size=-1):
+        return super().read(min(size, 3) if size and size > 0 else 3)
+
+
+def assert_close(batch, streamed):
+    assert streamed['duration_seconds'] == batch['duration_seconds']
+    for key in ('confidence_score', 'clarity_score', 'volume_stability_score'):
+        assert abs(streamed[key] - batch[key]) <= 3, key
+    assert streamed['pace_wpm'] == pytest.approx(batch['pace_wpm'], rel=0.05)
+    assert abs(streamed['total_filler_count'] - batch['total_filler_count']) <= 1
+    assert abs(streamed['pause_stats']['count'] - batch['pause_stats']['count']) <= 1
+    assert streamed['pause_stats']['total_seconds'] == pytest.approx(batch['pause_stats']['total_seconds'], rel=0.05)
+
+
+def test_running_moments_match_numpy():
+    rng = np.random.default_rng(3)
+    values = rng.normal(-30, 8, 10000)
+    moments = streaming.RunningMoments()
+    for chunk in np.array_split(values, 17):
+        moments.add(chunk)
+    moments.add(np.zeros(0))
+
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(values.mean())
+    assert moments.std == pytest.approx(values.std())
+
+
+def test_running_histogram_percentiles_within_one_bin():
+    rng = np.random.default_rng(4)
+    values = rng.uniform(-90, -10, 20000)
+    histogram = streaming.RunningHistogram(-120.0, 0.0, 480)
+    for chunk in np.array_split(values, 9):
+        histogram.add(chunk)
+
+    assert histogram.total == len(values)
+    for q in (10, 50, 95):
+        assert abs(histogram.percentile(q) - np.percentile(values, q)) <= histogram.width
+
+
+def test_running_histogram_clips_out_of_range_values():
+    histogram = streaming.RunningHistogram(0.0, 1.0, 10)
+    histogram.add(np.array([-5.0, 0.5, 7.0]))
+
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+    assert histogram.total == 3
+
+
+@pytest.mark.parametrize('window_seconds', [10, 3, 2.5])
+def test_streaming_matches_whole_recording(window_seconds):
+    samples = speech_like(60)
+
+    assert_close(analyzer.analyze_samples(samples, SAMPLE_RATE), stream_windows(samples, window_seconds))
+
+
+def test_streaming_counts_fillers_across_window_boundaries():
+    samples = speech_like(40, seed=1, fillers=True)
+    batch = analyzer.analyze_samples(samples, SAMPLE_RATE)
+
+    # 2.5 s windows split several of the hums between two windows
+    streamed = stream_windows(samples, 2.5)
+    assert batch['filler_breakdown']['um'] > 0
+    assert streamed['filler_breakdown'] == batch['filler_breakdown']
+    assert_close(batch, streamed)
+
+
+def test_silence_has_no_speech():
+    result = stream_windows(np.zeros(5 * SAMPLE_RATE, dtype=np.float32), 1)
+
+    assert result['pace_wpm'] == 0
+    assert result['total_filler_count'] == 0
+    assert result['duration_seconds'] == 5.0
+
+
+def test_analyze_stream_reads_wav_in_windows():
+    data = to_wav(speech_like(30))
+
+    assert_close(analyzer.analyze_wav(data), streaming.analyze_stream(TrickleReader(data), window_seconds=4))
+
+
+@pytest.mark.parametrize('data_size', [0, 0xFFFFFFFF])
+def test_unknown_data_size_reads_to_eof(data_size):
+    samples = speech_like(12)
+
+    result = streaming.analyze_stream(io.BytesIO(to_wav(samples, data_size)))
+    assert result['duration_seconds'] == 12.0
+
+
+def test_stream_longer_than_max_seconds_is_rejected():
+    data = to_wav(np.zeros(5 * SAMPLE_RATE, dtype=np.float32))
+
+    with pytest.raises(streaming.StreamTooLong):
+        streaming.analyze_stream(io.BytesIO(data), window_seconds=1, max_seconds=3)
+
+
+def test_non_wav_stream_is_rejected():
+    with pytest.raises(analyzer.AudioDecodeError):
+        streaming.analyze_stream(io.BytesIO(b'ID3\x04' + bytes(64)))
+
+
+@pytest.mark.parametrize('offset, value', [(22, 0), (34, 4), (34, 12), (24, 0)])
+def test_malformed_fmt_header_is_rejected(offset, value):
+    """Zero channels, unusable sample widths and a zero sample rate."""
+    data = bytearray(to_wav(speech_like(1)))
+    size = 2 if offset in (22, 34) else 4
+    data[offset:offset + size] = value.to_bytes(size, 'little')
+
+    with pytest.raises(analyzer.AudioDecodeError):
+        streaming.analyze_stream(io.BytesIO(bytes(data)))
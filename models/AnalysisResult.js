@@ -0,0 +1,26 @@
+const mongoose = require('mongoose');
+
+// Shared tier of the speech analysis cache (services/analysisCache.js).
+// The collection is capped, so MongoDB evicts the oldest results by size.
+const analysisResultSchema = new mongoose.Schema({
+    key: {
+        type: String,
+        required: true,
+        unique: true
+    },
+    result: {
+        type: mongoose.Schema.Types.Mixed,
+        required: true
+    },
+    size: {
+        type: Number,
+        default: 0
+    }
+}, {
+    timestamps: { createdAt: true, updatedAt: false },
+    capped: { size: parseInt(process.env.ANALYSIS_CACHE_MONGO_MAX_BYTES) || 64 * 1024 * 1024 }
+});
+
+const AnalysisResult = mongoose.model('AnalysisResult', analysisResultSchema);
+
+module.exports = AnalysisResult;
@@ -0,0 +1,33 @@
+const mongoose = require('mongoose');
+
+// Progress of a resumable batch job (e.g. scripts/backfillAchievements.js).
+// `_id` is the job name; `lastId` is the last document fully processed, so
+// a restarted run continues after it.
+const jobCheckpointSchema = new mongoose.Schema({
+    _id: {
+        type: String
+    },
+    lastId: {
+        type: mongoose.Schema.Types.ObjectId,
+        default: null
+    },
+    processed: {
+        type: Number,
+        default: 0
+    },
+    written: {
+        type: Number,
+        default: 0
+    },
+    completedAt: {
+        type: Date,
+        default: null
+    }
+}, {
+    timestamps: true,
+    versionKey: false
+});
+
+const JobCheckpoint = mongoose.model('JobCheckpoint', jobCheckpointSchema);
+
+module.exports = JobCheckpoint;
@@ -0,0 +1,297 @@
+const mongoose = require('mongoose');
+const TrendBucket = require('./TrendBucket');
+
+// Rollup metric name -> Session field
+const METRIC_FIELDS = {
+    confidence: 'confidenceScore',
+    clarity: 'clarityScore',
+    pace: 'paceWpm',
+    volume: 'volumeStability',
+    duration: 'duration'
+};
+
+const LEVELS = ['easy', 'medium', 'hard'];
+
+// A rebuild that has held its claim this long is taken to have died
+const REBUILD_STALE_MS = parseInt(process.env.PROGRESS_REBUILD_STALE_MS) || 60 * 1000;
+const REBUILD_POLL_MS = 100;
+const RECORD_ATTEMPTS = 50;
+
+// In-flight rebuilds by user id, so concurrent reads in one process share one
+const rebuilds = new Map();
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+function isStale(generation) {
+    return Date.now() - generation.getTimestamp().getTime() > REBUILD_STALE_MS;
+}
+
+function metricDefinition() {
+    return {
+        sum: { type: Number, default: 0 },
+        sumSq: { type: Number, default: 0 },
+        max: { type: Number, default: 0 }
+    };
+}
+
+function bucketDefinition() {
+    const bucket = { count: { type: Number, default: 0 } };
+    for (const name of Object.keys(METRIC_FIELDS)) {
+        bucket[name] = metricDefinition();
+    }
+    return bucket;
+}
+
+// Running count / sum / sum of squares / max of each session metric for
+// one user, overall and per level, so progress pages read one small
+// document instead of aggregating every completed session.
+const progressRollupSchema = new mongoose.Schema({
+    userId: {
+        type: mongoose.Schema.Types.ObjectId,
+        ref: 'User',
+        required: true,
+        unique: true
+    },
+    overall: bucketDefinition(),
+    levels: {
+        easy: bucketDefinition(),
+        medium: bucketDefinition(),
+        hard: bucketDefinition()
+    },
+    // Set only by rebuildForUser, once this rollup and the user's
+    // TrendBuckets have been computed from all their sessions. A rollup
+    // created by recordSession before that counts only the sessions
+    // recorded since, so readers treat an unbuilt one as missing.
+    built: {
+        type: Boolean,
+        default: false
+    },
+    // Id of the last completed rebuild. The sessions it counted carry it as
+    // progressGeneration, and incremental updates only apply while it is
+    // unchanged, so each session is counted either by a rebuild or by
+    // recordSession, never both.
+    generation: {
+        type: mongoose.Schema.Types.ObjectId,
+        default: null
+    },
+    // Id of the rebuild in progress; recordSession waits while it is set
+    rebuilding: {
+        type: mongoose.Schema.Types.ObjectId,
+        default: null
+    }
+}, {
+    timestamps: true
+});
+
+// Adds one completed session to the rollup and its trend buckets, once
+// the caller has claimed the session's progressRecorded flag. The $inc only
+// applies while no rebuild is running and the rollup's generation is the
+// one read before checking the session, so a rebuild that counted the
+// session can't have overwritten or be about to overwrite it. For a user
+// without a built rollup this creates a partial one, which the first read
+// replaces via rebuildForUser.
+progressRollupSchema.statics.recordSession = async function(session) {
+    const Session = mongoose.model('Session');
+    const inc = {};
+    const max = {};
+    const prefixes = ['overall'];
+    if (LEVELS.includes(session.level)) prefixes.push(`levels.${session.level}`);
+
+    for (const prefix of prefixes) {
+        inc[`${prefix}.count`] = 1;
+        for (const [name, field] of Object.entries(METRIC_FIELDS)) {
+            const value = Number(session[field]) || 0;
+            inc[`${prefix}.${name}.sum`] = value;
+            inc[`${prefix}.${name}.sumSq`] = value * value;
+            max[`${prefix}.${name}.max`] = value;
+        }
+    }
+
+    for (let attempt = 0; attempt < RECORD_ATTEMPTS; attempt++) {
+        const rollup = await this.findOne({ userId: session.userId }).select('generation rebuilding').lean();
+        if (rollup && rollup.rebuilding) {
+            if (isStale(rollup.rebuilding)) {
+                // The session is completed, so a new rebuild counts it
+                await this.rebuildForUser(session.userId);
+                return;
+            }
+            await sleep(REBUILD_POLL_MS);
+            continue;
+        }
+
+        const generation = (rollup && rollup.generation) || null;
+        if (await Session.exists({ _id: session._id, progressGeneration: { $ne: null } })) {
+            return; // counted by a rebuild
+        }
+
+        try {
+            const result = await this.updateOne(
+                { userId: session.userId, generation, rebuilding: null },
+                { $inc: inc, $max: max },
+                { upsert: true, setDefaultsOnInsert: false }
+            );
+            if (result.matchedCount + result.upsertedCount === 1) {
+                await TrendBucket.recordSession(session, generation);
+                return;
+            }
+        } catch (error) {
+            // A rebuild started (or another first completion created the
+            // rollup) between the read and the update
+            if (error.code !== 11000) throw error;
+        }
+    }
+    throw new Error(`Gave up recording session ${session._id}: the rollup kept changing`);
+};
+
+// Recomputes a user's rollup and trend buckets from their completed
+// sessions. Concurrent calls in one process share a single rebuild; a
+// rebuild already running in another process is waited for.
+progressRollupSchema.statics.rebuildForUser = function(userId) {
+    const key = String(userId);
+    let pending = rebuilds.get(key);
+    if (!pending) {
+        pending = this.runRebuild(new mongoose.Types.ObjectId(key)).finally(() => rebuilds.delete(key));
+        rebuilds.set(key, pending);
+    }
+    return pending;
+};
+
+// Claims the rollup with a new generation id, which holds off
+// recordSession, then stamps every completed session with it. Both
+// aggregations read exactly the stamped sessions, so the rollup and the
+// trend buckets agree, and a session completing meanwhile is either
+// stamped (its own update then finds it counted) or left to recordSession
+// once the claim is released.
+progressRollupSchema.statics.runRebuild = async function(id) {
+    const Session = mongoose.model('Session');
+    const generation = new mongoose.Types.ObjectId();
+    const staleBefore = mongoose.Types.ObjectId.createFromTime(Math.floor((Date.now() - REBUILD_STALE_MS) / 1000));
+
+    try {
+        await this.updateOne(
+            { userId: id, $or: [{ rebuilding: null }, { rebuilding: { $lt: staleBefore } }] },
+            { $set: { rebuilding: generation } },
+            { upsert: true, setDefaultsOnInsert: false }
+        );
+    } catch (error) {
+        if (error.code !== 11000) throw error;
+        return this.waitForRebuild(id);
+    }
+
+    await Session.updateMany(
+        { userId: id, status: 'completed' },
+        { $set: { progressRecorded: true, progressGeneration: generation } }
+    );
+
+    const [rows] = await Promise.all([
+        Session.aggregate([
+            { $match: { userId: id, progressGeneration: generation } },
+            { $group: this.levelGroupStage() }
+        ]),
+        TrendBucket.rebuildForUser(id, generation)
+    ]);
+    const { overall, levels } = this.bucketsFromLevelRows(rows);
+
+    const rollup = await this.findOneAndUpdate(
+        { userId: id, rebuilding: generation },
+        { $set: { overall, levels, built: true, generation, rebuilding: null } },
+        { new: true, lean: true }
+    );
+    // Null if this rebuild stalled and another took over
+    return rollup || this.waitForRebuild(id);
+};
+
+// Waits for another process's rebuild to finish, or takes over once it
+// has gone stale.
+progressRollupSchema.statics.waitForRebuild = async function(id) {
+    for (;;) {
+        const rollup = await this.findOne({ userId: id }).lean();
+        if (!rollup || !rollup.rebuilding) return rollup;
+        if (isStale(rollup.rebuilding)) return this.runRebuild(id);
+        await sleep(REBUILD_POLL_MS);
+    }
+};
+
+// $group stage producing one row per level with the rollup's sums.
+progressRollupSchema.statics.levelGroupStage = function() {
+    const group = { _id: '$level', count: { $sum: 1 } };
+    for (const [name, field] of Object.entries(METRIC_FIELDS)) {
+        const value = { $ifNull: [`$${field}`, 0] };
+        group[`${name}Sum`] = { $sum: value };
+        group[`${name}SumSq`] = { $sum: { $multiply: [value, value] } };
+        group[`${name}Max`] = { $max: value };
+    }
+    return group;
+};
+
+// Turns levelGroupStage rows into rollup-shaped `{ overall, levels }`.
+progressRollupSchema.statics.bucketsFromLevelRows = function(rows) {
+    const emptyBucket = () => {
+        const bucket = { count: 0 };
+        for (const name of Object.keys(METRIC_FIELDS)) {
+            bucket[name] = { sum: 0, sumSq: 0, max: 0 };
+        }
+        return bucket;
+    };
+
+    const overall = emptyBucket();
+    const levels = { easy: emptyBucket(), medium: emptyBucket(), hard: emptyBucket() };
+
+    for (const row of rows) {
+        const bucket = levels[row._id];
+        overall.count += row.count;
+        if (bucket) bucket.count = row.count;
+
+        for (const name of Object.keys(METRIC_FIELDS)) {
+            const metric = { sum: row[`${name}Sum`], sumSq: row[`${name}SumSq`], max: row[`${name}Max`] || 0 };
+            if (bucket) bucket[name] = metric;
+            overall[name].sum += metric.sum;
+            overall[name].sumSq += metric.sumSq;
+            overall[name].max = Math.max(overall[name].max, metric.max);
+        }
+    }
+
+    return { overall, levels };
+};
+
+// Users whose sessions predate the rollup (or whose rollup so far only
+// holds sessions recorded incrementally) get it built on first read, as do
+// users whose last rebuild died part way.
+progressRollupSchema.statics.getForUser = async function(userId) {
+    const rollup = await this.findOne({ userId }).lean();
+    if (rollup && rollup.built && !(rollup.rebuilding && isStale(rollup.rebuilding))) {
+        return rollup;
+    }
+    return this.rebuildForUser(userId);
+};
+
+// count, total, mean, standard deviation and max of each metric in a bucket.
+progressRollupSchema.statics.summarize = function(bucket = {}) {
+    const count = bucket.count || 0;
+    const summary = { count };
+
+    for (const name of Object.keys(METRIC_FIELDS)) {
+        const metric = bucket[name] || {};
+        const sum = metric.sum || 0;
+        const avg = count > 0 ? sum / count : 0;
+        const variance = count > 0 ? Math.max(0, (metric.sumSq || 0) / count - avg * avg) : 0;
+
+        summary[name] = {
+            total: sum,
+            avg,
+            stdDev: Math.sqrt(variance),
+            max: metric.max || 0
+        };
+    }
+
+    return summary;
+};
+
+const ProgressRollup = mongoose.model('ProgressRollup', progressRollupSchema);
+
+ProgressRollup.METRIC_FIELDS = METRIC_FIELDS;
+ProgressRollup.LEVELS = LEVELS;
+
+module.exports = ProgressRollup;
@@ -0,0 +1,30 @@
+const mongoose = require('mongoose');
+
+// Token buckets of the API rate limiter when RATE_LIMIT_STORE=mongo
+// (services/rateLimitStore.js). `_id` is the bucket key; a bucket left
+// untouched long enough to refill is removed by the TTL index.
+const rateLimitBucketSchema = new mongoose.Schema({
+    _id: {
+        type: String
+    },
+    tokens: {
+        type: Number,
+        required: true
+    },
+    updatedAt: {
+        type: Date,
+        required: true
+    },
+    expiresAt: {
+        type: Date,
+        required: true
+    }
+}, {
+    versionKey: false
+});
+
+rateLimitBucketSchema.index({ expiresAt: 1 }, { expireAfterSeconds: 0 });
+
+const RateLimitBucket = mongoose.model('RateLimitBucket', rateLimitBucketSchema);
+
+module.exports = RateLimitBucket;
@@ -131,6 +131,17 @@ const sessionSchema = new mongoose.Schema({
     mlServiceUsed: {
         type: Boolean,
         default: true
+    },
+
+    // Set once the session has been added to the owner's ProgressRollup
+    progressRecorded: {
+        type: Boolean,
+        default: false
+    },
+    // The ProgressRollup rebuild that counted this session, if any
+    progressGeneration: {
+        type: mongoose.Schema.Types.ObjectId,
+        default: null
     }
 }, {
     timestamps: true,
@@ -144,6 +155,8 @@ const sessionSchema = new mongoose.Schema({
 
 // Indexes for better performance
 sessionSchema.index({ userId: 1, createdAt: -1 });
+// Also the keyset for history pages (see getHistoryPage)
+sessionSchema.index({ userId: 1, status: 1, completedAt: -1, _id: -1 });
 sessionSchema.index({ level: 1 });
 sessionSchema.index({ status: 1 });
 
@@ -175,6 +188,77 @@ sessionSchema.statics.getRecentSessions = function(userId, limit = 5) {
     .limit(limit);
 };
 
+// Fields a history page may ask for; _id and completedAt always come back
+// since the cursor is built from them.
+const HISTORY_FIELDS = [
+    'level', 'practiceType', 'duration', 'targetDuration', 'confidenceScore', 'clarityScore',
+    'paceWpm', 'volumeStability', 'fillerCount', 'feedback', 'improvements', 'startedAt', 'completedAt'
+];
+const DEFAULT_HISTORY_FIELDS = ['level', 'practiceType', 'duration', 'confidenceScore', 'clarityScore', 'completedAt'];
+
+function encodeHistoryCursor(session) {
+    return Buffer.from(JSON.stringify([session.completedAt.getTime(), String(session._id)])).toString('base64url');
+}
+
+function decodeHistoryCursor(cursor) {
+    try {
+        const [completedAt, id] = JSON.parse(Buffer.from(cursor, 'base64url').toString());
+        if (Number.isFinite(completedAt) && mongoose.Types.ObjectId.isValid(id)) {
+            return { completedAt: new Date(completedAt), _id: new mongoose.Types.ObjectId(id) };
+        }
+    } catch (error) {
+        // reported below
+    }
+    const error = new Error('Invalid history cursor');
+    error.code = 'INVALID_CURSOR';
+    throw error;
+}
+
+// One page of a user's completed sessions, newest first. Pages are keyed on
+// (completedAt, _id) rather than skipped over, so with the index above every
+// page is a single index range scan, however deep. Returns
+// `{ sessions, nextCursor }`; nextCursor is null on the last page.
+sessionSchema.statics.getHistoryPage = async function(userId, { cursor, limit = 20, from, to, levels, fields } = {}) {
+    const filter = {
+        userId: new mongoose.Types.ObjectId(String(userId)),
+        status: 'completed',
+        completedAt: { $ne: null }
+    };
+    if (from) filter.completedAt.$gte = from;
+    if (to) filter.completedAt.$lt = to;
+    if (levels && levels.length > 0) filter.level = { $in: levels };
+
+    if (cursor) {
+        const after = decodeHistoryCursor(cursor);
+        filter.$or = [
+            { completedAt: { $lt: after.completedAt } },
+            { completedAt: after.completedAt, _id: { $lt: after._id } }
+        ];
+    }
+
+    const selected = (fields && fields.length > 0 ? fields : DEFAULT_HISTORY_FIELDS)
+        .filter(field => HISTORY_FIELDS.includes(field));
+    const projection = [...new Set([...selected, 'completedAt'])].join(' ');
+
+    const sessions = await this.find(filter)
+        .select(projection)
+        .sort({ completedAt: -1, _id: -1 })
+        .limit(limit + 1)
+        .lean();
+
+    const hasMore = sessions.length > limit;
+    if (hasMore) sessions.pop();
+
+    return {
+        sessions,
+        nextCursor: hasMore ? encodeHistoryCursor(sessions[sessions.length - 1]) : null
+    };
+};
+
 const Session = mongoose.model('Session', sessionSchema);
 
+Session.HISTORY_FIELDS = HISTORY_FIELDS;
+Session.encodeHistoryCursor = encodeHistoryCursor;
+Session.decodeHistoryCursor = decodeHistoryCursor;
+
 module.exports = Session;
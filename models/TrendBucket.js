@@ -0,0 +1,192 @@
+const mongoose = require('mongoose');
+
+// Trend metric name -> Session field (averaged per bucket)
+const TREND_METRICS = {
+    confidence: 'confidenceScore',
+    clarity: 'clarityScore',
+    pace: 'paceWpm'
+};
+
+const GRANULARITIES = ['day', 'week', 'month'];
+
+// Start (UTC) of the day, ISO week (Monday) or month containing `date`.
+function periodStart(date, granularity) {
+    const d = new Date(date);
+    const start = Date.UTC(d.getUTCFullYear(), d.getUTCMonth(), granularity === 'month' ? 1 : d.getUTCDate());
+    if (granularity !== 'week') return new Date(start);
+    return new Date(start - ((d.getUTCDay() + 6) % 7) * 24 * 60 * 60 * 1000);
+}
+
+function addPeriods(date, granularity, count) {
+    const d = new Date(date);
+    if (granularity === 'month') {
+        return new Date(Date.UTC(d.getUTCFullYear(), d.getUTCMonth() + count, 1));
+    }
+    return new Date(d.getTime() + count * (granularity === 'week' ? 7 : 1) * 24 * 60 * 60 * 1000);
+}
+
+function sumsDefinition() {
+    const sums = {
+        fillers: { type: Number, default: 0 },
+        duration: { type: Number, default: 0 }
+    };
+    for (const name of Object.keys(TREND_METRICS)) {
+        sums[name] = { type: Number, default: 0 };
+    }
+    return sums;
+}
+
+// Per-user session totals for one day, ISO week or month, so a trend chart
+// is a single range read over { userId, granularity, periodStart } however
+// many sessions it covers. Kept up to date by recordSession when a session
+// completes, and rebuilt along with the user's ProgressRollup.
+const trendBucketSchema = new mongoose.Schema({
+    userId: {
+        type: mongoose.Schema.Types.ObjectId,
+        ref: 'User',
+        required: true
+    },
+    granularity: {
+        type: String,
+        enum: GRANULARITIES,
+        required: true
+    },
+    periodStart: {
+        type: Date,
+        required: true
+    },
+    count: {
+        type: Number,
+        default: 0
+    },
+    sums: sumsDefinition(),
+    // The ProgressRollup generation this bucket was built under (see
+    // ProgressRollup.recordSession)
+    generation: {
+        type: mongoose.Schema.Types.ObjectId,
+        default: null
+    }
+}, {
+    timestamps: true
+});
+
+trendBucketSchema.index({ userId: 1, granularity: 1, periodStart: 1 }, { unique: true });
+
+function sessionIncrements(session) {
+    const inc = {
+        count: 1,
+        'sums.fillers': Number(session.fillerCount && session.fillerCount.total) || 0,
+        'sums.duration': Number(session.duration) || 0
+    };
+    for (const [name, field] of Object.entries(TREND_METRICS)) {
+        inc[`sums.${name}`] = Number(session[field]) || 0;
+    }
+    return inc;
+}
+
+// Bulk upserts; two writers creating the same new bucket at once make one
+// of them fail on the unique index, so those ops are retried as plain
+// updates. A retry that still matches nothing hit a bucket of another
+// generation, which a rebuild has already counted the session in.
+async function upsertBuckets(model, ops) {
+    try {
+        await model.bulkWrite(ops, { ordered: false });
+    } catch (error) {
+        const writeErrors = error.writeErrors || [];
+        if (writeErrors.length === 0 || writeErrors.some(writeError => writeError.code !== 11000)) throw error;
+        await model.bulkWrite(writeErrors.map(writeError => ({
+            updateOne: { ...ops[writeError.index].updateOne, upsert: false }
+        })), { ordered: false });
+    }
+}
+
+// Adds one completed session to its day, week and month buckets of the
+// given rollup generation. Called by ProgressRollup.recordSession.
+trendBucketSchema.statics.recordSession = function(session, generation = null) {
+    const inc = sessionIncrements(session);
+    return upsertBuckets(this, GRANULARITIES.map(granularity => ({
+        updateOne: {
+            filter: {
+                userId: session.userId,
+                granularity,
+                periodStart: periodStart(session.completedAt, granularity),
+                generation
+            },
+            update: { $inc: inc },
+            upsert: true,
+            setDefaultsOnInsert: false
+        }
+    })));
+};
+
+// Recomputes every bucket of a user from the sessions stamped with
+// `generation` in one aggregation, and drops buckets of older generations.
+// Called by ProgressRollup.runRebuild, which has stamped the sessions.
+trendBucketSchema.statics.rebuildForUser = async function(userId, generation) {
+    const Session = mongoose.model('Session');
+    const id = new mongoose.Types.ObjectId(String(userId));
+    const at = '$completedAt';
+
+    const group = {
+        _id: { granularity: '$period.granularity', periodStart: '$period.start' },
+        count: { $sum: 1 },
+        fillers: { $sum: { $ifNull: ['$fillerCount.total', 0] } },
+        duration: { $sum: { $ifNull: ['$duration', 0] } }
+    };
+    for (const [name, field] of Object.entries(TREND_METRICS)) {
+        group[name] = { $sum: { $ifNull: [`$${field}`, 0] } };
+    }
+
+    const rows = await Session.aggregate([
+        { $match: { userId: id, progressGeneration: generation, completedAt: { $ne: null } } },
+        {
+            $addFields: {
+                period: [
+                    { granularity: 'day', start: { $dateFromParts: { year: { $year: at }, month: { $month: at }, day: { $dayOfMonth: at } } } },
+                    { granularity: 'week', start: { $dateFromParts: { isoWeekYear: { $isoWeekYear: at }, isoWeek: { $isoWeek: at }, isoDayOfWeek: 1 } } },
+                    { granularity: 'month', start: { $dateFromParts: { year: { $year: at }, month: { $month: at } } } }
+                ]
+            }
+        },
+        { $unwind: '$period' },
+        { $group: group }
+    ]);
+
+    if (rows.length > 0) {
+        await upsertBuckets(this, rows.map((row) => {
+            const sums = { fillers: row.fillers, duration: row.duration };
+            for (const name of Object.keys(TREND_METRICS)) sums[name] = row[name];
+            return {
+                updateOne: {
+                    filter: { userId: id, granularity: row._id.granularity, periodStart: row._id.periodStart },
+                    update: { $set: { count: row.count, sums, generation } },
+                    upsert: true
+                }
+            };
+        }));
+    }
+
+    // Buckets whose sessions no longer exist
+    await this.deleteMany({ userId: id, generation: { $ne: generation } });
+};
+
+// Buckets of one granularity with periodStart in [from, to), oldest first.
+trendBucketSchema.statics.getSeries = function(userId, granularity, from, to) {
+    return this.find({
+        userId: new mongoose.Types.ObjectId(String(userId)),
+        granularity,
+        periodStart: { $gte: from, $lt: to }
+    })
+        .select('periodStart count sums')
+        .sort({ periodStart: 1 })
+        .lean();
+};
+
+const TrendBucket = mongoose.model('TrendBucket', trendBucketSchema);
+
+TrendBucket.TREND_METRICS = TREND_METRICS;
+TrendBucket.GRANULARITIES = GRANULARITIES;
+TrendBucket.periodStart = periodStart;
+TrendBucket.addPeriods = addPeriods;
+
+module.exports = TrendBucket;
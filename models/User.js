@@ -1,5 +1,5 @@
 const mongoose = require('mongoose');
-const bcrypt = require('bcryptjs');
+const passwordHasher = require('../services/passwordHasher');
 
 const userSchema = new mongoose.Schema({
     // Basic user information
@@ -163,13 +163,12 @@ const userSchema = new mongoose.Schema({
     }
 });
 
-// Hash password before saving
+// Hash password before saving (on the worker pool in services/passwordHasher.js)
 userSchema.pre('save', async function(next) {
     if (!this.isModified('password')) return next();
 
     try {
-        const salt = await bcrypt.genSalt(parseInt(process.env.BCRYPT_ROUNDS) || 12);
-        this.password = await bcrypt.hash(this.password, salt);
+        this.password = await passwordHasher.hashPassword(this.password);
         next();
     } catch (error) {
         next(error);
@@ -178,7 +177,12 @@ userSchema.pre('save', async function(next) {
 
 // Instance method to check password
 userSchema.methods.comparePassword = async function(candidatePassword) {
-    return await bcrypt.compare(candidatePassword, this.password);
+    return await passwordHasher.comparePassword(candidatePassword, this.password);
+};
+
+// Instance method to check whether the stored hash predates the current BCRYPT_ROUNDS
+userSchema.methods.passwordNeedsRehash = function() {
+    return passwordHasher.needsRehash(this.password);
 };
 
 // Instance method to update user statistics
@@ -241,6 +245,33 @@ userSchema.methods.addAchievement = function(achievementId, points) {
     return false;
 };
 
+// Keep the authMiddleware principal cache in step with writes to users.
+// Required lazily: services/principalCache.js itself loads this model.
+function invalidatePrincipal(userId) {
+    const principalCache = require('../services/principalCache');
+    if (userId === undefined || userId === null || (typeof userId === 'object' && !(userId instanceof mongoose.Types.ObjectId))) {
+        principalCache.clearPrincipals();
+    } else {
+        principalCache.invalidatePrincipal(userId);
+    }
+}
+
+userSchema.post('save', function(doc) {
+    invalidatePrincipal(doc._id);
+});
+
+userSchema.post('deleteOne', { document: true, query: false }, function(doc) {
+    invalidatePrincipal(doc._id);
+});
+
+userSchema.post(['updateOne', 'findOneAndUpdate', 'replaceOne', 'findOneAndReplace', 'deleteOne', 'findOneAndDelete'], { document: false, query: true }, function() {
+    invalidatePrincipal(this.getFilter()._id);
+});
+
+userSchema.post(['updateMany', 'deleteMany'], function() {
+    invalidatePrincipal(null);
+});
+
 const User = mongoose.model('User', userSchema);
 
 module.exports = User;
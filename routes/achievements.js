@@ -10,7 +10,7 @@ const router = express.Router();
 // @access  Private
 router.get('/', authMiddleware, async (req, res) => {
     try {
-        const achievements = await getAllAchievements(req.userId);
+        const achievements = await getAllAchievements(req.userId, req.user);
 
         res.json({
             success: true,
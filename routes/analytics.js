@@ -1,6 +1,10 @@
 const express = require('express');
+const { query, validationResult } = require('express-validator');
 const Session = require('../models/Session');
+const ProgressRollup = require('../models/ProgressRollup');
+const TrendBucket = require('../models/TrendBucket');
 const authMiddleware = require('../middleware/auth');
+const { getTrends, TrendRangeError, MAX_WINDOW } = require('../services/analyticsService');
 const logger = require('../utils/logger');
 
 const router = express.Router();
@@ -10,20 +14,22 @@ const router = express.Router();
 // @access  Private
 router.get('/', authMiddleware, async (req, res) => {
     try {
-        const sessions = await Session.find({
-            userId: req.userId,
-            status: 'completed'
-        }).select('confidenceScore clarityScore completedAt level').sort({ completedAt: -1 }).limit(10);
+        const [sessions, rollup] = await Promise.all([
+            Session.find({
+                userId: req.userId,
+                status: 'completed'
+            }).select('confidenceScore clarityScore completedAt level').sort({ completedAt: -1 }).limit(10),
+            ProgressRollup.getForUser(req.userId)
+        ]);
+        const overall = ProgressRollup.summarize(rollup.overall);
 
         res.json({
             success: true,
             analytics: {
                 recentSessions: sessions,
                 summary: {
-                    totalSessions: sessions.length,
-                    avgConfidence: sessions.length > 0 
-                        ? Math.round(sessions.reduce((sum, s) => sum + s.confidenceScore, 0) / sessions.length)
-                        : 0
+                    totalSessions: overall.count,
+                    avgConfidence: Math.round(overall.confidence.avg)
                 }
             }
         });
@@ -37,4 +43,68 @@ router.get('/', authMiddleware, async (req, res) => {
     }
 });
 
+const trendsValidation = [
+    query('granularity')
+        .optional()
+        .isIn(TrendBucket.GRANULARITIES)
+        .withMessage('Granularity must be day, week, or month'),
+    query('from')
+        .optional()
+        .isISO8601()
+        .withMessage('from must be an ISO 8601 date'),
+    query('to')
+        .optional()
+        .isISO8601()
+        .withMessage('to must be an ISO 8601 date'),
+    query('window')
+        .optional()
+        .isInt({ min: 1, max: MAX_WINDOW })
+        .withMessage(`Window must be between 1 and ${MAX_WINDOW} periods`)
+];
+
+// @route   GET /api/analytics/trends
+// @desc    Daily, weekly or monthly averages of confidence, clarity, pace
+//          and filler rate, with moving averages and period-over-period deltas
+// @access  Private
+router.get('/trends', authMiddleware, trendsValidation, async (req, res) => {
+    try {
+        const errors = validationResult(req);
+        if (!errors.isEmpty()) {
+            return res.status(400).json({
+                success: false,
+                message: 'Validation failed',
+                errors: errors.array()
+            });
+        }
+
+        const trends = await getTrends(req.userId, {
+            granularity: req.query.granularity || 'week',
+            from: req.query.from ? new Date(req.query.from) : null,
+            to: req.query.to ? new Date(req.query.to) : null,
+            window: parseInt(req.query.window) || 4
+        });
+
+        res.json({
+            success: true,
+            trends
+        });
+
+    } catch (error) {
+        if (error instanceof TrendRangeError) {
+            return res.status(400).json({
+                success: false,
+                message: error.message,
+                code: error.code
+            });
+        }
+
+        logger.error('Get analytics trends error:', error);
+        res.status(500).json({
+            success: false,
+            message: 'Failed to fetch analytics trends',
+            code: 'TRENDS_FETCH_FAILED'
+        });
+    }
+});
+
 module.exports = router;
@@ -3,6 +3,7 @@ const jwt = require('jsonwebtoken');
 const { body, validationResult } = require('express-validator');
 const User = require('../models/User');
 const authMiddleware = require('../middleware/auth');
+const { HasherBusyError } = require('../services/passwordHasher');
 const logger = require('../utils/logger');
 
 const router = express.Router();
@@ -117,6 +118,15 @@ router.post('/register', registerValidation, async (req, res) => {
         });
 
     } catch (error) {
+        if (error instanceof HasherBusyError) {
+            logger.warn(`Registration error: ${error.message}`);
+            return res.status(503).json({
+                success: false,
+                message: error.message,
+                code: error.code
+            });
+        }
+
         logger.error('Registration error:', error);
         res.status(500).json({
             success: false,
@@ -162,6 +172,10 @@ router.post('/login', loginValidation, async (req, res) => {
         }
 
         user.lastLoginAt = new Date();
+        if (user.passwordNeedsRehash()) {
+            // Re-hashed at the current cost by the pre-save hook
+            user.password = password;
+        }
         await user.save();
 
         const tokens = generateTokens(user._id);
@@ -192,6 +206,15 @@ router.post('/login', loginValidation, async (req, res) => {
         });
 
     } catch (error) {
+        if (error instanceof HasherBusyError) {
+            logger.warn(`Login error: ${error.message}`);
+            return res.status(503).json({
+                success: false,
+                message: error.message,
+                code: error.code
+            });
+        }
+
         logger.error('Login error:', error);
         res.status(500).json({
             success: false,
@@ -206,15 +229,7 @@ router.post('/login', loginValidation, async (req, res) => {
 // @access  Private
 router.get('/me', authMiddleware, async (req, res) => {
     try {
-        const user = await User.findById(req.userId);
-
-        if (!user) {
-            return res.status(404).json({
-                success: false,
-                message: 'User not found',
-                code: 'USER_NOT_FOUND'
-            });
-        }
+        const user = req.user;
 
         res.json({
             success: true,
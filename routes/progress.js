@@ -1,6 +1,5 @@
 const express = require('express');
-const Session = require('../models/Session');
-const User = require('../models/User');
+const ProgressRollup = require('../models/ProgressRollup');
 const authMiddleware = require('../middleware/auth');
 const logger = require('../utils/logger');
 
@@ -11,36 +10,10 @@ const router = express.Router();
 // @access  Private
 router.get('/overview', authMiddleware, async (req, res) => {
     try {
-        const user = await User.findById(req.userId);
+        const user = req.user;
 
-        if (!user) {
-            return res.status(404).json({
-                success: false,
-                message: 'User not found'
-            });
-        }
-
-        const progressData = await Session.aggregate([
-            { $match: { userId: user._id, status: 'completed' } },
-            {
-                $group: {
-                    _id: null,
-                    totalSessions: { $sum: 1 },
-                    avgConfidence: { $avg: '$confidenceScore' },
-                    avgClarity: { $avg: '$clarityScore' },
-                    totalPracticeTime: { $sum: '$duration' },
-                    bestConfidenceScore: { $max: '$confidenceScore' }
-                }
-            }
-        ]);
-
-        const stats = progressData[0] || {
-            totalSessions: 0,
-            avgConfidence: 0,
-            avgClarity: 0,
-            totalPracticeTime: 0,
-            bestConfidenceScore: 0
-        };
+        const rollup = await ProgressRollup.getForUser(user._id);
+        const overall = ProgressRollup.summarize(rollup.overall);
 
         res.json({
             success: true,
@@ -53,11 +26,11 @@ router.get('/overview', authMiddleware, async (req, res) => {
                     points: user.points
                 },
                 overall: {
-                    totalSessions: stats.totalSessions,
-                    avgConfidence: Math.round(stats.avgConfidence || 0),
-                    avgClarity: Math.round(stats.avgClarity || 0),
-                    totalPracticeTime: stats.totalPracticeTime,
-                    bestConfidenceScore: stats.bestConfidenceScore || 0
+                    totalSessions: overall.count,
+                    avgConfidence: Math.round(overall.confidence.avg),
+                    avgClarity: Math.round(overall.clarity.avg),
+                    totalPracticeTime: overall.duration.total,
+                    bestConfidenceScore: overall.confidence.max
                 }
             }
         });
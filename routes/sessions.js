@@ -1,29 +1,69 @@
 const express = require('express');
-const multer = require('multer');
-const { body, validationResult } = require('express-validator');
+const { body, query, validationResult } = require('express-validator');
 const Session = require('../models/Session');
-const User = require('../models/User');
 const authMiddleware = require('../middleware/auth');
+const { ALLOWED_TYPES, audioUpload, discardUpload } = require('../middleware/upload');
 const logger = require('../utils/logger');
-const { analyzeSpeech } = require('../services/speechAnalysisService');
+const {
+    completeSessionAnalysis,
+    completeWithBasicMetrics,
+    formatSessionResult,
+    formatAnalyzedSession,
+    formatBasicSession
+} = require('../services/sessionService');
+const { QueueFullError, getAnalysisQueue } = require('../services/analysisQueue');
+const {
+    UploadError,
+    initUpload,
+    getUpload,
+    writeChunk,
+    finalizeUpload,
+    abortUpload
+} = require('../services/resumableUpload');
 
 const router = express.Router();
 
-const storage = multer.memoryStorage();
-const upload = multer({
-    storage: storage,
-    limits: {
-        fileSize: 10 * 1024 * 1024 // 10MB
-    },
-    fileFilter: (req, file, cb) => {
-        const allowedTypes = ['audio/wav', 'audio/mp3', 'audio/mp4', 'audio/mpeg', 'audio/webm'];
-        if (allowedTypes.includes(file.mimetype)) {
-            cb(null, true);
-        } else {
-            cb(new Error('Invalid file type. Only audio files are allowed.'), false);
+// Job-queue mode: uploads return 202 and are analyzed by a bounded worker
+// pool. Enabled globally with ANALYSIS_JOB_QUEUE=true, or per request with
+// `?async=true` / `Prefer: respond-async`.
+const ANALYSIS_JOB_QUEUE = process.env.ANALYSIS_JOB_QUEUE === 'true';
+const SSE_HEARTBEAT_MS = 15000;
+const MAX_PAGE_SIZE = 100;
+
+function wantsAsyncAnalysis(req) {
+    if (req.query.async !== undefined) {
+        return req.query.async === 'true';
+    }
+    return ANALYSIS_JOB_QUEUE || /respond-async/i.test(req.get('Prefer') || '');
+}
+
+// Loads the open session before the body is read, so uploads for unknown
+// or finished sessions are rejected without receiving any audio and the
+// size limit can follow the session's practice type. A 'failed' session
+// (its analysis could not be saved) takes a new upload, which is then
+// usually answered from the analysis cache.
+async function loadUploadSession(req, res, next) {
+    try {
+        const session = await Session.findOne({
+            _id: req.params.sessionId,
+            userId: req.userId,
+            status: { $in: ['started', 'recording', 'failed'] }
+        });
+
+        if (!session) {
+            return res.status(404).json({
+                success: false,
+                message: 'Session not found or already completed',
+                code: 'SESSION_NOT_FOUND'
+            });
         }
+
+        req.uploadSession = session;
+        next();
+    } catch (error) {
+        next(error);
     }
-});
+}
 
 const startSessionValidation = [
     body('level')
@@ -100,15 +140,119 @@ router.post('/start', authMiddleware, startSessionValidation, async (req, res) =
     }
 });
 
+// Shared tail of the upload and resumable-finalize handlers: analyzes the
+// stored audio inline, or queues it and answers 202. Returns true when the
+// file was handed to the job queue, which then owns (and removes) it.
+async function respondWithAnalysis(req, res, session, audioFile, duration) {
+    const sessionId = String(session._id);
+    const runAsync = wantsAsyncAnalysis(req);
+    const queue = runAsync ? getAnalysisQueue() : null;
+
+    const queueFull = () => res.status(503).json({
+        success: false,
+        message: 'Analysis queue is full, please retry shortly',
+        code: 'ANALYSIS_QUEUE_FULL'
+    });
+
+    if (runAsync && queue.isFull()) {
+        queueFull();
+        return false;
+    }
+
+    const previous = { status: session.status, duration: session.duration, audioSize: session.audioSize };
+    session.status = 'analyzing';
+    session.duration = parseInt(duration) || 0;
+    session.audioSize = audioFile.size;
+    await session.save();
+
+    if (runAsync) {
+        let job;
+        try {
+            job = queue.enqueue({ session, upload: audioFile }, { sessionId: session._id });
+        } catch (error) {
+            if (!(error instanceof QueueFullError)) throw error;
+            // Filled up while the session was saving: put it back so the
+            // client can retry the upload
+            Object.assign(session, previous);
+            await session.save();
+            queueFull();
+            return false;
+        }
+
+        logger.info(`Queued speech analysis job ${job.id} for session: ${sessionId}`);
+
+        res.status(202)
+            .location(`/api/sessions/${sessionId}/status`)
+            .json({
+                success: true,
+                message: 'Audio uploaded, analysis queued',
+                job: queue.describe(job),
+                statusUrl: `/api/sessions/${sessionId}/status`,
+                eventsUrl: `/api/sessions/${sessionId}/events`
+            });
+        return true;
+    }
+
+    try {
+        logger.info(`Starting speech analysis for session: ${sessionId}`);
+
+        const { user, newAchievements } = await completeSessionAnalysis(session, audioFile);
+
+        logger.info(`Speech analysis completed for session: ${sessionId}`);
+
+        res.json({
+            success: true,
+            message: 'Audio uploaded and analyzed successfully',
+            ...formatAnalyzedSession(session, user, newAchievements)
+        });
+
+    } catch (analysisError) {
+        logger.error('Analysis error:', analysisError);
+
+        try {
+            await completeWithBasicMetrics(session);
+        } catch (saveError) {
+            // Don't leave the session stuck in 'analyzing'; 'failed' lets
+            // the client upload again
+            await Session.updateOne({ _id: session._id }, { status: 'failed' });
+            throw saveError;
+        }
+
+        res.json({
+            success: true,
+            message: 'Audio uploaded successfully.',
+            ...formatBasicSession(session)
+        });
+    }
+    return false;
+}
+
+function sendUploadError(res, error, fallbackMessage, fallbackCode) {
+    if (error instanceof UploadError) {
+        return res.status(error.status).json({
+            success: false,
+            message: error.message,
+            code: error.code,
+            ...error.details
+        });
+    }
+
+    logger.error(`${fallbackMessage}:`, error);
+    res.status(500).json({
+        success: false,
+        message: fallbackMessage,
+        code: fallbackCode
+    });
+}
+
 // @route   POST /api/sessions/:sessionId/upload
 // @desc    Upload audio and analyze
 // @access  Private
-router.post('/:sessionId/upload', authMiddleware, upload.single('audio'), async (req, res) => {
-    try {
-        const { sessionId } = req.params;
-        const { duration } = req.body;
-        const audioFile = req.file;
+router.post('/:sessionId/upload', authMiddleware, loadUploadSession, audioUpload('audio'), async (req, res) => {
+    const audioFile = req.file;
+    let queued = false;
 
+    try {
         if (!audioFile) {
             return res.status(400).json({
                 success: false,
@@ -117,145 +261,382 @@ router.post('/:sessionId/upload', authMiddleware, upload.single('audio'), async
             });
         }
 
+        queued = await respondWithAnalysis(req, res, req.uploadSession, audioFile, req.body.duration);
+
+    } catch (error) {
+        logger.error('Upload and analyze error:', error);
+        res.status(500).json({
+            success: false,
+            message: 'Failed to upload and analyze audio',
+            code: 'UPLOAD_ANALYZE_FAILED'
+        });
+    } finally {
+        if (!queued) discardUpload(audioFile);
+    }
+});
+
+const initUploadValidation = [
+    body('size')
+        .isInt({ min: 1 })
+        .withMessage('Size must be a positive number of bytes'),
+    body('mimeType')
+        .isIn(ALLOWED_TYPES)
+        .withMessage('Invalid file type. Only audio files are allowed.'),
+    body('sha256')
+        .optional()
+        .matches(/^[0-9a-fA-F]{64}$/)
+        .withMessage('sha256 must be a hex SHA-256 digest')
+];
+
+// @route   POST /api/sessions/:sessionId/uploads
+// @desc    Start (or resume) a resumable chunked upload
+// @access  Private
+router.post('/:sessionId/uploads', authMiddleware, loadUploadSession, initUploadValidation, async (req, res) => {
+    try {
+        const errors = validationResult(req);
+        if (!errors.isEmpty()) {
+            return res.status(400).json({
+                success: false,
+                message: 'Validation failed',
+                errors: errors.array()
+            });
+        }
+
+        const upload = await initUpload(req.uploadSession, {
+            size: parseInt(req.body.size),
+            mimeType: req.body.mimeType,
+            sha256: req.body.sha256 ? req.body.sha256.toLowerCase() : null
+        });
+
+        res.status(upload.offset > 0 ? 200 : 201).json({
+            success: true,
+            upload,
+            uploadUrl: `/api/sessions/${req.params.sessionId}/uploads`
+        });
+
+    } catch (error) {
+        sendUploadError(res, error, 'Failed to start upload', 'UPLOAD_INIT_FAILED');
+    }
+});
+
+// @route   GET /api/sessions/:sessionId/uploads
+// @desc    Current offset of a resumable upload, to resume after a failure
+// @access  Private
+router.get('/:sessionId/uploads', authMiddleware, loadUploadSession, async (req, res) => {
+    try {
+        const upload = await getUpload(req.params.sessionId);
+        if (!upload) {
+            return res.status(404).json({
+                success: false,
+                message: 'No upload in progress for this session',
+                code: 'UPLOAD_NOT_FOUND'
+            });
+        }
+
+        res.set('Upload-Offset', String(upload.offset)).json({ success: true, upload });
+
+    } catch (error) {
+        sendUploadError(res, error, 'Failed to fetch upload status', 'UPLOAD_STATUS_FAILED');
+    }
+});
+
+// @route   PUT /api/sessions/:sessionId/uploads
+// @desc    Append one chunk; raw body at the `Upload-Offset` header (or
+//          `?offset=`), verified against the `X-Chunk-SHA256` header
+// @access  Private
+router.put('/:sessionId/uploads', authMiddleware, loadUploadSession, async (req, res) => {
+    try {
+        const offset = parseInt(req.get('Upload-Offset') ?? req.query.offset);
+        const checksum = req.get('X-Chunk-SHA256');
+
+        if (!Number.isInteger(offset) || offset < 0) {
+            return res.status(400).json({
+                success: false,
+                message: 'Upload-Offset header is required',
+                code: 'UPLOAD_OFFSET_REQUIRED'
+            });
+        }
+
+        if (!checksum || !/^[0-9a-fA-F]{64}$/.test(checksum)) {
+            return res.status(400).json({
+                success: false,
+                message: 'X-Chunk-SHA256 header with the chunk\'s SHA-256 is required',
+                code: 'CHUNK_CHECKSUM_REQUIRED'
+            });
+        }
+
+        const contentLength = req.get('Content-Length');
+        const upload = await writeChunk(req.params.sessionId, offset, req, {
+            checksum,
+            contentLength: contentLength !== undefined ? parseInt(contentLength) : undefined
+        });
+
+        res.set('Upload-Offset', String(upload.offset)).json({ success: true, upload });
+
+    } catch (error) {
+        if (error.details && error.details.offset !== undefined) {
+            res.set('Upload-Offset', String(error.details.offset));
+        }
+        sendUploadError(res, error, 'Failed to store upload chunk', 'UPLOAD_CHUNK_FAILED');
+    }
+});
+
+// @route   POST /api/sessions/:sessionId/uploads/finalize
+// @desc    Assemble a completed resumable upload and analyze it
+// @access  Private
+router.post('/:sessionId/uploads/finalize', authMiddleware, loadUploadSession, async (req, res) => {
+    let audioFile = null;
+    let queued = false;
+
+    try {
+        audioFile = await finalizeUpload(req.params.sessionId);
+        queued = await respondWithAnalysis(req, res, req.uploadSession, audioFile, req.body.duration);
+
+    } catch (error) {
+        sendUploadError(res, error, 'Failed to finalize and analyze upload', 'UPLOAD_FINALIZE_FAILED');
+    } finally {
+        if (!queued) discardUpload(audioFile);
+    }
+});
+
+// @route   DELETE /api/sessions/:sessionId/uploads
+// @desc    Abandon a resumable upload and remove its staged chunks
+// @access  Private
+router.delete('/:sessionId/uploads', authMiddleware, loadUploadSession, async (req, res) => {
+    try {
+        await abortUpload(req.params.sessionId);
+        res.json({ success: true, message: 'Upload discarded' });
+
+    } catch (error) {
+        sendUploadError(res, error, 'Failed to discard upload', 'UPLOAD_ABORT_FAILED');
+    }
+});
+
+// @route   GET /api/sessions/:sessionId/status
+// @desc    Poll analysis status; includes results once completed
+// @access  Private
+router.get('/:sessionId/status', authMiddleware, async (req, res) => {
+    try {
         const session = await Session.findOne({
-            _id: sessionId,
-            userId: req.userId,
-            status: { $in: ['started', 'recording'] }
+            _id: req.params.sessionId,
+            userId: req.userId
         });
 
         if (!session) {
             return res.status(404).json({
                 success: false,
-                message: 'Session not found or already completed',
+                message: 'Session not found',
                 code: 'SESSION_NOT_FOUND'
             });
         }
 
-        session.status = 'analyzing';
-        session.duration = parseInt(duration) || 0;
-        session.audioSize = audioFile.size;
-        await session.save();
+        const queue = getAnalysisQueue();
+        const job = queue.getJobForSession(session._id);
 
-        try {
-            logger.info(`Starting speech analysis for session: ${sessionId}`);
+        res.json({
+            success: true,
+            status: session.status,
+            job: job ? queue.describe(job) : null,
+            ...(session.status === 'completed' && {
+                result: job && job.result ? job.result : { session: formatSessionResult(session) }
+            })
+        });
 
-            const analysisResult = await analyzeSpeech(audioFile.buffer, {
-                level: session.level,
-                duration: session.duration,
-                practiceType: session.practiceType
+    } catch (error) {
+        logger.error('Get session status error:', error);
+        res.status(500).json({
+            success: false,
+            message: 'Failed to fetch session status',
+            code: 'SESSION_STATUS_FAILED'
+        });
+    }
+});
+
+// @route   GET /api/sessions/:sessionId/events
+// @desc    Server-sent events stream that fires when analysis finishes
+// @access  Private
+router.get('/:sessionId/events', authMiddleware, async (req, res) => {
+    try {
+        const session = await Session.findOne({
+            _id: req.params.sessionId,
+            userId: req.userId
+        });
+
+        if (!session) {
+            return res.status(404).json({
+                success: false,
+                message: 'Session not found',
+                code: 'SESSION_NOT_FOUND'
             });
+        }
 
-            session.transcript = analysisResult.transcript;
-            session.confidenceScore = analysisResult.confidence_score;
-            session.clarityScore = analysisResult.clarity_score;
-            session.paceWpm = analysisResult.pace_wpm;
-            session.volumeStability = analysisResult.volume_stability_score;
-
-            session.fillerCount = {
-                total: analysisResult.total_filler_count,
-                um: analysisResult.filler_breakdown.um || 0,
-                uh: analysisResult.filler_breakdown.uh || 0,
-                like: analysisResult.filler_breakdown.like || 0,
-                you_know: analysisResult.filler_breakdown.you_know || 0,
-                other: Math.max(0, analysisResult.total_filler_count - 
-                    (analysisResult.filler_breakdown.um || 0) - 
-                    (analysisResult.filler_breakdown.uh || 0) - 
-                    (analysisResult.filler_breakdown.like || 0) - 
-                    (analysisResult.filler_breakdown.you_know || 0))
-            };
-
-            session.feedback = analysisResult.feedback;
-            session.improvements = analysisResult.improvements;
-            session.status = 'completed';
-            session.completedAt = new Date();
+        res.set({
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        });
+        res.flushHeaders();
+
+        const send = (event, data) => {
+            res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+            // compression() buffers writes until flushed
+            if (res.flush) res.flush();
+        };
+
+        const sendFinalStatus = (current) => {
+            send(current.status === 'completed' ? 'complete' : 'status', {
+                status: current.status,
+                ...(current.status === 'completed' && { result: { session: formatSessionResult(current) } })
+            });
+            res.end();
+        };
 
-            await session.save();
+        if (session.status !== 'analyzing') {
+            return sendFinalStatus(session);
+        }
 
-            const user = await User.findById(req.userId);
-            user.updateStats({
-                level: session.level,
-                confidenceScore: session.confidenceScore,
-                duration: session.duration
+        // In cluster mode the job may be running on another worker, whose
+        // queue relays its completion here (see services/analysisQueue.js).
+        const queue = getAnalysisQueue();
+        const job = queue.getJobForSession(session._id);
+
+        const eventName = `session:${session._id}`;
+        const heartbeat = setInterval(() => {
+            res.write(': keep-alive\n\n');
+            if (res.flush) res.flush();
+        }, SSE_HEARTBEAT_MS);
+
+        const cleanup = () => {
+            clearInterval(heartbeat);
+            queue.removeListener(eventName, onDone);
+        };
+
+        function onDone(finishedJob) {
+            cleanup();
+            send(finishedJob.state === 'completed' ? 'complete' : 'failed', {
+                status: finishedJob.state === 'completed' ? 'completed' : 'failed',
+                job: queue.describe(finishedJob),
+                result: finishedJob.result
             });
-            user.updateStreak();
-            await user.save();
+            res.end();
+        }
 
-            logger.info(`Speech analysis completed for session: ${sessionId}`);
+        queue.on(eventName, onDone);
+        req.on('close', cleanup);
 
-            res.json({
-                success: true,
-                message: 'Audio uploaded and analyzed successfully',
-                session: {
-                    id: session._id,
-                    status: session.status,
-                    duration: session.duration,
-                    transcript: session.transcript,
-                    analysis: {
-                        confidenceScore: session.confidenceScore,
-                        clarityScore: session.clarityScore,
-                        paceWpm: session.paceWpm,
-                        volumeStability: session.volumeStability,
-                        fillerCount: session.fillerCount
-                    },
-                    feedback: session.feedback,
-                    improvements: session.improvements,
-                    overallScore: session.calculateOverallScore()
-                },
-                userStats: {
-                    totalSessions: user.totalSessions,
-                    confidenceScore: user.confidenceScore,
-                    streak: user.streak,
-                    isNewUser: user.isNewUser
-                }
+        if (!job) {
+            // It may have finished elsewhere between the first read and subscribing
+            const current = await Session.findById(session._id);
+            if (!current || current.status !== 'analyzing') {
+                cleanup();
+                return sendFinalStatus(current || session);
+            }
+            return send('status', { status: current.status });
+        }
+
+        if (job.state === 'completed' || job.state === 'failed') {
+            return onDone(job);
+        }
+        send('status', { status: session.status, job: queue.describe(job) });
+
+    } catch (error) {
+        logger.error('Session events error:', error);
+        if (!res.headersSent) {
+            res.status(500).json({
+                success: false,
+                message: 'Failed to open session event stream',
+                code: 'SESSION_EVENTS_FAILED'
             });
+        } else {
+            res.end();
+        }
+    }
+});
 
-        } catch (analysisError) {
-            logger.error('Analysis error:', analysisError);
-
-            session.status = 'completed';
-            session.confidenceScore = Math.floor(Math.random() * 30) + 40;
-            session.clarityScore = Math.floor(Math.random() * 30) + 50;
-            session.feedback = {
-                overall: {
-                    status: 'good',
-                    message: 'Session completed successfully.'
-                }
-            };
-            await session.save();
+function listParam(value) {
+    return value ? String(value).split(',').map(item => item.trim()).filter(Boolean) : [];
+}
 
-            res.json({
-                success: true,
-                message: 'Audio uploaded successfully.',
-                session: {
-                    id: session._id,
-                    status: session.status,
-                    duration: session.duration,
-                    analysis: {
-                        confidenceScore: session.confidenceScore,
-                        clarityScore: session.clarityScore
-                    },
-                    feedback: session.feedback
-                },
-                warning: 'Analysis completed with basic metrics'
+const historyValidation = [
+    query('limit')
+        .optional()
+        .isInt({ min: 1, max: MAX_PAGE_SIZE })
+        .withMessage(`Limit must be between 1 and ${MAX_PAGE_SIZE}`),
+    query('from')
+        .optional()
+        .isISO8601()
+        .withMessage('from must be an ISO 8601 date'),
+    query('to')
+        .optional()
+        .isISO8601()
+        .withMessage('to must be an ISO 8601 date'),
+    query('level')
+        .optional()
+        .custom(value => listParam(value).every(level => ['easy', 'medium', 'hard'].includes(level)))
+        .withMessage('Level must be easy, medium, or hard'),
+    query('fields')
+        .optional()
+        .custom(value => listParam(value).every(field => Session.HISTORY_FIELDS.includes(field)))
+        .withMessage(`Fields must be among: ${Session.HISTORY_FIELDS.join(', ')}`)
+];
+
+// @route   GET /api/sessions/history
+// @desc    Page through completed sessions, newest first. Pass the returned
+//          nextCursor as ?cursor= for the next page; filters: from, to
+//          (completedAt range), level (comma-separated), fields (projection)
+// @access  Private
+router.get('/history', authMiddleware, historyValidation, async (req, res) => {
+    try {
+        const errors = validationResult(req);
+        if (!errors.isEmpty()) {
+            return res.status(400).json({
+                success: false,
+                message: 'Validation failed',
+                errors: errors.array()
             });
         }
 
+        const { sessions, nextCursor } = await Session.getHistoryPage(req.userId, {
+            cursor: req.query.cursor,
+            limit: parseInt(req.query.limit) || 20,
+            from: req.query.from ? new Date(req.query.from) : null,
+            to: req.query.to ? new Date(req.query.to) : null,
+            levels: listParam(req.query.level),
+            fields: listParam(req.query.fields)
+        });
+
+        res.json({
+            success: true,
+            sessions,
+            nextCursor,
+            hasMore: nextCursor !== null
+        });
+
     } catch (error) {
-        logger.error('Upload and analyze error:', error);
+        if (error.code === 'INVALID_CURSOR') {
+            return res.status(400).json({
+                success: false,
+                message: error.message,
+                code: error.code
+            });
+        }
+
+        logger.error('Get session history error:', error);
         res.status(500).json({
             success: false,
-            message: 'Failed to upload and analyze audio',
-            code: 'UPLOAD_ANALYZE_FAILED'
+            message: 'Failed to fetch session history',
+            code: 'SESSIONS_FETCH_FAILED'
         });
     }
 });
 
 // @route   GET /api/sessions/recent
-// @desc    Get recent sessions
+// @desc    Get recent sessions (at most MAX_PAGE_SIZE; use /history to page further)
 // @access  Private
 router.get('/recent', authMiddleware, async (req, res) => {
     try {
-        const limit = parseInt(req.query.limit) || 5;
+        const limit = Math.min(parseInt(req.query.limit) || 5, MAX_PAGE_SIZE);
         const sessions = await Session.getRecentSessions(req.userId, limit);
 
         res.json({
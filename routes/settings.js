@@ -11,18 +11,9 @@ const router = express.Router();
 // @access  Private
 router.get('/', authMiddleware, async (req, res) => {
     try {
-        const user = await User.findById(req.userId).select('preferences');
-
-        if (!user) {
-            return res.status(404).json({
-                success: false,
-                message: 'User not found'
-            });
-        }
-
         res.json({
             success: true,
-            settings: user.preferences
+            settings: req.user.preferences
         });
 
     } catch (error) {
@@ -1,7 +1,7 @@
 const express = require('express');
 const { body, validationResult } = require('express-validator');
-const User = require('../models/User');
 const Session = require('../models/Session');
+const { getDashboardSnapshot } = require('../services/dashboardService');
 const authMiddleware = require('../middleware/auth');
 const logger = require('../utils/logger');
 
@@ -12,16 +12,7 @@ const router = express.Router();
 // @access  Private
 router.get('/profile', authMiddleware, async (req, res) => {
     try {
-        const user = await User.findById(req.userId);
-
-        if (!user) {
-            return res.status(404).json({
-                success: false,
-                message: 'User not found',
-                code: 'USER_NOT_FOUND'
-            });
-        }
-
+        const user = req.user;
         const recentSessions = await Session.getRecentSessions(req.userId, 3);
 
         res.json({
@@ -62,43 +53,8 @@ router.get('/profile', authMiddleware, async (req, res) => {
 // @access  Private
 router.get('/dashboard-stats', authMiddleware, async (req, res) => {
     try {
-        const user = await User.findById(req.userId);
-        const userId = req.userId;
-
-        const sessionStats = await Session.aggregate([
-            { $match: { userId: user._id, status: 'completed' } },
-            {
-                $group: {
-                    _id: null,
-                    totalSessions: { $sum: 1 },
-                    avgConfidence: { $avg: '$confidenceScore' },
-                    avgClarity: { $avg: '$clarityScore' },
-                    totalPracticeTime: { $sum: '$duration' },
-                    bestConfidenceScore: { $max: '$confidenceScore' }
-                }
-            }
-        ]);
-
-        const levelStats = await Session.aggregate([
-            { $match: { userId: user._id, status: 'completed' } },
-            {
-                $group: {
-                    _id: '$level',
-                    sessions: { $sum: 1 },
-                    avgConfidence: { $avg: '$confidenceScore' },
-                    bestScore: { $max: '$confidenceScore' },
-                    totalTime: { $sum: '$duration' }
-                }
-            }
-        ]);
-
-        const recentActivity = await Session.find({
-            userId,
-            status: 'completed'
-        })
-        .select('level practiceType confidenceScore completedAt')
-        .sort({ completedAt: -1 })
-        .limit(10);
+        const user = req.user;
+        const snapshot = await getDashboardSnapshot(user._id);
 
         res.json({
             success: true,
@@ -112,23 +68,7 @@ router.get('/dashboard-stats', authMiddleware, async (req, res) => {
                     currentLevel: user.currentLevel,
                     isNewUser: user.isNewUser
                 },
-                sessions: sessionStats[0] || {
-                    totalSessions: 0,
-                    avgConfidence: 0,
-                    avgClarity: 0,
-                    totalPracticeTime: 0,
-                    bestConfidenceScore: 0
-                },
-                levels: levelStats.reduce((acc, level) => {
-                    acc[level._id] = {
-                        sessions: level.sessions,
-                        avgConfidence: Math.round(level.avgConfidence || 0),
-                        bestScore: level.bestScore || 0,
-                        totalTime: level.totalTime || 0
-                    };
-                    return acc;
-                }, {}),
-                recentActivity,
+                ...snapshot,
                 achievements: user.unlockedAchievements.length
             }
         });
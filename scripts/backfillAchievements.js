@@ -0,0 +1,207 @@
+// Unlocks achievements that existing users already qualify for, e.g. after
+// a rule is added to services/achievementService.js. Live session
+// completions only check the rules whose fields they change, so without
+// this a user earns a new achievement on their next session at the
+// earliest.
+//
+//   node scripts/backfillAchievements.js                     # every achievement
+//   node scripts/backfillAchievements.js --only a,b          # just these ids
+//   node scripts/backfillAchievements.js --restart           # ignore the checkpoint
+//
+// Users are streamed by _id from a secondary when there is one and checked
+// in batches; each batch's unlocks go out as one unordered bulkWrite while
+// the next batch is read. Progress is checkpointed after every batch, so an
+// interrupted run resumes where it stopped. Rules that read session fields
+// can't be checked offline and are skipped.
+//
+// ACHIEVEMENT_BACKFILL_MAX_RATE caps users per second to keep the load off
+// live traffic (0 = no cap). Unlocks bypass the API's principal cache,
+// which picks them up within AUTH_CACHE_TTL_MS.
+require('dotenv').config();
+const mongoose = require('mongoose');
+const { connectDB } = require('../config/database');
+const User = require('../models/User');
+const JobCheckpoint = require('../models/JobCheckpoint');
+const { findUnlocks, unlockUpdate, achievementUserFields, ACHIEVEMENTS } = require('../services/achievementService');
+const logger = require('../utils/logger');
+
+const BATCH_SIZE = parseInt(process.env.ACHIEVEMENT_BACKFILL_BATCH_SIZE) || 1000;
+const MAX_RATE = parseInt(process.env.ACHIEVEMENT_BACKFILL_MAX_RATE) || 0;
+const REPORT_INTERVAL_MS = 10 * 1000;
+
+function parseArgs(argv) {
+    const args = { only: null, restart: false };
+    for (let i = 0; i < argv.length; i++) {
+        if (argv[i] === '--restart') {
+            args.restart = true;
+        } else if (argv[i] === '--only') {
+            args.only = new Set(argv[++i].split(',').map(id => id.trim()).filter(Boolean));
+        } else {
+            throw new Error(`Unknown argument: ${argv[i]}`);
+        }
+    }
+    if (args.only) {
+        const unknown = [...args.only].filter(id => !ACHIEVEMENTS[id]);
+        if (unknown.length > 0) throw new Error(`Unknown achievement(s): ${unknown.join(', ')}`);
+    }
+    return args;
+}
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+class Backfill {
+    constructor({ only, checkpoint, total }) {
+        this.only = only;
+        this.jobId = checkpoint._id;
+        this.processed = checkpoint.processed;
+        this.written = checkpoint.written;
+        this.total = total;
+        this.runProcessed = 0;
+        this.started = Date.now();
+        this.lastReport = this.started;
+    }
+
+    // Checks one batch, writes its unlocks and moves the checkpoint past it
+    async flush(users) {
+        const unlockedAt = new Date();
+        const unlocks = [];
+
+        for (const user of users) {
+            const met = findUnlocks(user, null, null, this.only);
+            if (met.length === 0) continue;
+            unlocks.push({
+                userId: user._id,
+                entries: met.map(achievement => ({
+                    achievementId: achievement.id,
+                    points: achievement.points,
+                    unlockedAt
+                }))
+            });
+        }
+
+        if (unlocks.length > 0) {
+            const ops = unlocks.map(({ userId, entries }) => ({ updateOne: unlockUpdate(userId, entries) }));
+            const result = await User.bulkWrite(ops, { ordered: false });
+            this.written += result.modifiedCount;
+
+            // A user's update matches nothing if any one of its achievements
+            // was unlocked meanwhile (e.g. by a live session), which would
+            // skip the rest. As in recordUnlocks, those are then written one
+            // at a time; for users already updated the retries match nothing.
+            if (result.matchedCount < ops.length) {
+                const retries = [];
+                for (const { userId, entries } of unlocks) {
+                    if (entries.length < 2) continue;
+                    for (const entry of entries) {
+                        retries.push({ updateOne: unlockUpdate(userId, [entry]) });
+                    }
+                }
+                if (retries.length > 0) {
+                    const retried = await User.bulkWrite(retries, { ordered: false });
+                    this.written += retried.modifiedCount;
+                }
+            }
+        }
+
+        this.processed += users.length;
+        this.runProcessed += users.length;
+        await JobCheckpoint.updateOne(
+            { _id: this.jobId },
+            { $set: { lastId: users[users.length - 1]._id, processed: this.processed, written: this.written } }
+        );
+
+        this.report(false);
+    }
+
+    report(final) {
+        const now = Date.now();
+        if (!final && now - this.lastReport < REPORT_INTERVAL_MS) return;
+        this.lastReport = now;
+
+        const seconds = (now - this.started) / 1000;
+        const rate = seconds > 0 ? this.runProcessed / seconds : 0;
+        const remaining = Math.max(0, this.total - this.processed);
+        const eta = !final && rate > 0 ? `, ~${Math.ceil(remaining / rate)}s left` : '';
+        logger.info(`Achievement backfill: ${this.processed}/${this.total} users, ${this.written} updated, ${Math.round(rate)} users/s${eta}`);
+    }
+
+    // Keeps the average rate of this run under MAX_RATE
+    async throttle() {
+        if (MAX_RATE <= 0) return;
+        const due = this.started + (this.runProcessed / MAX_RATE) * 1000;
+        if (due > Date.now()) await sleep(due - Date.now());
+    }
+}
+
+async function loadCheckpoint(jobId, restart) {
+    const existing = restart ? null : await JobCheckpoint.findById(jobId).lean();
+    if (existing && !existing.completedAt) {
+        logger.info(`Resuming achievement backfill after user ${existing.lastId} (${existing.processed} done)`);
+        return existing;
+    }
+    return JobCheckpoint.findOneAndUpdate(
+        { _id: jobId },
+        { $set: { lastId: null, processed: 0, written: 0, completedAt: null } },
+        { upsert: true, new: true, lean: true }
+    );
+}
+
+async function backfill({ only, restart }) {
+    const jobId = only ? `achievements:${[...only].sort().join(',')}` : 'achievements';
+    const checkpoint = await loadCheckpoint(jobId, restart);
+
+    const filter = {};
+    if (checkpoint.lastId) filter._id = { $gt: checkpoint.lastId };
+    // Users that have every requested achievement already need no read
+    if (only) filter['unlockedAchievements.achievementId'] = { $not: { $all: [...only] } };
+
+    const job = new Backfill({ only, checkpoint, total: await User.estimatedDocumentCount() });
+    const cursor = User.find(filter)
+        .select([...achievementUserFields(), 'unlockedAchievements.achievementId'].join(' '))
+        .sort({ _id: 1 })
+        .read('secondaryPreferred')
+        .lean()
+        .cursor({ batchSize: BATCH_SIZE });
+
+    let batch = [];
+    let writing = null;
+    try {
+        for await (const user of cursor) {
+            batch.push(user);
+            if (batch.length < BATCH_SIZE) continue;
+
+            // One batch is written while the next is read
+            if (writing) await writing;
+            writing = job.flush(batch);
+            // Rethrown by the await above; this only keeps a failure from
+            // being reported as unhandled while the next batch is read.
+            writing.catch(() => {});
+            batch = [];
+            await job.throttle();
+        }
+    } finally {
+        if (writing) await writing;
+    }
+    if (batch.length > 0) await job.flush(batch);
+
+    await JobCheckpoint.updateOne({ _id: jobId }, { $set: { completedAt: new Date() } });
+    job.report(true);
+}
+
+async function main() {
+    const args = parseArgs(process.argv.slice(2));
+    await connectDB();
+    try {
+        await backfill(args);
+    } finally {
+        await mongoose.connection.close();
+    }
+}
+
+main().catch(async (error) => {
+    logger.error('Achievement backfill failed:', error);
+    await logger.flush();
+    process.exit(1);
+});
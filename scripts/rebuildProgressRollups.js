@@ -0,0 +1,52 @@
+// Rebuilds ProgressRollup documents (and each user's TrendBuckets) from
+// completed sessions.
+//
+//   node scripts/rebuildProgressRollups.js            # every user
+//   node scripts/rebuildProgressRollups.js <userId>   # one user
+//
+// Live completions for a user wait while that user's rollup is being
+// rebuilt and are then applied once, so this is safe to run at any time.
+require('dotenv').config();
+const mongoose = require('mongoose');
+const { connectDB } = require('../config/database');
+const User = require('../models/User');
+require('../models/Session');
+const ProgressRollup = require('../models/ProgressRollup');
+const logger = require('../utils/logger');
+
+async function rebuild(userIds) {
+    let rebuilt = 0;
+    const started = Date.now();
+
+    for await (const userId of userIds) {
+        await ProgressRollup.rebuildForUser(userId);
+        rebuilt += 1;
+        if (rebuilt % 1000 === 0) {
+            logger.info(`Rebuilt ${rebuilt} progress rollups...`);
+        }
+    }
+
+    logger.info(`Rebuilt ${rebuilt} progress rollup(s) in ${((Date.now() - started) / 1000).toFixed(1)}s`);
+}
+
+async function main() {
+    await connectDB();
+    try {
+        const [userId] = process.argv.slice(2);
+        if (userId) {
+            await rebuild([userId]);
+        } else {
+            const cursor = User.find().select('_id').lean().cursor();
+            await rebuild((async function* () {
+                for await (const user of cursor) yield user._id;
+            })());
+        }
+    } finally {
+        await mongoose.connection.close();
+    }
+}
+
+main().catch((error) => {
+    logger.error('Progress rollup rebuild failed:', error);
+    process.exit(1);
+});
@@ -3,17 +3,29 @@ const mongoose = require('mongoose');
 const cors = require('cors');
 const helmet = require('helmet');
 const compression = require('compression');
-const morgan = require('morgan');
 require('dotenv').config();
 
+// Registers the mongoose timing plugin; must load before any model
+require('./utils/mongooseMetrics');
+
 // Import utilities
 const logger = require('./utils/logger');
+const metrics = require('./utils/metrics');
 const { connectDB } = require('./config/database');
 const { seedDatabase } = require('./utils/seedData');
+const analysisCache = require('./services/analysisCache');
+const mlClient = require('./services/mlClient');
+const dashboardService = require('./services/dashboardService');
+const principalCache = require('./services/principalCache');
+const passwordHasher = require('./services/passwordHasher');
+const { getAnalysisQueue } = require('./services/analysisQueue');
+const { startStagingGc } = require('./services/resumableUpload');
 
 // Import middleware
 const { errorHandler } = require('./middleware/errorHandler');
-const { rateLimiter } = require('./middleware/rateLimiter');
+const { accessLog, getStats: getAccessLogStats } = require('./middleware/accessLog');
+const { requestMetrics } = require('./middleware/requestMetrics');
+const { rateLimiter, getStats: getRateLimiterStats } = require('./middleware/rateLimiter');
 const authMiddleware = require('./middleware/auth');
 
 // Import routes
@@ -27,6 +39,7 @@ const analyticsRoutes = require('./routes/analytics');
 
 const app = express();
 const PORT = process.env.PORT || 5000;
+const SHUTDOWN_TIMEOUT_MS = parseInt(process.env.SHUTDOWN_TIMEOUT_MS) || 30000;
 
 // Trust proxy for accurate IP addresses
 app.set('trust proxy', 1);
@@ -65,14 +78,16 @@ const corsOptions = {
     },
     credentials: true,
     methods: ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS'],
-    allowedHeaders: ['Content-Type', 'Authorization', 'X-Requested-With'],
+    allowedHeaders: ['Content-Type', 'Authorization', 'X-Requested-With', 'Upload-Offset', 'X-Chunk-SHA256'],
+    exposedHeaders: ['Upload-Offset', 'Location', 'RateLimit-Limit', 'RateLimit-Remaining', 'RateLimit-Reset', 'Retry-After'],
 };
 
 app.use(cors(corsOptions));
 
 // Compression and logging
 app.use(compression());
-app.use(morgan('combined', { stream: { write: message => logger.info(message.trim()) } }));
+app.use(accessLog);
+app.use(requestMetrics);
 
 // Rate limiting
 app.use('/api/', rateLimiter);
@@ -84,7 +99,27 @@ app.use(express.urlencoded({ extended: true, limit: '10mb' }));
 // Static files
 app.use('/uploads', express.static('uploads'));
 
-// Health check endpoint
+// /metrics and /health/details require METRICS_TOKEN as a bearer token,
+// and are not served at all while it is unset
+function requireMetricsToken(req, res, next) {
+    if (!process.env.METRICS_TOKEN) {
+        return res.status(404).json({
+            success: false,
+            message: 'Endpoint not found',
+            path: req.originalUrl
+        });
+    }
+    if (req.header('Authorization') !== `Bearer ${process.env.METRICS_TOKEN}`) {
+        return res.status(401).json({
+            success: false,
+            message: 'Metrics token is required',
+            code: 'METRICS_TOKEN_REQUIRED'
+        });
+    }
+    next();
+}
+
+// Health check endpoint: liveness and dependency status only
 app.get('/health', (req, res) => {
     res.status(200).json({
         status: 'healthy',
@@ -92,10 +127,31 @@ app.get('/health', (req, res) => {
         uptime: process.uptime(),
         version: '1.0.0',
         environment: process.env.NODE_ENV,
-        database: mongoose.connection.readyState === 1 ? 'connected' : 'disconnected'
+        database: mongoose.connection.readyState === 1 ? 'connected' : 'disconnected',
+        mlService: mlClient.getStats().breaker.state === 'open' ? 'unavailable' : 'available'
+    });
+});
+
+// Internal cache, queue and pool statistics
+app.get('/health/details', requireMetricsToken, (req, res) => {
+    res.status(200).json({
+        analysisCache: analysisCache.getStats(),
+        analysisQueue: getAnalysisQueue().getStats(),
+        mlClient: mlClient.getStats(),
+        dashboardCache: dashboardService.getStats(),
+        principalCache: principalCache.getStats(),
+        passwordHasher: passwordHasher.getStats(),
+        rateLimiter: getRateLimiterStats(),
+        logging: { ...logger.getStats(), accessLog: getAccessLogStats() }
     });
 });
 
+// Prometheus scrape endpoint
+app.get('/metrics', requireMetricsToken, (req, res) => {
+    res.set('Content-Type', metrics.CONTENT_TYPE);
+    res.send(metrics.metricsText());
+});
+
 // API routes
 app.use('/api/auth', authRoutes);
 app.use('/api/users', userRoutes);
@@ -148,6 +204,9 @@ async function startServer() {
             await seedDatabase();
         }
 
+        // Remove abandoned resumable uploads on a schedule
+        startStagingGc();
+
         // Start server
         const server = app.listen(PORT, () => {
             logger.info(`🚀 SpeakAI Backend running on port ${PORT}`);
@@ -155,18 +214,42 @@ async function startServer() {
             logger.info(`📊 Health check: http://localhost:${PORT}/health`);
         });
 
-        // Graceful shutdown
-        process.on('SIGTERM', () => {
-            logger.info('SIGTERM received. Shutting down gracefully...');
-            server.close(() => {
-                mongoose.connection.close();
-                logger.info('Process terminated');
-                process.exit(0);
-            });
+        // Graceful shutdown: stop accepting connections, let queued analyses
+        // finish, then close the database. The cluster primary asks workers
+        // to do this over IPC instead of with a signal (see cluster.js).
+        let shuttingDown = false;
+        const shutdown = async (reason) => {
+            if (shuttingDown) return;
+            shuttingDown = true;
+            logger.info(`${reason} received. Shutting down gracefully...`);
+
+            setTimeout(() => {
+                logger.warn('Graceful shutdown timed out, exiting');
+                process.exit(1);
+            }, SHUTDOWN_TIMEOUT_MS).unref();
+
+            server.close();
+            if (server.closeIdleConnections) server.closeIdleConnections();
+
+            try {
+                await getAnalysisQueue().whenIdle();
+                await mongoose.connection.close();
+            } catch (error) {
+                logger.error('Error during shutdown:', error);
+            }
+            logger.info('Process terminated');
+            await logger.flush();
+            process.exit(0);
+        };
+
+        process.on('SIGTERM', () => shutdown('SIGTERM'));
+        process.on('message', (message) => {
+            if (message && message.speakaiCluster === 'shutdown') shutdown('Cluster shutdown');
         });
 
     } catch (error) {
         logger.error('Failed to start server:', error);
+        await logger.flush();
         process.exit(1);
     }
 }
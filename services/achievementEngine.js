@@ -0,0 +1,87 @@
+// Indexes achievement rules by the fields they read, so a change only
+// evaluates the rules that could be affected by it. Each rule declares
+// `dependsOn`: user paths ('streak', 'levels.easy.progress') or session
+// paths prefixed with 'session.' ('session.confidenceScore').
+class AchievementEngine {
+    constructor(rules) {
+        this.rules = rules;
+        this.byPath = new Map();
+        this.readsSession = new Set();
+
+        for (const rule of rules) {
+            if (!Array.isArray(rule.dependsOn) || rule.dependsOn.length === 0) {
+                throw new Error(`Achievement ${rule.id} must declare the fields it depends on`);
+            }
+            if (rule.dependsOn.some(dependency => dependency.split('.')[0] === 'session')) {
+                this.readsSession.add(rule);
+            }
+            for (const dependency of rule.dependsOn) {
+                // Filed under every ancestor path too, so replacing a whole
+                // subdocument ('levels') reaches rules on its leaves.
+                const parts = dependency.split('.');
+                for (let i = 1; i <= parts.length; i++) {
+                    this.index(parts.slice(0, i).join('.'), rule);
+                }
+            }
+        }
+    }
+
+    index(path, rule) {
+        let rules = this.byPath.get(path);
+        if (!rules) {
+            rules = new Set();
+            this.byPath.set(path, rules);
+        }
+        rules.add(rule);
+    }
+
+    // Rules reading any of `changedPaths` that are not unlocked yet, or
+    // every locked rule when `changedPaths` is null. Changed paths are
+    // expected to include their ancestors, as mongoose's modifiedPaths() does.
+    candidates(changedPaths, unlockedIds) {
+        if (!changedPaths) {
+            return new Set(this.rules.filter(rule => !unlockedIds.has(rule.id)));
+        }
+        const candidates = new Set();
+        for (const path of changedPaths) {
+            const rules = this.byPath.get(path);
+            if (!rules) continue;
+            for (const rule of rules) {
+                if (!unlockedIds.has(rule.id)) candidates.add(rule);
+            }
+        }
+        return candidates;
+    }
+
+    // User fields read by any rule, e.g. for a projection.
+    userFields() {
+        const fields = new Set();
+        for (const rule of this.rules) {
+            for (const dependency of rule.dependsOn) {
+                const [root] = dependency.split('.');
+                if (root !== 'session') fields.add(root);
+            }
+        }
+        return [...fields];
+    }
+
+    // Returns the rules newly satisfied by `user` / `session`; `onError` is
+    // called for a rule whose check throws, which then counts as unmet.
+    // Without a session, rules that read one are skipped.
+    evaluate({ user, session, changedPaths, unlockedIds, onError = () => {} }) {
+        const unlocked = [];
+        for (const rule of this.candidates(changedPaths, unlockedIds)) {
+            if (!session && this.readsSession.has(rule)) continue;
+            try {
+                if (rule.checkCondition(user, session)) unlocked.push(rule);
+            } catch (error) {
+                onError(rule, error);
+            }
+        }
+        return unlocked;
+    }
+}
+
+module.exports = {
+    AchievementEngine
+};
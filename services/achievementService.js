@@ -1,7 +1,10 @@
 const User = require('../models/User');
-const Session = require('../models/Session');
 const logger = require('../utils/logger');
+const { AchievementEngine } = require('./achievementEngine');
 
+// Each achievement lists the user fields its condition reads in `dependsOn`
+// (session fields as 'session.<field>'); checkAchievements only evaluates
+// the ones whose fields changed.
 const ACHIEVEMENTS = {
     first_session: {
         id: 'first_session',
@@ -9,8 +12,9 @@ const ACHIEVEMENTS = {
         description: 'Complete your first practice session',
         icon: '🎯',
         points: 10,
+        dependsOn: ['totalSessions'],
         checkCondition: (user, session) => {
-            return user.totalSessions === 1;
+            return user.totalSessions >= 1;
         }
     },
 
@@ -20,6 +24,7 @@ const ACHIEVEMENTS = {
         description: 'Practice for 3 consecutive days',
         icon: '📅',
         points: 25,
+        dependsOn: ['streak'],
         checkCondition: (user, session) => {
             return user.streak >= 3;
         }
@@ -31,6 +36,7 @@ const ACHIEVEMENTS = {
         description: 'Reach 50% confidence score',
         icon: '💪',
         points: 50,
+        dependsOn: ['confidenceScore'],
         checkCondition: (user, session) => {
             return user.confidenceScore >= 50;
         }
@@ -42,54 +48,107 @@ const ACHIEVEMENTS = {
         description: 'Complete all sessions in one level',
         icon: '👑',
         points: 100,
+        dependsOn: ['levels.easy.progress', 'levels.medium.progress', 'levels.hard.progress'],
         checkCondition: (user, session) => {
             return Object.values(user.levels).some(level => level.progress >= 100);
         }
     }
 };
 
-async function checkAchievements(user, session) {
-    const newAchievements = [];
+const engine = new AchievementEngine(Object.values(ACHIEVEMENTS));
 
-    try {
-        const unlockedIds = user.unlockedAchievements.map(a => a.achievementId);
-
-        for (const [achievementId, achievement] of Object.entries(ACHIEVEMENTS)) {
-            if (unlockedIds.includes(achievementId)) {
-                continue;
-            }
-
-            let conditionMet = false;
-
-            try {
-                conditionMet = await achievement.checkCondition(user, session);
-            } catch (conditionError) {
-                logger.error(`Error checking achievement ${achievementId}:`, conditionError);
-                continue;
-            }
-
-            if (conditionMet) {
-                const unlocked = user.addAchievement(achievementId, achievement.points);
-
-                if (unlocked) {
-                    newAchievements.push({
-                        id: achievementId,
-                        title: achievement.title,
-                        description: achievement.description,
-                        icon: achievement.icon,
-                        points: achievement.points,
-                        unlockedAt: new Date()
-                    });
-
-                    logger.info(`Achievement unlocked: ${achievementId} for user ${user._id}`);
-                }
-            }
+// Fields a completed session changes on the user plus the session itself.
+// Mongoose's modifiedPaths() lists parents too ('levels', 'levels.easy',
+// 'levels.easy.progress'), which is what the engine's index expects.
+function sessionChangedPaths(user) {
+    return [...user.modifiedPaths(), 'session'];
+}
+
+// Filter and update that add `entries` ({ achievementId, points,
+// unlockedAt }) and their points to a user in one write. The filter makes
+// it a no-op if any of them is already unlocked, so a write racing another
+// (a concurrent session completion, or scripts/backfillAchievements.js)
+// never counts one twice.
+function unlockUpdate(userId, entries) {
+    return {
+        filter: { _id: userId, 'unlockedAchievements.achievementId': { $nin: entries.map(entry => entry.achievementId) } },
+        update: {
+            $addToSet: { unlockedAchievements: { $each: entries } },
+            $inc: { points: entries.reduce((sum, entry) => sum + entry.points, 0) }
         }
+    };
+}
+
+// Writes newly unlocked achievements in a single update; if some were
+// unlocked concurrently, the rest are recorded one at a time. Returns the
+// entries actually written.
+async function recordUnlocks(userId, entries) {
+    const { filter, update } = unlockUpdate(userId, entries);
+    const result = await User.updateOne(filter, update);
+    if (result.matchedCount === 1 || entries.length === 1) {
+        return result.matchedCount === 1 ? entries : [];
+    }
 
-        if (newAchievements.length > 0) {
-            await user.save();
+    const written = [];
+    for (const entry of entries) {
+        const single = unlockUpdate(userId, [entry]);
+        const singleResult = await User.updateOne(single.filter, single.update);
+        if (singleResult.matchedCount === 1) written.push(entry);
+    }
+    return written;
+}
+
+function describe(achievement) {
+    const { id, title, description, icon, points } = achievement;
+    return { id, title, description, icon, points };
+}
+
+// Achievements newly met by `user` (and `session`, if given) among those
+// depending on `changedPaths` (all of them if null). `only`, a Set of ids,
+// restricts the check to those achievements. Doesn't write anything.
+function findUnlocks(user, session = null, changedPaths = null, only = null) {
+    const unlockedIds = new Set(user.unlockedAchievements.map(a => a.achievementId));
+    if (only) {
+        for (const achievement of engine.rules) {
+            if (!only.has(achievement.id)) unlockedIds.add(achievement.id);
         }
+    }
+
+    return engine.evaluate({
+        user,
+        session,
+        changedPaths,
+        unlockedIds,
+        onError: (achievement, conditionError) => {
+            logger.error(`Error checking achievement ${achievement.id}:`, conditionError);
+        }
+    });
+}
 
+// Evaluates the achievements that depend on `changedPaths` (all of them if
+// null) against `user` and `session`, and records any newly met. `user` is
+// a document or lean object with unlockedAchievements; it isn't modified
+// or saved.
+async function checkAchievements(user, session = null, changedPaths = null) {
+    try {
+        const met = findUnlocks(user, session, changedPaths);
+        if (met.length === 0) return [];
+
+        const unlockedAt = new Date();
+        const written = await recordUnlocks(user._id, met.map(achievement => ({
+            achievementId: achievement.id,
+            points: achievement.points,
+            unlockedAt
+        })));
+
+        const writtenIds = new Set(written.map(entry => entry.achievementId));
+        const newAchievements = met
+            .filter(achievement => writtenIds.has(achievement.id))
+            .map(achievement => ({ ...describe(achievement), unlockedAt }));
+
+        for (const achievement of newAchievements) {
+            logger.info(`Achievement unlocked: ${achievement.id} for user ${user._id}`);
+        }
         return newAchievements;
 
     } catch (error) {
@@ -98,17 +157,23 @@ async function checkAchievements(user, session) {
     }
 }
 
-async function getAllAchievements(userId) {
+// User fields read by achievement conditions
+function achievementUserFields() {
+    return engine.userFields();
+}
+
+// `user` may be passed in (e.g. req.user) to skip loading it again.
+async function getAllAchievements(userId, user = null) {
     try {
-        const user = await User.findById(userId);
+        user = user || await User.findById(userId).select('unlockedAchievements').lean();
         if (!user) return [];
 
-        const unlockedIds = user.unlockedAchievements.map(a => a.achievementId);
+        const unlockedAt = new Map(user.unlockedAchievements.map(a => [a.achievementId, a.unlockedAt]));
 
         return Object.values(ACHIEVEMENTS).map(achievement => ({
-            ...achievement,
-            unlocked: unlockedIds.includes(achievement.id),
-            unlockedAt: user.unlockedAchievements.find(a => a.achievementId === achievement.id)?.unlockedAt || null
+            ...describe(achievement),
+            unlocked: unlockedAt.has(achievement.id),
+            unlockedAt: unlockedAt.get(achievement.id) || null
         }));
 
     } catch (error) {
@@ -119,6 +184,10 @@ async function getAllAchievements(userId) {
 
 module.exports = {
     checkAchievements,
+    findUnlocks,
+    unlockUpdate,
+    achievementUserFields,
+    sessionChangedPaths,
     getAllAchievements,
     ACHIEVEMENTS
 };
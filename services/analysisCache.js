@@ -0,0 +1,242 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const logger = require('../utils/logger');
+
+const MEMORY_MAX_BYTES = parseInt(process.env.ANALYSIS_CACHE_MAX_BYTES) || 16 * 1024 * 1024;
+const DISK_MAX_BYTES = parseInt(process.env.ANALYSIS_CACHE_DISK_MAX_BYTES) || 256 * 1024 * 1024;
+const CACHE_STORE = process.env.ANALYSIS_CACHE_STORE || 'memory';
+const CACHE_DIR = process.env.ANALYSIS_CACHE_DIR || path.join('cache', 'analysis');
+
+const stats = {
+    hits: { memory: 0, disk: 0, mongo: 0, inflight: 0 },
+    misses: 0,
+    sets: 0,
+    evictions: { memory: 0, disk: 0 },
+    errors: 0
+};
+
+// In-process tier: Map iteration order doubles as recency order.
+class LruCache {
+    constructor(maxBytes) {
+        this.maxBytes = maxBytes;
+        this.bytes = 0;
+        this.entries = new Map();
+    }
+
+    get(key) {
+        const entry = this.entries.get(key);
+        if (!entry) return undefined;
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        return entry.value;
+    }
+
+    set(key, value, size) {
+        if (size > this.maxBytes) return;
+        this.delete(key);
+        this.entries.set(key, { value, size });
+        this.bytes += size;
+
+        while (this.bytes > this.maxBytes) {
+            const [oldestKey] = this.entries.keys();
+            this.delete(oldestKey);
+            stats.evictions.memory += 1;
+        }
+    }
+
+    delete(key) {
+        const entry = this.entries.get(key);
+        if (!entry) return;
+        this.entries.delete(key);
+        this.bytes -= entry.size;
+    }
+
+    get size() {
+        return this.entries.size;
+    }
+}
+
+// Optional second tier: one JSON file per key, evicted least recently used
+// first once the directory grows past DISK_MAX_BYTES.
+class DiskStore {
+    constructor(dir, maxBytes) {
+        this.dir = dir;
+        this.maxBytes = maxBytes;
+        this.index = new LruCache(Infinity);
+
+        fs.mkdirSync(dir, { recursive: true });
+        const files = fs.readdirSync(dir)
+            .filter(name => name.endsWith('.json'))
+            .map(name => ({ name, stat: fs.statSync(path.join(dir, name)) }))
+            .sort((a, b) => a.stat.mtimeMs - b.stat.mtimeMs);
+        for (const { name, stat } of files) {
+            this.index.set(name.slice(0, -5), true, stat.size);
+        }
+    }
+
+    file(key) {
+        return path.join(this.dir, `${key}.json`);
+    }
+
+    async get(key) {
+        if (!this.index.get(key)) return undefined;
+        try {
+            return JSON.parse(await fs.promises.readFile(this.file(key), 'utf8'));
+        } catch (error) {
+            this.index.delete(key);
+            return undefined;
+        }
+    }
+
+    async set(key, serialized) {
+        await fs.promises.writeFile(this.file(key), serialized);
+        this.index.set(key, true, Buffer.byteLength(serialized));
+
+        while (this.index.bytes > this.maxBytes && this.index.size > 1) {
+            const [oldestKey] = this.index.entries.keys();
+            this.index.delete(oldestKey);
+            stats.evictions.disk += 1;
+            fs.promises.unlink(this.file(oldestKey)).catch(() => {});
+        }
+    }
+}
+
+// Optional second tier shared by every server instance; the collection is
+// capped, so MongoDB itself evicts the oldest results by size.
+class MongoStore {
+    constructor() {
+        this.model = require('../models/AnalysisResult');
+    }
+
+    async get(key) {
+        const doc = await this.model.findOne({ key }).select('result').lean();
+        return doc ? doc.result : undefined;
+    }
+
+    async set(key, serialized, result) {
+        try {
+            await this.model.create({ key, result, size: Buffer.byteLength(serialized) });
+        } catch (error) {
+            if (error.code !== 11000) throw error;
+        }
+    }
+}
+
+const memory = new LruCache(MEMORY_MAX_BYTES);
+const inflight = new Map();
+let secondTier = null;
+
+function getStore() {
+    if (secondTier === null) {
+        secondTier = CACHE_STORE === 'disk' ? new DiskStore(CACHE_DIR, DISK_MAX_BYTES)
+            : CACHE_STORE === 'mongo' ? new MongoStore()
+                : undefined;
+    }
+    return secondTier;
+}
+
+function hashAudio(audioBuffer) {
+    return crypto.createHash('sha256').update(audioBuffer).digest('hex');
+}
+
+function cacheKey(audioHash, options = {}) {
+    const { level = 'easy', practiceType = 'freestyle' } = options;
+    return crypto.createHash('sha256')
+        .update(`${audioHash}:${level}:${practiceType}`)
+        .digest('hex');
+}
+
+async function lookup(key) {
+    const cached = memory.get(key);
+    if (cached !== undefined) {
+        stats.hits.memory += 1;
+        return cached;
+    }
+
+    const tier = getStore();
+    if (tier) {
+        try {
+            const result = await tier.get(key);
+            if (result !== undefined) {
+                stats.hits[CACHE_STORE] += 1;
+                memory.set(key, result, Buffer.byteLength(JSON.stringify(result)));
+                return result;
+            }
+        } catch (error) {
+            stats.errors += 1;
+            logger.warn(`Analysis cache ${CACHE_STORE} lookup failed: ${error.message}`);
+        }
+    }
+
+    return undefined;
+}
+
+async function save(key, result) {
+    const serialized = JSON.stringify(result);
+    memory.set(key, result, Buffer.byteLength(serialized));
+    stats.sets += 1;
+
+    const tier = getStore();
+    if (tier) {
+        try {
+            await tier.set(key, serialized, result);
+        } catch (error) {
+            stats.errors += 1;
+            logger.warn(`Analysis cache ${CACHE_STORE} write failed: ${error.message}`);
+        }
+    }
+}
+
+// Returns the cached result for this audio/options pair, or runs `compute`
+// once (concurrent identical requests share the same promise) and caches
+// its result when `shouldCache(result)` allows it.
+async function getOrCompute(key, compute, shouldCache = () => true) {
+    const cached = await lookup(key);
+    if (cached !== undefined) return cached;
+
+    if (inflight.has(key)) {
+        stats.hits.inflight += 1;
+        return inflight.get(key);
+    }
+
+    stats.misses += 1;
+    const pending = (async () => {
+        const result = await compute();
+        if (shouldCache(result)) {
+            await save(key, result);
+        }
+        return result;
+    })();
+
+    inflight.set(key, pending);
+    try {
+        return await pending;
+    } finally {
+        inflight.delete(key);
+    }
+}
+
+function getStats() {
+    const hits = Object.values(stats.hits).reduce((sum, n) => sum + n, 0);
+    return {
+        store: CACHE_STORE,
+        entries: memory.size,
+        bytes: memory.bytes,
+        maxBytes: memory.maxBytes,
+        hits: { ...stats.hits, total: hits },
+        misses: stats.misses,
+        hitRate: hits + stats.misses > 0 ? hits / (hits + stats.misses) : 0,
+        sets: stats.sets,
+        evictions: { ...stats.evictions },
+        errors: stats.errors
+    };
+}
+
+module.exports = {
+    hashAudio,
+    cacheKey,
+    getOrCompute,
+    getStats,
+    LruCache
+};
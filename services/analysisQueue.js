@@ -0,0 +1,173 @@
+const EventEmitter = require('events');
+const { v4: uuidv4 } = require('uuid');
+const clusterBus = require('../utils/clusterBus');
+const logger = require('../utils/logger');
+
+const WORKERS = parseInt(process.env.ANALYSIS_WORKERS) || 4;
+const MAX_QUEUED = parseInt(process.env.ANALYSIS_QUEUE_MAX) || 100;
+const JOB_TTL_MS = parseInt(process.env.ANALYSIS_JOB_TTL_MS) || 15 * 60 * 1000;
+
+class QueueFullError extends Error {
+    constructor() {
+        super('Analysis queue is full, please retry shortly');
+        this.name = 'QueueFullError';
+        this.code = 'ANALYSIS_QUEUE_FULL';
+    }
+}
+
+// In-process job queue drained by a fixed number of concurrent workers.
+// Emits 'job' for every state change, `session:<id>` when a session's job
+// finishes (also relayed to other cluster workers, where the client's SSE
+// connection may be), and 'idle' once nothing is queued or running.
+class AnalysisQueue extends EventEmitter {
+    constructor(processJob, { concurrency = WORKERS, maxQueued = MAX_QUEUED, jobTtlMs = JOB_TTL_MS } = {}) {
+        super();
+        this.setMaxListeners(0);
+        this.processJob = processJob;
+        this.concurrency = concurrency;
+        this.maxQueued = maxQueued;
+        this.jobTtlMs = jobTtlMs;
+
+        this.pending = [];
+        this.running = 0;
+        this.jobs = new Map();
+        this.bySession = new Map();
+        this.counters = { enqueued: 0, completed: 0, failed: 0, rejected: 0 };
+    }
+
+    isFull() {
+        return this.pending.length >= this.maxQueued;
+    }
+
+    enqueue(payload, { sessionId } = {}) {
+        if (this.isFull()) {
+            this.counters.rejected += 1;
+            throw new QueueFullError();
+        }
+
+        const job = {
+            id: uuidv4(),
+            sessionId: sessionId ? String(sessionId) : null,
+            state: 'queued',
+            createdAt: new Date(),
+            startedAt: null,
+            finishedAt: null,
+            result: null,
+            error: null,
+            payload
+        };
+
+        this.jobs.set(job.id, job);
+        if (job.sessionId) this.bySession.set(job.sessionId, job.id);
+        this.pending.push(job);
+        this.counters.enqueued += 1;
+        this.emit('job', job);
+
+        setImmediate(() => this.drain());
+        return job;
+    }
+
+    drain() {
+        while (this.running < this.concurrency && this.pending.length > 0) {
+            this.run(this.pending.shift());
+        }
+    }
+
+    async run(job) {
+        this.running += 1;
+        job.state = 'running';
+        job.startedAt = new Date();
+        this.emit('job', job);
+
+        try {
+            job.result = await this.processJob(job.payload, job);
+            job.state = 'completed';
+            this.counters.completed += 1;
+        } catch (error) {
+            logger.error(`Analysis job ${job.id} failed:`, error);
+            job.error = error.message;
+            job.state = 'failed';
+            this.counters.failed += 1;
+        } finally {
+            job.payload = null;
+            job.finishedAt = new Date();
+            this.running -= 1;
+            this.emit('job', job);
+            if (job.sessionId) {
+                this.emit(`session:${job.sessionId}`, job);
+                clusterBus.publish('analysis:done', { ...this.describe(job), sessionId: job.sessionId, result: job.result });
+            }
+            this.expire(job);
+            this.drain();
+            if (this.running === 0 && this.pending.length === 0) this.emit('idle');
+        }
+    }
+
+    whenIdle() {
+        if (this.running === 0 && this.pending.length === 0) return Promise.resolve();
+        return new Promise(resolve => this.once('idle', resolve));
+    }
+
+    expire(job) {
+        setTimeout(() => {
+            this.jobs.delete(job.id);
+            if (job.sessionId && this.bySession.get(job.sessionId) === job.id) {
+                this.bySession.delete(job.sessionId);
+            }
+        }, this.jobTtlMs).unref();
+    }
+
+    getJob(id) {
+        return this.jobs.get(id);
+    }
+
+    getJobForSession(sessionId) {
+        const id = this.bySession.get(String(sessionId));
+        return id ? this.jobs.get(id) : undefined;
+    }
+
+    position(job) {
+        return job.state === 'queued' ? this.pending.indexOf(job) + 1 : 0;
+    }
+
+    describe(job) {
+        return {
+            id: job.id,
+            state: job.state,
+            position: this.position(job),
+            createdAt: job.createdAt,
+            startedAt: job.startedAt,
+            finishedAt: job.finishedAt,
+            error: job.error
+        };
+    }
+
+    getStats() {
+        return {
+            workers: this.concurrency,
+            running: this.running,
+            queued: this.pending.length,
+            maxQueued: this.maxQueued,
+            ...this.counters
+        };
+    }
+}
+
+let analysisQueue = null;
+
+function getAnalysisQueue() {
+    if (!analysisQueue) {
+        const { processAnalysisJob } = require('./sessionService');
+        analysisQueue = new AnalysisQueue(processAnalysisJob);
+        clusterBus.subscribe('analysis:done', (job) => {
+            analysisQueue.emit(`session:${job.sessionId}`, job);
+        });
+    }
+    return analysisQueue;
+}
+
+module.exports = {
+    AnalysisQueue,
+    QueueFullError,
+    getAnalysisQueue
+};
@@ -0,0 +1,142 @@
+const ProgressRollup = require('../models/ProgressRollup');
+const TrendBucket = require('../models/TrendBucket');
+
+const { TREND_METRICS, periodStart, addPeriods } = TrendBucket;
+
+// Periods returned when no `from` is given, and the most one request may ask for
+const DEFAULT_PERIODS = { day: 30, week: 26, month: 12 };
+const MAX_PERIODS = { day: 366, week: 260, month: 120 };
+const MAX_WINDOW = 12;
+
+class TrendRangeError extends Error {
+    constructor(message) {
+        super(message);
+        this.name = 'TrendRangeError';
+        this.code = 'INVALID_TREND_RANGE';
+    }
+}
+
+function countPeriods(first, last, granularity) {
+    if (granularity === 'month') {
+        return (last.getUTCFullYear() - first.getUTCFullYear()) * 12 + last.getUTCMonth() - first.getUTCMonth() + 1;
+    }
+    const days = Math.round((last - first) / (24 * 60 * 60 * 1000));
+    return (granularity === 'week' ? days / 7 : days) + 1;
+}
+
+function emptyTotals() {
+    const totals = { count: 0, fillers: 0, duration: 0 };
+    for (const name of Object.keys(TREND_METRICS)) totals[name] = 0;
+    return totals;
+}
+
+// `sums` is a bucket's sums or another totals object
+function addTotals(totals, count, sums) {
+    totals.count += count;
+    totals.fillers += sums.fillers || 0;
+    totals.duration += sums.duration || 0;
+    for (const name of Object.keys(TREND_METRICS)) totals[name] += sums[name] || 0;
+}
+
+// Averages of a set of sessions; fillerRate is filler words per minute spoken.
+function averages(totals) {
+    const result = {};
+    for (const name of Object.keys(TREND_METRICS)) {
+        result[name] = totals.count > 0 ? totals[name] / totals.count : null;
+    }
+    result.fillerRate = totals.duration > 0 ? totals.fillers / (totals.duration / 60) : null;
+    return result;
+}
+
+function round(value) {
+    return value === null ? null : Math.round(value * 10) / 10;
+}
+
+function roundAll(values) {
+    return Object.fromEntries(Object.entries(values).map(([name, value]) => [name, round(value)]));
+}
+
+// Users whose sessions predate trend buckets (or who have never had a
+// rollup rebuild) get theirs built from their sessions on first read.
+async function ensureTrendsBuilt(userId) {
+    const rollup = await ProgressRollup.findOne({ userId }).select('built').lean();
+    if (!rollup || !rollup.built) {
+        await ProgressRollup.rebuildForUser(userId);
+    }
+}
+
+// Per-period averages of confidence, clarity, pace and filler rate for
+// [from, to], with a session-weighted moving average over the trailing
+// `window` periods and the change from the previous period that had
+// sessions. Empty periods are included with null values so charts keep an
+// even time axis.
+async function getTrends(userId, { granularity = 'week', from, to, window = 4 } = {}) {
+    const last = periodStart(to || new Date(), granularity);
+    const first = from ? periodStart(from, granularity) : addPeriods(last, granularity, -(DEFAULT_PERIODS[granularity] - 1));
+
+    const periods = countPeriods(first, last, granularity);
+    if (periods < 1) {
+        throw new TrendRangeError('from must not be after to');
+    }
+    if (periods > MAX_PERIODS[granularity]) {
+        throw new TrendRangeError(`At most ${MAX_PERIODS[granularity]} ${granularity} buckets can be requested at once`);
+    }
+    const windowSize = Math.min(Math.max(1, window), MAX_WINDOW);
+
+    await ensureTrendsBuilt(userId);
+
+    // Read enough earlier periods to fill the first moving-average window
+    const readFrom = addPeriods(first, granularity, -(windowSize - 1));
+    const buckets = await TrendBucket.getSeries(userId, granularity, readFrom, addPeriods(last, granularity, 1));
+
+    const byPeriod = new Map(buckets.map(bucket => [bucket.periodStart.getTime(), bucket]));
+    const trailing = [];
+    const points = [];
+    let previous = null;
+
+    for (let start = readFrom; start <= last; start = addPeriods(start, granularity, 1)) {
+        const totals = emptyTotals();
+        const bucket = byPeriod.get(start.getTime());
+        if (bucket) addTotals(totals, bucket.count, bucket.sums);
+
+        trailing.push(totals);
+        if (trailing.length > windowSize) trailing.shift();
+
+        const current = averages(totals);
+        const windowTotals = emptyTotals();
+        for (const item of trailing) {
+            addTotals(windowTotals, item.count, item);
+        }
+
+        const delta = {};
+        for (const [name, value] of Object.entries(current)) {
+            delta[name] = value !== null && previous && previous[name] !== null ? value - previous[name] : null;
+        }
+
+        if (start >= first) {
+            points.push({
+                periodStart: start,
+                sessions: totals.count,
+                practiceTime: totals.duration,
+                ...roundAll(current),
+                movingAverage: roundAll(averages(windowTotals)),
+                delta: roundAll(delta)
+            });
+        }
+        if (totals.count > 0) previous = current;
+    }
+
+    return {
+        granularity,
+        window: windowSize,
+        from: first,
+        to: addPeriods(last, granularity, 1),
+        points
+    };
+}
+
+module.exports = {
+    getTrends,
+    TrendRangeError,
+    MAX_WINDOW
+};
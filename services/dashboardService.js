@@ -0,0 +1,127 @@
+const mongoose = require('mongoose');
+const Session = require('../models/Session');
+const ProgressRollup = require('../models/ProgressRollup');
+const { TtlCache } = require('../utils/ttlCache');
+const clusterBus = require('../utils/clusterBus');
+const logger = require('../utils/logger');
+
+const CACHE_TTL_MS = parseInt(process.env.DASHBOARD_CACHE_TTL_MS) || 5 * 60 * 1000;
+const CACHE_MAX_USERS = parseInt(process.env.DASHBOARD_CACHE_MAX_USERS) || 10000;
+const RECENT_ACTIVITY_LIMIT = 10;
+
+// Session-derived part of each user's dashboard. Entries are dropped when
+// one of the user's sessions completes; the TTL only bounds staleness from
+// writes made outside this process (e.g. a rollup rebuild).
+const snapshots = new TtlCache({ maxEntries: CACHE_MAX_USERS, ttlMs: CACHE_TTL_MS });
+
+function recentActivityStages() {
+    return [
+        { $sort: { completedAt: -1 } },
+        { $limit: RECENT_ACTIVITY_LIMIT },
+        { $project: { level: 1, practiceType: 1, confidenceScore: 1, completedAt: 1 } }
+    ];
+}
+
+// The user's rollup joined with their latest sessions: one round trip.
+// A rollup not yet built from all sessions doesn't count (see
+// ProgressRollup.built).
+async function queryFromRollup(userId) {
+    const [row] = await ProgressRollup.aggregate([
+        { $match: { userId, built: true } },
+        {
+            $lookup: {
+                from: Session.collection.name,
+                pipeline: [
+                    { $match: { userId, status: 'completed' } },
+                    ...recentActivityStages()
+                ],
+                as: 'recentActivity'
+            }
+        }
+    ]);
+    return row;
+}
+
+// No built rollup yet: per-level stats and recent activity in a single $facet
+// pass over the user's sessions, while the rollup is built in the
+// background for next time.
+async function queryFromSessions(userId) {
+    const [row] = await Session.aggregate([
+        { $match: { userId, status: 'completed' } },
+        {
+            $facet: {
+                levels: [{ $group: ProgressRollup.levelGroupStage() }],
+                recentActivity: recentActivityStages()
+            }
+        }
+    ]);
+
+    ProgressRollup.rebuildForUser(userId).catch((error) => {
+        logger.error(`Failed to build progress rollup for user ${userId}:`, error);
+    });
+
+    return {
+        ...ProgressRollup.bucketsFromLevelRows(row ? row.levels : []),
+        recentActivity: row ? row.recentActivity : []
+    };
+}
+
+function formatSnapshot({ overall: overallBucket, levels, recentActivity }) {
+    const overall = ProgressRollup.summarize(overallBucket);
+
+    return {
+        sessions: overall.count > 0 ? {
+            _id: null,
+            totalSessions: overall.count,
+            avgConfidence: overall.confidence.avg,
+            avgClarity: overall.clarity.avg,
+            totalPracticeTime: overall.duration.total,
+            bestConfidenceScore: overall.confidence.max
+        } : {
+            totalSessions: 0,
+            avgConfidence: 0,
+            avgClarity: 0,
+            totalPracticeTime: 0,
+            bestConfidenceScore: 0
+        },
+        levels: ProgressRollup.LEVELS.reduce((acc, level) => {
+            const stats = ProgressRollup.summarize(levels && levels[level]);
+            if (stats.count > 0) {
+                acc[level] = {
+                    sessions: stats.count,
+                    avgConfidence: Math.round(stats.confidence.avg),
+                    bestScore: stats.confidence.max,
+                    totalTime: stats.duration.total
+                };
+            }
+            return acc;
+        }, {}),
+        recentActivity
+    };
+}
+
+// Returns `{ sessions, levels, recentActivity }` for the dashboard.
+function getDashboardSnapshot(userId) {
+    return snapshots.getOrLoad(String(userId), async () => {
+        const id = new mongoose.Types.ObjectId(String(userId));
+        const row = await queryFromRollup(id) || await queryFromSessions(id);
+        return formatSnapshot(row);
+    });
+}
+
+function invalidateDashboard(userId) {
+    snapshots.delete(String(userId));
+    clusterBus.publish('dashboard:invalidate', String(userId));
+}
+
+clusterBus.subscribe('dashboard:invalidate', userId => snapshots.delete(userId));
+
+function getStats() {
+    return snapshots.getStats();
+}
+
+module.exports = {
+    getDashboardSnapshot,
+    invalidateDashboard,
+    getStats
+};
@@ -0,0 +1,404 @@
+const http = require('http');
+const https = require('https');
+const axios = require('axios');
+const { counter, gauge, histogram } = require('../utils/metrics');
+const logger = require('../utils/logger');
+
+const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+
+function envInt(name, fallback) {
+    const value = parseInt(process.env[name]);
+    return Number.isNaN(value) ? fallback : value;
+}
+
+const CONCURRENCY = parseInt(process.env.ML_CLIENT_CONCURRENCY) || 8;
+const MAX_WAITING = parseInt(process.env.ML_CLIENT_MAX_WAITING) || 100;
+const QUEUE_TIMEOUT_MS = parseInt(process.env.ML_CLIENT_QUEUE_TIMEOUT_MS) || 5000;
+const TIMEOUT_MS = parseInt(process.env.ML_CLIENT_TIMEOUT_MS) || 30000;
+// 0 disables hedging / retries, so these can't use the `|| default` form.
+const HEDGE_AFTER_MS = envInt('ML_CLIENT_HEDGE_AFTER_MS', 2000);
+const RETRIES = envInt('ML_CLIENT_RETRIES', 1);
+const RETRY_BASE_MS = parseInt(process.env.ML_CLIENT_RETRY_BASE_MS) || 200;
+const BREAKER_FAILURES = parseInt(process.env.ML_BREAKER_FAILURES) || 5;
+const BREAKER_RESET_MS = parseInt(process.env.ML_BREAKER_RESET_MS) || 30000;
+
+class CircuitOpenError extends Error {
+    constructor() {
+        super('ML service circuit is open');
+        this.name = 'CircuitOpenError';
+        this.code = 'ML_CIRCUIT_OPEN';
+    }
+}
+
+class ClientBusyError extends Error {
+    constructor(message) {
+        super(message);
+        this.name = 'ClientBusyError';
+        this.code = 'ML_CLIENT_BUSY';
+    }
+}
+
+// closed -> open after `failureThreshold` consecutive service failures;
+// open -> half-open after `resetMs`, letting a single probe request through;
+// the probe's outcome closes or re-opens the circuit.
+class CircuitBreaker {
+    constructor({ failureThreshold = BREAKER_FAILURES, resetMs = BREAKER_RESET_MS } = {}) {
+        this.failureThreshold = failureThreshold;
+        this.resetMs = resetMs;
+        this.state = 'closed';
+        this.failures = 0;
+        this.openedAt = null;
+        this.probing = false;
+        this.trips = 0;
+    }
+
+    allow() {
+        if (this.state === 'open' && Date.now() - this.openedAt >= this.resetMs) {
+            this.state = 'half-open';
+        }
+        if (this.state === 'closed') return true;
+        if (this.state === 'half-open' && !this.probing) {
+            this.probing = true;
+            return true;
+        }
+        return false;
+    }
+
+    // The request allowed through never reached the service.
+    abandon() {
+        this.probing = false;
+    }
+
+    success() {
+        if (this.state !== 'closed') {
+            logger.info('ML service circuit closed');
+        }
+        this.state = 'closed';
+        this.failures = 0;
+        this.probing = false;
+    }
+
+    failure() {
+        this.failures += 1;
+        this.probing = false;
+        if (this.state === 'half-open' || (this.state === 'closed' && this.failures >= this.failureThreshold)) {
+            this.state = 'open';
+            this.openedAt = Date.now();
+            this.trips += 1;
+            logger.warn(`ML service circuit opened after ${this.failures} consecutive failures`);
+        }
+    }
+
+    getStats() {
+        return {
+            state: this.state,
+            consecutiveFailures: this.failures,
+            openedAt: this.openedAt ? new Date(this.openedAt) : null,
+            trips: this.trips
+        };
+    }
+}
+
+// Caps requests in flight; callers beyond the cap wait in a bounded FIFO
+// and give up after `waitTimeoutMs`.
+class Semaphore {
+    constructor(max, { maxWaiting = MAX_WAITING, waitTimeoutMs = QUEUE_TIMEOUT_MS } = {}) {
+        this.max = max;
+        this.maxWaiting = maxWaiting;
+        this.waitTimeoutMs = waitTimeoutMs;
+        this.active = 0;
+        this.waiting = [];
+    }
+
+    acquire() {
+        if (this.active < this.max) {
+            this.active += 1;
+            return Promise.resolve(() => this.release());
+        }
+        if (this.waiting.length >= this.maxWaiting) {
+            return Promise.reject(new ClientBusyError('Too many ML service requests waiting'));
+        }
+
+        return new Promise((resolve, reject) => {
+            const waiter = {
+                grant: () => {
+                    clearTimeout(waiter.timer);
+                    resolve(() => this.release());
+                },
+                timer: setTimeout(() => {
+                    this.waiting.splice(this.waiting.indexOf(waiter), 1);
+                    reject(new ClientBusyError('Timed out waiting for an ML service connection'));
+                }, this.waitTimeoutMs)
+            };
+            this.waiting.push(waiter);
+        });
+    }
+
+    release() {
+        const next = this.waiting.shift();
+        if (next) {
+            next.grant();
+        } else {
+            this.active -= 1;
+        }
+    }
+}
+
+const agentOptions = { keepAlive: true, maxSockets: CONCURRENCY * 2, maxFreeSockets: CONCURRENCY };
+const httpAgent = new http.Agent(agentOptions);
+const httpsAgent = new https.Agent(agentOptions);
+
+const client = axios.create({
+    baseURL: ML_SERVICE_URL,
+    httpAgent,
+    httpsAgent,
+    maxBodyLength: Infinity,
+    timeout: TIMEOUT_MS
+});
+
+const breaker = new CircuitBreaker();
+const slots = new Semaphore(CONCURRENCY);
+
+// Whole request through the client: slot wait, hedges and retries.
+// outcome: success, error (service failure), rejected (4xx), short_circuit, busy
+const requestDuration = histogram({
+    name: 'ml_client_request_duration_seconds',
+    help: 'ML service request latency through the client',
+    labelNames: ['outcome'],
+    buckets: [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+});
+
+const stats = {
+    requests: 0,
+    succeeded: 0,
+    failed: 0,
+    shortCircuited: 0,
+    busyRejected: 0,
+    hedged: 0,
+    hedgeWins: 0,
+    retries: 0
+};
+
+// Connection failures, timeouts and 5xx/429 mean the service is unhealthy;
+// other 4xx (e.g. 415 for undecodable audio) are answers about the request.
+function isServiceFailure(error) {
+    if (axios.isCancel(error)) return false;
+    if (!error.response) return true;
+    return error.response.status >= 500 || error.response.status === 429;
+}
+
+function destroyBody(data) {
+    if (data && typeof data.destroy === 'function') data.destroy();
+}
+
+async function send(config, body, signal) {
+    const { data, headers } = body ? body() : {};
+    try {
+        return await client.request({
+            ...config,
+            data,
+            headers: { ...config.headers, ...headers },
+            signal
+        });
+    } finally {
+        destroyBody(data);
+    }
+}
+
+// Sends the request and, if it hasn't answered within `hedgeAfterMs`, a
+// second copy; the first success wins and the other is aborted.
+function hedgedSend(config, body, hedgeAfterMs) {
+    return new Promise((resolve, reject) => {
+        const controllers = [];
+        let pending = 0;
+        let settled = false;
+        let timer = null;
+
+        const settle = (winner) => {
+            settled = true;
+            clearTimeout(timer);
+            controllers.forEach(controller => controller !== winner && controller.abort());
+        };
+
+        const launch = (isHedge) => {
+            const controller = new AbortController();
+            controllers.push(controller);
+            pending += 1;
+            if (isHedge) stats.hedged += 1;
+
+            send(config, body, controller.signal).then((response) => {
+                if (settled) return;
+                settle(controller);
+                if (isHedge) stats.hedgeWins += 1;
+                resolve(response);
+            }, (error) => {
+                pending -= 1;
+                if (settled) return;
+                if (pending === 0 || !isServiceFailure(error)) {
+                    settle(controller);
+                    reject(error);
+                }
+            });
+        };
+
+        launch(false);
+        if (hedgeAfterMs > 0) {
+            timer = setTimeout(() => settled || launch(true), hedgeAfterMs);
+        }
+    });
+}
+
+function delay(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Runs an axios request config against the ML service through the circuit
+// breaker and concurrency cap. `body` is a function returning a fresh
+// `{ data, headers }` for each attempt; hedging and retries are only safe
+// when it can really produce the body again (a Buffer, or a stream it
+// re-opens), so callers with a one-shot stream pass `replayable: false`.
+async function request(config, { body, replayable = true, hedge = true, retries = RETRIES } = {}) {
+    stats.requests += 1;
+    const done = requestDuration.startTimer();
+
+    if (!breaker.allow()) {
+        stats.shortCircuited += 1;
+        done({ outcome: 'short_circuit' });
+        throw new CircuitOpenError();
+    }
+
+    let release;
+    try {
+        release = await slots.acquire();
+    } catch (error) {
+        breaker.abandon();
+        stats.busyRejected += 1;
+        done({ outcome: 'busy' });
+        throw error;
+    }
+
+    const hedgeAfterMs = replayable && hedge && breaker.state === 'closed' ? HEDGE_AFTER_MS : 0;
+    const attempts = replayable ? retries + 1 : 1;
+
+    try {
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await hedgedSend(config, body, hedgeAfterMs);
+                breaker.success();
+                stats.succeeded += 1;
+                done({ outcome: 'success' });
+                return response;
+            } catch (error) {
+                if (!isServiceFailure(error)) {
+                    breaker.success();
+                    done({ outcome: 'rejected' });
+                    throw error;
+                }
+                if (attempt >= attempts) {
+                    breaker.failure();
+                    done({ outcome: 'error' });
+                    throw error;
+                }
+                stats.retries += 1;
+                await delay(RETRY_BASE_MS * 2 ** (attempt - 1) * (0.5 + Math.random()));
+            }
+        }
+    } catch (error) {
+        stats.failed += 1;
+        throw error;
+    } finally {
+        release();
+    }
+}
+
+function countSockets(sockets) {
+    return Object.values(sockets).reduce((sum, list) => sum + list.length, 0);
+}
+
+function getStats() {
+    return {
+        pool: {
+            active: slots.active,
+            waiting: slots.waiting.length,
+            maxConcurrency: slots.max,
+            sockets: countSockets(httpAgent.sockets) + countSockets(httpsAgent.sockets),
+            freeSockets: countSockets(httpAgent.freeSockets) + countSockets(httpsAgent.freeSockets)
+        },
+        breaker: breaker.getStats(),
+        ...stats
+    };
+}
+
+// The same numbers as getStats(), read at scrape time
+const BREAKER_STATES = ['closed', 'open', 'half-open'];
+
+gauge({
+    name: 'ml_client_breaker_state',
+    help: 'ML service circuit breaker state (1 for the current state)',
+    labelNames: ['state'],
+    collect(metric) {
+        for (const state of BREAKER_STATES) {
+            metric.set({ state }, breaker.state === state ? 1 : 0);
+        }
+    }
+});
+
+gauge({
+    name: 'ml_client_pool_active',
+    help: 'ML service requests in flight',
+    collect(metric) {
+        metric.set({}, slots.active);
+    }
+});
+
+gauge({
+    name: 'ml_client_pool_waiting',
+    help: 'ML service requests waiting for a slot',
+    collect(metric) {
+        metric.set({}, slots.waiting.length);
+    }
+});
+
+gauge({
+    name: 'ml_client_sockets',
+    help: 'Keep-alive sockets to the ML service',
+    labelNames: ['state'],
+    collect(metric) {
+        const { sockets, freeSockets } = getStats().pool;
+        metric.set({ state: 'active' }, sockets);
+        metric.set({ state: 'free' }, freeSockets);
+    }
+});
+
+counter({
+    name: 'ml_client_hedged_total',
+    help: 'Hedged ML service requests sent',
+    collect(metric) {
+        metric.set({}, stats.hedged);
+    }
+});
+
+counter({
+    name: 'ml_client_retries_total',
+    help: 'ML service requests retried',
+    collect(metric) {
+        metric.set({}, stats.retries);
+    }
+});
+
+counter({
+    name: 'ml_client_breaker_trips_total',
+    help: 'Times the ML service circuit breaker opened',
+    collect(metric) {
+        metric.set({}, breaker.trips);
+    }
+});
+
+module.exports = {
+    request,
+    getStats,
+    CircuitBreaker,
+    CircuitOpenError,
+    ClientBusyError,
+    Semaphore
+};
@@ -0,0 +1,15 @@
+// worker_threads entry for services/passwordHasher.js: runs bcryptjs off
+// the main event loop, one job at a time.
+const { parentPort } = require('worker_threads');
+const bcrypt = require('bcryptjs');
+
+parentPort.on('message', async ({ id, op, password, hash, rounds }) => {
+    try {
+        const result = op === 'hash'
+            ? await bcrypt.hash(password, await bcrypt.genSalt(rounds))
+            : await bcrypt.compare(password, hash);
+        parentPort.postMessage({ id, result });
+    } catch (error) {
+        parentPort.postMessage({ id, error: error.message });
+    }
+});
@@ -0,0 +1,196 @@
+const os = require('os');
+const path = require('path');
+const { Worker } = require('worker_threads');
+const { histogram } = require('../utils/metrics');
+const logger = require('../utils/logger');
+
+const BCRYPT_ROUNDS = parseInt(process.env.BCRYPT_ROUNDS) || 12;
+const WORKERS = parseInt(process.env.PASSWORD_HASH_WORKERS) || Math.max(1, Math.min(4, os.cpus().length - 1));
+const MAX_QUEUED = parseInt(process.env.PASSWORD_HASH_QUEUE_MAX) || 200;
+
+class HasherBusyError extends Error {
+    constructor() {
+        super('Password hashing queue is full, please retry shortly');
+        this.name = 'HasherBusyError';
+        this.code = 'PASSWORD_HASHER_BUSY';
+    }
+}
+
+function emptyTiming() {
+    return { count: 0, totalMs: 0, maxMs: 0 };
+}
+
+const metrics = {
+    hash: { wait: emptyTiming(), run: emptyTiming(), errors: 0 },
+    compare: { wait: emptyTiming(), run: emptyTiming(), errors: 0 },
+    rejected: 0,
+    workerRestarts: 0
+};
+
+const hashDuration = histogram({
+    name: 'password_hash_duration_seconds',
+    help: 'bcrypt job time waiting for a worker and running on it',
+    labelNames: ['op', 'phase'],
+    buckets: [0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10]
+});
+
+function record(op, phase, ms) {
+    const timing = metrics[op][phase];
+    timing.count += 1;
+    timing.totalMs += ms;
+    timing.maxMs = Math.max(timing.maxMs, ms);
+    hashDuration.observe({ op, phase }, ms / 1000);
+}
+
+// Fixed set of workers fed from a bounded FIFO. Each worker runs one job
+// at a time; a worker that dies fails its job and is replaced.
+class HashPool {
+    constructor(size = WORKERS, maxQueued = MAX_QUEUED) {
+        this.size = size;
+        this.maxQueued = maxQueued;
+        this.idle = [];
+        this.workers = new Set();
+        this.queue = [];
+        this.nextId = 1;
+    }
+
+    spawn() {
+        const worker = new Worker(path.join(__dirname, 'passwordHashWorker.js'));
+        worker.unref();
+        worker.job = null;
+
+        worker.on('message', ({ id, result, error }) => {
+            const job = worker.job;
+            if (!job || job.id !== id) return;
+            worker.job = null;
+            this.finish(job, error ? new Error(error) : null, result);
+            this.release(worker);
+        });
+
+        worker.on('error', (error) => {
+            logger.error('Password hash worker failed:', error);
+        });
+
+        worker.on('exit', () => {
+            this.workers.delete(worker);
+            this.idle = this.idle.filter(w => w !== worker);
+            if (worker.job) {
+                this.finish(worker.job, new Error('Password hash worker exited'));
+                worker.job = null;
+            }
+            if (!this.closed) {
+                metrics.workerRestarts += 1;
+                this.dispatch();
+            }
+        });
+
+        this.workers.add(worker);
+        return worker;
+    }
+
+    run(op, payload) {
+        if (this.queue.length >= this.maxQueued) {
+            metrics.rejected += 1;
+            return Promise.reject(new HasherBusyError());
+        }
+
+        return new Promise((resolve, reject) => {
+            this.queue.push({ id: this.nextId++, op, payload, resolve, reject, queuedAt: process.hrtime.bigint() });
+            this.dispatch();
+        });
+    }
+
+    dispatch() {
+        while (this.queue.length > 0) {
+            let worker = this.idle.pop();
+            if (!worker) {
+                if (this.workers.size >= this.size) return;
+                worker = this.spawn();
+            }
+
+            const job = this.queue.shift();
+            job.startedAt = process.hrtime.bigint();
+            record(job.op, 'wait', Number(job.startedAt - job.queuedAt) / 1e6);
+
+            worker.job = job;
+            worker.ref();
+            worker.postMessage({ id: job.id, op: job.op, ...job.payload });
+        }
+    }
+
+    release(worker) {
+        worker.unref();
+        this.idle.push(worker);
+        this.dispatch();
+    }
+
+    finish(job, error, result) {
+        record(job.op, 'run', Number(process.hrtime.bigint() - job.startedAt) / 1e6);
+        if (error) {
+            metrics[job.op].errors += 1;
+            job.reject(error);
+        } else {
+            job.resolve(result);
+        }
+    }
+
+    async close() {
+        this.closed = true;
+        await Promise.all([...this.workers].map(worker => worker.terminate()));
+    }
+}
+
+let pool = null;
+
+function getPool() {
+    if (!pool) pool = new HashPool();
+    return pool;
+}
+
+function hashPassword(password, rounds = BCRYPT_ROUNDS) {
+    return getPool().run('hash', { password, rounds });
+}
+
+function comparePassword(password, hash) {
+    return getPool().run('compare', { password, hash });
+}
+
+// True when `hash` was made with fewer rounds than BCRYPT_ROUNDS (or isn't
+// a bcrypt hash we can read), so it should be replaced at the next login.
+function needsRehash(hash, rounds = BCRYPT_ROUNDS) {
+    const match = /^\$2[abxy]?\$(\d{2})\$/.exec(hash || '');
+    return !match || parseInt(match[1], 10) < rounds;
+}
+
+function summarize(timing) {
+    return {
+        count: timing.count,
+        avgMs: timing.count > 0 ? Math.round(timing.totalMs / timing.count * 10) / 10 : 0,
+        maxMs: Math.round(timing.maxMs * 10) / 10
+    };
+}
+
+function getStats() {
+    const current = pool || { size: WORKERS, workers: new Set(), idle: [], queue: [], maxQueued: MAX_QUEUED };
+    return {
+        workers: current.size,
+        running: current.workers.size - current.idle.length,
+        queued: current.queue.length,
+        maxQueued: current.maxQueued,
+        rounds: BCRYPT_ROUNDS,
+        hash: { wait: summarize(metrics.hash.wait), run: summarize(metrics.hash.run), errors: metrics.hash.errors },
+        compare: { wait: summarize(metrics.compare.wait), run: summarize(metrics.compare.run), errors: metrics.compare.errors },
+        rejected: metrics.rejected,
+        workerRestarts: metrics.workerRestarts
+    };
+}
+
+module.exports = {
+    hashPassword,
+    comparePassword,
+    needsRehash,
+    getStats,
+    HashPool,
+    HasherBusyError,
+    BCRYPT_ROUNDS
+};
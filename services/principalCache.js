@@ -0,0 +1,59 @@
+const User = require('../models/User');
+const { TtlCache } = require('../utils/ttlCache');
+const clusterBus = require('../utils/clusterBus');
+
+const CACHE_TTL_MS = parseInt(process.env.AUTH_CACHE_TTL_MS) || 60 * 1000;
+const CACHE_MAX_USERS = parseInt(process.env.AUTH_CACHE_MAX_USERS) || 10000;
+
+// Everything route handlers read from req.user; password and timestamps
+// stay out of the cache.
+const PRINCIPAL_FIELDS = [
+    'name', 'email', 'avatar', 'isActive', 'isNewUser', 'emailVerified',
+    'joinDate', 'lastLoginAt', 'totalSessions', 'confidenceScore', 'streak',
+    'maxStreak', 'points', 'currentLevel', 'preferences', 'levels',
+    'unlockedAchievements'
+].join(' ');
+
+const principals = new TtlCache({ maxEntries: CACHE_MAX_USERS, ttlMs: CACHE_TTL_MS });
+
+// Read-only user for authMiddleware: a plain object with the schema's
+// defaults filled in, so fields missing from older documents read the same
+// as on a loaded User, but without document methods.
+//
+// Writes through mongoose drop the entry (see the hooks in models/User.js),
+// including updateMany/deleteMany, which clear the whole cache. Model.bulkWrite
+// runs no middleware, and writes from another process (such as
+// scripts/backfillAchievements.js) or straight to the collection never
+// reach this cache, so those show up within AUTH_CACHE_TTL_MS.
+function getPrincipal(userId) {
+    return principals.getOrLoad(String(userId), async () => {
+        const doc = await User.findById(userId).select(PRINCIPAL_FIELDS).lean();
+        return doc && User.hydrate(doc).toObject();
+    });
+}
+
+// Invalidations are also sent to the other cluster workers.
+function invalidatePrincipal(userId) {
+    principals.delete(String(userId));
+    clusterBus.publish('principal:invalidate', String(userId));
+}
+
+function clearPrincipals() {
+    principals.clear();
+    clusterBus.publish('principal:clear');
+}
+
+clusterBus.subscribe('principal:invalidate', userId => principals.delete(userId));
+clusterBus.subscribe('principal:clear', () => principals.clear());
+
+function getStats() {
+    return principals.getStats();
+}
+
+module.exports = {
+    getPrincipal,
+    invalidatePrincipal,
+    clearPrincipals,
+    getStats,
+    PRINCIPAL_FIELDS
+};
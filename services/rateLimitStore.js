@@ -0,0 +1,126 @@
+const clusterBus = require('../utils/clusterBus');
+
+// Token-bucket stores for middleware/rateLimiter.js. Every store exposes
+// take(key, { capacity, refillMs, cost }), which refills the bucket for the
+// time since it was last touched, removes `cost` tokens if there are enough,
+// and resolves to `{ allowed, tokens }` - as one atomic step, so concurrent
+// requests can't both spend the last tokens.
+//
+//   memory  - this process only (single instance, tests)
+//   cluster - the cluster primary's memory store, shared by its workers
+//   mongo   - a shared collection, for several hosts
+const STORE = process.env.RATE_LIMIT_STORE || (clusterBus.isWorker ? 'cluster' : 'memory');
+
+function refilled(tokens, elapsedMs, { capacity, refillMs }) {
+    return Math.min(capacity, tokens + Math.max(0, elapsedMs) * capacity / refillMs);
+}
+
+class MemoryBucketStore {
+    constructor() {
+        this.buckets = new Map();
+        // A bucket that has refilled is the same as no bucket
+        setInterval(() => this.sweep(), 60 * 1000).unref();
+    }
+
+    async take(key, policy) {
+        return this.takeSync(key, policy);
+    }
+
+    takeSync(key, { capacity, refillMs, cost }) {
+        const now = Date.now();
+        const bucket = this.buckets.get(key);
+        let tokens = bucket ? refilled(bucket.tokens, now - bucket.updatedAt, { capacity, refillMs }) : capacity;
+
+        const allowed = tokens >= cost;
+        if (allowed) tokens -= cost;
+        this.buckets.set(key, { tokens, updatedAt: now, fullAt: now + (capacity - tokens) * refillMs / capacity });
+        return { allowed, tokens };
+    }
+
+    sweep() {
+        const now = Date.now();
+        for (const [key, bucket] of this.buckets) {
+            if (bucket.fullAt <= now) this.buckets.delete(key);
+        }
+    }
+
+    get size() {
+        return this.buckets.size;
+    }
+}
+
+// Buckets held by the cluster primary (see createRateLimitHandlers in
+// middleware/rateLimiter.js); one IPC round trip per request.
+class ClusterBucketStore {
+    take(key, policy) {
+        return clusterBus.request('rateLimit.take', { key, ...policy });
+    }
+}
+
+// The refill-and-take is a single pipeline update on the bucket document,
+// using the server's clock ($$NOW) so hosts with skewed clocks agree.
+class MongoBucketStore {
+    constructor() {
+        this.model = require('../models/RateLimitBucket');
+    }
+
+    async take(key, policy, retried = false) {
+        const { capacity, refillMs, cost } = policy;
+        const elapsed = { $subtract: ['$$NOW', { $ifNull: ['$updatedAt', '$$NOW'] }] };
+
+        try {
+            const result = await this.model.collection.findOneAndUpdate(
+                { _id: key },
+                [
+                    {
+                        $set: {
+                            tokens: {
+                                $min: [capacity, {
+                                    $add: [
+                                        { $ifNull: ['$tokens', capacity] },
+                                        { $multiply: [{ $max: [0, elapsed] }, capacity / refillMs] }
+                                    ]
+                                }]
+                            },
+                            updatedAt: '$$NOW'
+                        }
+                    },
+                    { $set: { allowed: { $gte: ['$tokens', cost] } } },
+                    {
+                        $set: {
+                            tokens: { $cond: ['$allowed', { $subtract: ['$tokens', cost] }, '$tokens'] },
+                            expiresAt: { $add: ['$$NOW', refillMs] }
+                        }
+                    }
+                ],
+                { upsert: true, returnDocument: 'after', includeResultMetadata: true }
+            );
+            const bucket = result.value;
+            return { allowed: bucket.allowed, tokens: bucket.tokens };
+        } catch (error) {
+            // Two requests upserting a new bucket at once: the loser retries
+            // against the document the winner created.
+            if (error.code === 11000 && !retried) return this.take(key, policy, true);
+            throw error;
+        }
+    }
+}
+
+let store = null;
+
+function getStore() {
+    if (store === null) {
+        store = STORE === 'mongo' ? new MongoBucketStore()
+            : STORE === 'cluster' ? new ClusterBucketStore()
+                : new MemoryBucketStore();
+    }
+    return store;
+}
+
+module.exports = {
+    STORE,
+    getStore,
+    MemoryBucketStore,
+    ClusterBucketStore,
+    MongoBucketStore
+};
@@ -0,0 +1,393 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { Transform } = require('stream');
+const { pipeline } = require('stream/promises');
+const { v4: uuidv4 } = require('uuid');
+const logger = require('../utils/logger');
+const { UPLOAD_LIMITS, UPLOAD_TMP_DIR, uploadBytesInFlight, uploadBytesTotal } = require('../middleware/upload');
+
+const STAGING_DIR = path.join(UPLOAD_TMP_DIR, 'staging');
+const CHUNK_MAX_BYTES = (parseInt(process.env.UPLOAD_CHUNK_MAX_MB) || 8) * 1024 * 1024;
+const STAGING_TTL_MS = parseInt(process.env.UPLOAD_STAGING_TTL_MS) || 24 * 60 * 60 * 1000;
+const GC_INTERVAL_MS = parseInt(process.env.UPLOAD_GC_INTERVAL_MS) || 60 * 60 * 1000;
+// Lock files live beside the staging areas rather than in them, since init,
+// finalize and abort remove a session's directory while holding its lock.
+const LOCK_DIR = path.join(STAGING_DIR, '.locks');
+const LOCK_STALE_MS = parseInt(process.env.UPLOAD_LOCK_STALE_MS) || 5 * 60 * 1000;
+
+class UploadError extends Error {
+    constructor(status, message, code, details = {}) {
+        super(message);
+        this.name = 'UploadError';
+        this.status = status;
+        this.code = code;
+        this.details = details;
+    }
+}
+
+function stagingPaths(sessionId) {
+    const dir = path.join(STAGING_DIR, String(sessionId));
+    return {
+        dir,
+        meta: path.join(dir, 'meta.json'),
+        data: path.join(dir, 'audio.part')
+    };
+}
+
+async function readMeta(sessionId) {
+    try {
+        return JSON.parse(await fs.promises.readFile(stagingPaths(sessionId).meta, 'utf8'));
+    } catch (error) {
+        if (error.code === 'ENOENT') return null;
+        throw error;
+    }
+}
+
+// meta.json is replaced atomically, so a crash mid-write never leaves an
+// offset that points past the bytes actually verified.
+async function writeMeta(meta) {
+    const { meta: file } = stagingPaths(meta.sessionId);
+    const tmp = `${file}.${process.pid}.tmp`;
+    await fs.promises.writeFile(tmp, JSON.stringify(meta));
+    await fs.promises.rename(tmp, file);
+}
+
+function describeUpload(meta) {
+    return {
+        size: meta.size,
+        offset: meta.offset,
+        complete: meta.offset === meta.size,
+        mimeType: meta.mimeType,
+        chunkMaxBytes: CHUNK_MAX_BYTES,
+        expiresAt: new Date(meta.updatedAt + STAGING_TTL_MS)
+    };
+}
+
+function lockPath(sessionId) {
+    return path.join(LOCK_DIR, `${sessionId}.lock`);
+}
+
+// Removes a lock file whose holder stopped refreshing it (a worker that died
+// mid-request). The file is renamed away first, so of several processes
+// breaking the same lock only one succeeds. Returns false if it is still live.
+async function breakStaleLock(file, now = Date.now()) {
+    let stat;
+    try {
+        stat = await fs.promises.stat(file);
+    } catch (error) {
+        if (error.code === 'ENOENT') return true;
+        throw error;
+    }
+    if (now - stat.mtimeMs < LOCK_STALE_MS) return false;
+
+    const moved = `${file}.${process.pid}.${uuidv4()}.stale`;
+    try {
+        await fs.promises.rename(file, moved);
+    } catch (error) {
+        if (error.code === 'ENOENT') return true;
+        throw error;
+    }
+    await fs.promises.rm(moved, { force: true });
+    logger.warn(`Broke stale upload lock: ${path.basename(file)}`);
+    return true;
+}
+
+// Takes the session's lock file (O_EXCL, so it holds across cluster workers
+// sharing UPLOAD_TMP_DIR). Returns null when another request holds it.
+async function acquireLock(sessionId) {
+    const file = lockPath(sessionId);
+    const token = `${process.pid}:${uuidv4()}`;
+    await fs.promises.mkdir(LOCK_DIR, { recursive: true });
+
+    for (let attempt = 0; attempt < 2; attempt++) {
+        try {
+            await fs.promises.writeFile(file, token, { flag: 'wx' });
+            return { file, token };
+        } catch (error) {
+            if (error.code !== 'EEXIST') throw error;
+        }
+        if (attempt > 0 || !(await breakStaleLock(file))) break;
+    }
+    return null;
+}
+
+async function releaseLock({ file, token }) {
+    try {
+        // Leave it alone if it was broken as stale and taken by someone else
+        if (await fs.promises.readFile(file, 'utf8') === token) {
+            await fs.promises.rm(file, { force: true });
+        }
+    } catch (error) {
+        if (error.code !== 'ENOENT') logger.error('Failed to release upload lock:', error);
+    }
+}
+
+// Runs task while holding the session's lock; a second request for the same
+// session is rejected rather than interleaving writes. The lock file's mtime
+// is refreshed while the task runs, so a slow chunk is never taken for stale.
+async function withLock(sessionId, task) {
+    const lock = await acquireLock(String(sessionId));
+    if (!lock) {
+        throw new UploadError(409, 'Another request for this upload is in progress', 'UPLOAD_BUSY');
+    }
+
+    const heartbeat = setInterval(() => {
+        const now = new Date();
+        fs.promises.utimes(lock.file, now, now).catch(() => {});
+    }, LOCK_STALE_MS / 3);
+    heartbeat.unref();
+
+    try {
+        return await task();
+    } finally {
+        clearInterval(heartbeat);
+        await releaseLock(lock);
+    }
+}
+
+// Starts a resumable upload for an open session, or returns the existing
+// one when the client re-sends init with the same size and checksum.
+async function initUpload(session, { size, mimeType, sha256 = null }) {
+    const limit = UPLOAD_LIMITS[session.practiceType] || UPLOAD_LIMITS.freestyle;
+    if (size > limit) {
+        throw new UploadError(413, `Audio file exceeds the ${Math.round(limit / (1024 * 1024))}MB limit for ${session.practiceType} sessions`, 'FILE_TOO_LARGE');
+    }
+
+    return withLock(session._id, async () => {
+        const existing = await readMeta(session._id);
+        if (existing && existing.size === size && existing.sha256 === sha256 && existing.mimeType === mimeType) {
+            return describeUpload(existing);
+        }
+
+        const paths = stagingPaths(session._id);
+        await fs.promises.rm(paths.dir, { recursive: true, force: true });
+        await fs.promises.mkdir(paths.dir, { recursive: true });
+        await fs.promises.writeFile(paths.data, '');
+
+        const now = Date.now();
+        const meta = {
+            sessionId: String(session._id),
+            userId: String(session.userId),
+            size,
+            mimeType,
+            sha256,
+            offset: 0,
+            createdAt: now,
+            updatedAt: now
+        };
+        await writeMeta(meta);
+
+        logger.info(`Resumable upload started for session: ${session._id} (${size} bytes)`);
+        return describeUpload(meta);
+    });
+}
+
+async function getUpload(sessionId) {
+    const meta = await readMeta(sessionId);
+    return meta ? describeUpload(meta) : null;
+}
+
+// Writes one chunk at `offset`. The bytes land in the staging file first and
+// the stored offset only advances once their SHA-256 matches `checksum`, so a
+// corrupt or interrupted chunk is simply re-sent from the same offset.
+async function writeChunk(sessionId, offset, body, { checksum, contentLength }) {
+    return withLock(sessionId, async () => {
+        const meta = await readMeta(sessionId);
+        if (!meta) {
+            throw new UploadError(404, 'No upload in progress for this session', 'UPLOAD_NOT_FOUND');
+        }
+        if (offset !== meta.offset) {
+            throw new UploadError(409, `Upload offset mismatch, expected ${meta.offset}`, 'UPLOAD_OFFSET_MISMATCH', { offset: meta.offset });
+        }
+
+        const limit = Math.min(CHUNK_MAX_BYTES, meta.size - meta.offset);
+        if (contentLength !== undefined && contentLength > limit) {
+            throw new UploadError(413, `Chunk exceeds the ${limit} bytes allowed at this offset`, 'CHUNK_TOO_LARGE');
+        }
+
+        const hash = crypto.createHash('sha256');
+        let written = 0;
+        let tooLarge = false;
+        const counter = new Transform({
+            transform(chunk, encoding, done) {
+                if (tooLarge) return done();
+                if (written + chunk.length > limit) {
+                    // Stop writing but keep reading: the rest of the body is
+                    // drained so the route can still answer with a 413
+                    // instead of the connection being reset.
+                    tooLarge = true;
+                    body.unpipe(counter);
+                    body.resume();
+                    counter.end();
+                    return done();
+                }
+                written += chunk.length;
+                uploadBytesInFlight.inc({ kind: 'chunk' }, chunk.length);
+                hash.update(chunk);
+                done(null, chunk);
+            }
+        });
+
+        // The body is piped in rather than passed to pipeline(), which would
+        // destroy the request (and its socket) on any error.
+        const onError = error => counter.destroy(error);
+        const onClose = () => {
+            if (!body.readableEnded && !tooLarge) {
+                counter.destroy(new UploadError(400, 'Chunk upload was interrupted', 'CHUNK_INTERRUPTED', { offset: meta.offset }));
+            }
+        };
+        body.on('error', onError);
+        body.on('close', onClose);
+        body.pipe(counter);
+
+        try {
+            await pipeline(counter, fs.createWriteStream(stagingPaths(sessionId).data, {
+                flags: 'r+',
+                start: offset
+            }));
+        } finally {
+            body.off('error', onError);
+            body.off('close', onClose);
+            uploadBytesInFlight.dec({ kind: 'chunk' }, written);
+            uploadBytesTotal.inc({ kind: 'chunk' }, written);
+        }
+
+        if (tooLarge) {
+            throw new UploadError(413, `Chunk exceeds the ${limit} bytes allowed at this offset`, 'CHUNK_TOO_LARGE', { offset: meta.offset });
+        }
+        if (written === 0) {
+            throw new UploadError(400, 'Chunk body is empty', 'CHUNK_EMPTY');
+        }
+        if (hash.digest('hex') !== checksum.toLowerCase()) {
+            throw new UploadError(400, 'Chunk checksum mismatch, please resend it', 'CHUNK_CHECKSUM_MISMATCH', { offset: meta.offset });
+        }
+
+        meta.offset += written;
+        meta.updatedAt = Date.now();
+        await writeMeta(meta);
+
+        return describeUpload(meta);
+    });
+}
+
+async function hashFile(file) {
+    const hash = crypto.createHash('sha256');
+    await pipeline(fs.createReadStream(file), hash);
+    return hash.digest('hex');
+}
+
+// Verifies the assembled file and moves it out of staging. Returns an
+// object shaped like the multer file from middleware/upload.js, so it can
+// be passed to completeSessionAnalysis / the job queue and discarded the
+// same way.
+async function finalizeUpload(sessionId) {
+    return withLock(sessionId, async () => {
+        const meta = await readMeta(sessionId);
+        if (!meta) {
+            throw new UploadError(404, 'No upload in progress for this session', 'UPLOAD_NOT_FOUND');
+        }
+        if (meta.offset !== meta.size) {
+            throw new UploadError(409, `Upload incomplete, ${meta.size - meta.offset} bytes missing`, 'UPLOAD_INCOMPLETE', { offset: meta.offset });
+        }
+
+        const paths = stagingPaths(sessionId);
+        await fs.promises.truncate(paths.data, meta.size);
+
+        const sha256 = await hashFile(paths.data);
+        if (meta.sha256 && meta.sha256.toLowerCase() !== sha256) {
+            meta.offset = 0;
+            meta.updatedAt = Date.now();
+            await writeMeta(meta);
+            throw new UploadError(400, 'Assembled file does not match the declared checksum, upload restarted', 'UPLOAD_CHECKSUM_MISMATCH', { offset: 0 });
+        }
+
+        const target = path.join(UPLOAD_TMP_DIR, uuidv4());
+        await fs.promises.rename(paths.data, target);
+        await fs.promises.rm(paths.dir, { recursive: true, force: true });
+
+        return {
+            fieldname: 'audio',
+            originalname: `${sessionId}.audio`,
+            mimetype: meta.mimeType,
+            path: target,
+            size: meta.size,
+            sha256
+        };
+    });
+}
+
+async function abortUpload(sessionId) {
+    return withLock(sessionId, () => fs.promises.rm(stagingPaths(sessionId).dir, { recursive: true, force: true }));
+}
+
+// Removes staging areas that have not received a chunk within
+// UPLOAD_STAGING_TTL_MS, skipping any a request (in any worker) holds the
+// lock for, and lock files left behind by workers that died.
+async function sweepStaging(now = Date.now()) {
+    let entries;
+    try {
+        entries = await fs.promises.readdir(STAGING_DIR);
+    } catch (error) {
+        if (error.code === 'ENOENT') return 0;
+        throw error;
+    }
+
+    let removed = 0;
+    for (const sessionId of entries) {
+        if (sessionId.startsWith('.')) continue;
+
+        const lock = await acquireLock(sessionId);
+        if (!lock) continue;
+        try {
+            const paths = stagingPaths(sessionId);
+            let updatedAt;
+            try {
+                const meta = await readMeta(sessionId);
+                updatedAt = meta ? meta.updatedAt : (await fs.promises.stat(paths.dir)).mtimeMs;
+            } catch (error) {
+                updatedAt = 0;
+            }
+
+            if (now - updatedAt > STAGING_TTL_MS) {
+                await fs.promises.rm(paths.dir, { recursive: true, force: true });
+                removed += 1;
+            }
+        } finally {
+            await releaseLock(lock);
+        }
+    }
+
+    const locks = await fs.promises.readdir(LOCK_DIR).catch(() => []);
+    for (const name of locks) {
+        await breakStaleLock(path.join(LOCK_DIR, name), now);
+    }
+
+    if (removed > 0) {
+        logger.info(`Removed ${removed} expired partial upload(s)`);
+    }
+    return removed;
+}
+
+let gcTimer = null;
+
+function startStagingGc() {
+    if (gcTimer) return gcTimer;
+    const sweep = () => sweepStaging().catch(error => logger.error('Partial upload cleanup failed:', error));
+    sweep();
+    gcTimer = setInterval(sweep, GC_INTERVAL_MS);
+    gcTimer.unref();
+    return gcTimer;
+}
+
+module.exports = {
+    UploadError,
+    initUpload,
+    getUpload,
+    writeChunk,
+    finalizeUpload,
+    abortUpload,
+    sweepStaging,
+    startStagingGc,
+    CHUNK_MAX_BYTES
+};
@@ -1,45 +1,232 @@
-const axios = require('axios');
+const readline = require('readline');
+const { Readable } = require('stream');
 const logger = require('../utils/logger');
+const analysisCache = require('./analysisCache');
+const mlClient = require('./mlClient');
+const metrics = require('../utils/metrics');
 
-const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
 const ENABLE_REAL_ANALYSIS = process.env.ENABLE_REAL_ANALYSIS === 'true';
 
-async function analyzeSpeech(audioBuffer, options = {}) {
+// Recordings at least this long (seconds) or this large (bytes) are
+// streamed to the analyzer window by window instead of being posted as a
+// single multipart body. The byte threshold stays under the ML service's
+// ML_MAX_UPLOAD_BYTES (50MB), which rejects larger multipart uploads.
+const STREAMING_MIN_DURATION = parseInt(process.env.STREAMING_ANALYSIS_MIN_DURATION) || 300;
+const STREAMING_MIN_BYTES = parseInt(process.env.STREAMING_ANALYSIS_MIN_BYTES) || 40 * 1024 * 1024;
+const STREAMING_TIMEOUT = parseInt(process.env.STREAMING_ANALYSIS_TIMEOUT) || 10 * 60 * 1000;
+
+// Batch analysis: clips per request, requests in flight at once, and the
+// timeout for a whole batch response.
+const BATCH_SIZE = parseInt(process.env.ANALYSIS_BATCH_SIZE) || 32;
+const BATCH_CONCURRENCY = parseInt(process.env.ANALYSIS_BATCH_CONCURRENCY) || 2;
+const BATCH_TIMEOUT = parseInt(process.env.ANALYSIS_BATCH_TIMEOUT) || 10 * 60 * 1000;
+
+// path: real (ML service), cache (result cache hit), fallback (ML service
+// failed, mock result returned) or mock (real analysis disabled).
+const analysisDuration = metrics.histogram({
+    name: 'speech_analysis_duration_seconds',
+    help: 'analyzeSpeech latency by the path that produced the result',
+    labelNames: ['path'],
+    buckets: [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+});
+
+// `audio` is a Buffer, a Readable, or a function returning a fresh Readable
+// (e.g. re-opening an upload on disk), which lets the ML client retry and
+// hedge requests the way it does for Buffers. Pass `options.audioHash`
+// (SHA-256 hex of the bytes) to use the result cache for streams, which
+// can't be hashed before they are sent, and `options.audioSize` (bytes)
+// so a large stream is sent the streaming way whatever its duration.
+async function analyzeSpeech(audio, options = {}) {
+    const { audioHash, audioSize, ...analysisOptions } = options;
+    const done = analysisDuration.startTimer();
+
     try {
         if (!ENABLE_REAL_ANALYSIS || process.env.MOCK_SPEECH_ANALYSIS === 'true') {
-            return generateMockAnalysis(options);
+            const result = generateMockAnalysis(analysisOptions);
+            done({ path: 'mock' });
+            return result;
         }
 
-        logger.info('Starting real speech analysis...');
+        const size = Buffer.isBuffer(audio) ? audio.length : (audioSize || 0);
+        const streaming = (analysisOptions.duration || 0) >= STREAMING_MIN_DURATION || size >= STREAMING_MIN_BYTES;
+        let computed = false;
+        const run = async () => {
+            computed = true;
+            logger.info(`Starting real speech analysis${streaming ? ' (streaming)' : ''}...`);
 
-        const FormData = require('form-data');
-        const formData = new FormData();
-        formData.append('audio', audioBuffer, {
-            filename: 'speech.wav',
-            contentType: 'audio/wav'
-        });
+            const result = streaming
+                ? await requestStreamingAnalysis(audio, analysisOptions)
+                : await requestAnalysis(audio, analysisOptions);
 
-        const response = await axios.post(
-            `${ML_SERVICE_URL}/analyze-speech`,
-            formData,
-            {
-                headers: {
-                    ...formData.getHeaders(),
-                    'Content-Type': 'multipart/form-data'
-                },
-                timeout: 30000
-            }
-        );
+            logger.info(`Real speech analysis completed: confidence=${result.confidence_score}%`);
+
+            return result;
+        };
 
-        const result = response.data;
-        logger.info(`Real speech analysis completed: confidence=${result.confidence_score}%`);
+        const hash = audioHash || (Buffer.isBuffer(audio) ? analysisCache.hashAudio(audio) : null);
+        const result = hash
+            ? await analysisCache.getOrCompute(analysisCache.cacheKey(hash, analysisOptions), run, analysis => analysis && analysis.success !== false)
+            : await run();
 
+        done({ path: computed ? 'real' : 'cache' });
         return result;
 
     } catch (error) {
-        logger.error('Speech analysis failed:', error);
+        if (error instanceof mlClient.CircuitOpenError || error instanceof mlClient.ClientBusyError) {
+            logger.warn(`Speech analysis skipped: ${error.message}`);
+        } else {
+            logger.error('Speech analysis failed:', error);
+        }
         logger.warn('Using fallback mock analysis');
-        return generateMockAnalysis(options, true);
+        const result = generateMockAnalysis(analysisOptions, true);
+        done({ path: 'fallback' });
+        return result;
+    }
+}
+
+function audioSource(audio) {
+    if (typeof audio === 'function') {
+        return { open: audio, replayable: true };
+    }
+    return { open: () => audio, replayable: Buffer.isBuffer(audio) };
+}
+
+async function requestAnalysis(audio, options) {
+    const FormData = require('form-data');
+    const source = audioSource(audio);
+
+    const response = await mlClient.request({
+        method: 'post',
+        url: '/analyze-speech'
+    }, {
+        replayable: source.replayable,
+        body: () => {
+            const formData = new FormData();
+            formData.append('audio', source.open(), {
+                filename: 'speech.wav',
+                contentType: 'audio/wav'
+            });
+            formData.append('options', JSON.stringify(options));
+            return { data: formData, headers: formData.getHeaders() };
+        }
+    });
+
+    return response.data;
+}
+
+// Sends the raw WAV bytes as a chunked body; the service folds each window
+// into running statistics, so neither side holds the whole recording.
+async function requestStreamingAnalysis(audio, options) {
+    const source = audioSource(audio);
+    const { level, duration, practiceType } = options;
+
+    const response = await mlClient.request({
+        method: 'post',
+        url: '/analyze-speech/stream',
+        params: { level, duration, practiceType },
+        headers: { 'Content-Type': 'audio/wav' },
+        timeout: STREAMING_TIMEOUT
+    }, {
+        replayable: source.replayable,
+        hedge: false,
+        body: () => {
+            const data = source.open();
+            return { data: data instanceof Readable ? data : Readable.from([data]) };
+        }
+    });
+
+    return response.data;
+}
+
+// Analyzes many recordings in BATCH_SIZE-clip requests to the service's
+// process pool. `clips` is an array of `{ id, audio, options }`; `onResult`
+// is called with `{ id, success, result }` (or `{ id, success: false,
+// message, code }`) for each clip as soon as the service finishes it, in
+// completion order. Meant for re-scoring, so results bypass the cache and a
+// failed clip is reported as failed instead of replaced by mock analysis.
+async function analyzeSpeechBatch(clips, { onResult = () => {} } = {}) {
+    const outcomes = [];
+    const emit = (outcome) => {
+        outcomes.push(outcome);
+        onResult(outcome);
+    };
+
+    if (!ENABLE_REAL_ANALYSIS || process.env.MOCK_SPEECH_ANALYSIS === 'true') {
+        for (const clip of clips) {
+            emit({ id: clip.id, success: true, result: generateMockAnalysis(clip.options || {}) });
+        }
+        return outcomes;
+    }
+
+    const groups = [];
+    for (let i = 0; i < clips.length; i += BATCH_SIZE) {
+        groups.push(clips.slice(i, i + BATCH_SIZE));
+    }
+
+    let next = 0;
+    const worker = async () => {
+        while (next < groups.length) {
+            const group = groups[next++];
+            const reported = new Set();
+
+            try {
+                await requestBatchAnalysis(group, (outcome) => {
+                    reported.add(outcome.id);
+                    emit(outcome);
+                });
+            } catch (error) {
+                logger.error(`Batch speech analysis of ${group.length} clips failed:`, error);
+            }
+
+            for (const clip of group) {
+                if (!reported.has(clip.id)) {
+                    emit({ id: clip.id, success: false, message: 'Speech analysis failed', code: 'ANALYSIS_FAILED' });
+                }
+            }
+        }
+    };
+
+    await Promise.all(Array.from({ length: Math.min(BATCH_CONCURRENCY, groups.length) }, worker));
+
+    logger.info(`Batch speech analysis completed: ${outcomes.filter(o => o.success).length}/${clips.length} clips`);
+    return outcomes;
+}
+
+// One multipart request for a group of clips; the service answers with one
+// NDJSON line per clip as each finishes.
+async function requestBatchAnalysis(clips, onOutcome) {
+    const FormData = require('form-data');
+    const formData = new FormData();
+    const ids = new Map();
+    const clipOptions = {};
+
+    for (const clip of clips) {
+        const key = String(clip.id);
+        const { audioHash, audioSize, ...options } = clip.options || {};
+        ids.set(key, clip.id);
+        clipOptions[key] = options;
+        formData.append('audio', clip.audio, {
+            filename: key,
+            contentType: 'audio/wav'
+        });
+    }
+    formData.append('options', JSON.stringify({ clips: clipOptions }));
+
+    const response = await mlClient.request({
+        method: 'post',
+        url: '/analyze-speech/batch',
+        responseType: 'stream',
+        timeout: BATCH_TIMEOUT
+    }, {
+        replayable: false,
+        body: () => ({ data: formData, headers: formData.getHeaders() })
+    });
+
+    const lines = readline.createInterface({ input: response.data, crlfDelay: Infinity });
+    for await (const line of lines) {
+        if (!line.trim()) continue;
+        const outcome = JSON.parse(line);
+        onOutcome({ ...outcome, id: ids.has(outcome.id) ? ids.get(outcome.id) : outcome.id });
     }
 }
 
@@ -184,5 +371,6 @@ function generateImprovements(confidence, clarity, pace, fillerCount) {
 }
 
 module.exports = {
-    analyzeSpeech
+    analyzeSpeech,
+    analyzeSpeechBatch
 };
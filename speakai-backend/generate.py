@@ -0,0 +1,459 @@
+"""Generate the SpeakAI backend files in one step.
+
+script.py and script_1.py ... script_8.py build up the ``backend_files``
+dict (project path -> file content), and script_9.py ... script_11.py
+write it out under download names. Those scripts only work when run in
+order in one shared interpreter. This entry point loads the dict by
+running the build scripts in a single namespace. It then writes every
+target in ``MANIFEST`` under ``--out``, using the project layout.
+
+A file is only rewritten when its content hash differs from the file on
+disk, so regenerating an unchanged tree touches nothing: mtimes stay put,
+Docker layer caches stay valid and nodemon doesn't restart. The hashes of
+the last run are kept in ``.manifest.json`` in the output directory.
+
+With ``--archive`` the targets are streamed straight into a zip or tar.gz
+at their project paths instead. Archives are deterministic: entries are
+sorted and carry fixed timestamps, owners and modes, so the same inputs
+always give the same bytes and the archive can be cached by its digest.
+
+    python generate.py                        # everything, into ./build
+    python generate.py --out ../app           # somewhere else
+    python generate.py --only routes/auth.js  # one target (or its download name)
+    python generate.py --check                # exit 1 if anything would change
+    python generate.py --archive speakai-backend.tar.gz
+    python generate.py --archive - --format zip > speakai-backend.zip
+
+Before anything is written the output is validated (JavaScript syntax,
+JSON/YAML, relative requires; see validate.py) and a failure exits 1.
+
+``--config environments.json`` builds one variant per environment instead
+(into ``--out/<env>/``, or ``--archive 'dist/{env}.tar.gz'``). The variants
+are rendered from parameterized templates; see templates.py.
+
+    python generate.py --config environments.example.json
+    python generate.py --config environments.json --env production --archive 'dist/{env}.tar.gz'
+
+``--report`` prints the require graph (startup order, unreachable modules,
+unused imports; see graph.py). ``--lazy-routes`` emits a server.js that
+requires each router on its first request, keeping the route modules out
+of the cold start.
+
+    python generate.py --report
+    python generate.py --lazy-routes --archive speakai-backend-lazy.tar.gz
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+
+import graph
+import templates
+import validate
+
+HERE = Path(__file__).resolve().parent
+
+# Scripts that fill in backend_files, in the order they must run
+BUILD_SCRIPTS = ['script.py'] + [f'script_{i}.py' for i in range(1, 9)]
+
+# Project path -> download name used by script_9.py ... script_11.py
+MANIFEST = {
+    'server.js': 'server.js',
+    'package.json': 'package.json',
+    '.env.example': '.env.example',
+    'config/database.js': 'database.js',
+    'models/User.js': 'User.js',
+    'models/Session.js': 'Session.js',
+    'routes/auth.js': 'auth-routes.js',
+    'middleware/auth.js': 'auth-middleware.js',
+    'middleware/errorHandler.js': 'errorHandler.js',
+    'middleware/rateLimiter.js': 'rateLimiter.js',
+    'routes/users.js': 'users-routes.js',
+    'routes/sessions.js': 'sessions-routes.js',
+    'services/speechAnalysisService.js': 'speechAnalysisService.js',
+    'services/achievementService.js': 'achievementService.js',
+    'utils/logger.js': 'logger.js',
+    'utils/seedData.js': 'seedData.js',
+    'routes/achievements.js': 'achievements-routes.js',
+    'routes/settings.js': 'settings-routes.js',
+    'routes/progress.js': 'progress-routes.js',
+    'routes/analytics.js': 'analytics-routes.js',
+    'Dockerfile': 'Dockerfile-backend',
+    'docker-compose.yml': 'docker-compose-backend.yml',
+    '.gitignore': 'gitignore-backend',
+    'README.md': 'README-backend.md',
+}
+
+MANIFEST_FILE = '.manifest.json'
+
+ARCHIVE_FORMATS = ('zip', 'tar.gz')
+
+# Timestamp of every archive entry: 1980-01-01, the earliest a zip can hold
+ARCHIVE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ARCHIVE_MTIME = 315532800
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp creates files 0600; generated files get the usual 0666 & ~umask
+FILE_MODE = 0o666 & ~_current_umask()
+
+
+def load_backend_files(script_dir=HERE):
+    """Run the build scripts in one namespace and return backend_files."""
+    namespace = {'__name__': '__speakai_build__'}
+    # The scripts report progress with print(); keep the CLI output to ours
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in BUILD_SCRIPTS:
+            path = script_dir / name
+            code = compile(path.read_text(encoding='utf-8'), str(path), 'exec')
+            exec(code, namespace)
+    return namespace['backend_files']
+
+
+def render(backend_files):
+    """Return {project path: bytes} for every manifest target."""
+    missing = [key for key in MANIFEST if key not in backend_files]
+    if missing:
+        raise KeyError(f"backend_files has no entry for: {', '.join(missing)}")
+    return {key: backend_files[key].encode('utf-8') for key in MANIFEST}
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    try:
+        return sha256(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def write_atomic(path, data):
+    """Replace path with data without leaving a partial file behind."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def resolve_targets(only):
+    """Map --only values (project paths or download names) to project paths."""
+    if not only:
+        return list(MANIFEST)
+    by_download_name = {name: key for key, name in MANIFEST.items()}
+    targets = []
+    for value in only:
+        for item in filter(None, (part.strip() for part in value.split(','))):
+            key = item if item in MANIFEST else by_download_name.get(item)
+            if key is None:
+                raise SystemExit(f'Unknown target: {item} (see --list)')
+            if key not in targets:
+                targets.append(key)
+    return targets
+
+
+def read_manifest(out_dir):
+    try:
+        return json.loads((out_dir / MANIFEST_FILE).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+
+
+def generate(out_dir, targets, rendered, check=False):
+    """Write the changed targets; returns {'written': [...], 'unchanged': [...]}."""
+    result = {'written': [], 'unchanged': []}
+    hashes = {}
+
+    for key in targets:
+        data = rendered[key]
+        digest = sha256(data)
+        hashes[key] = digest
+        path = out_dir / key
+        if file_hash(path) == digest:
+            result['unchanged'].append(key)
+            continue
+        result['written'].append(key)
+        if not check:
+            write_atomic(path, data)
+
+    if not check:
+        previous = read_manifest(out_dir)
+        manifest = {**previous, **hashes}
+        if manifest != previous:
+            text = json.dumps(manifest, indent=2, sort_keys=True) + '\n'
+            write_atomic(out_dir / MANIFEST_FILE, text.encode('utf-8'))
+    return result
+
+
+class _HashingWriter:
+    """Write-only file object that hashes what passes through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.raw.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+def write_zip(fileobj, files):
+    """Stream (path, bytes) pairs into a zip on a write-only file object."""
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, data in files:
+            info = zipfile.ZipInfo(path, date_time=ARCHIVE_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 3
+            info.external_attr = 0o100644 << 16
+            archive.writestr(info, data)
+
+
+def write_tar_gz(fileobj, files):
+    """Stream (path, bytes) pairs into a tar.gz on a write-only file object."""
+    # No name or timestamp in the gzip header
+    with gzip.GzipFile(filename='', mode='wb', fileobj=fileobj, mtime=0) as compressed:
+        with tarfile.open(fileobj=compressed, mode='w|', format=tarfile.USTAR_FORMAT) as archive:
+            for path, data in files:
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                info.mtime = ARCHIVE_MTIME
+                info.mode = 0o644
+                info.uid = info.gid = 0
+                info.uname = info.gname = ''
+                archive.addfile(info, io.BytesIO(data))
+
+
+def archive_format(path, fmt=None):
+    if fmt:
+        return fmt
+    name = str(path)
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    raise SystemExit(f'Cannot tell the archive format of {name}; pass --format')
+
+
+def build_archive(fileobj, targets, rendered, fmt):
+    """Write the targets to fileobj in project-path order; returns (sha256, size)."""
+    writer = _HashingWriter(fileobj)
+    files = ((key, rendered[key]) for key in sorted(targets))
+    (write_zip if fmt == 'zip' else write_tar_gz)(writer, files)
+    writer.flush()
+    return writer.hash.hexdigest(), writer.size
+
+
+def write_archive(path, targets, rendered, fmt):
+    """Build the archive next to path and only replace path if its bytes changed.
+
+    Returns (sha256, size, changed).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            digest, size = build_archive(f, targets, rendered, fmt)
+        if file_hash(path) == digest:
+            os.unlink(tmp)
+            return digest, size, False
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+        return digest, size, True
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def emit(args, targets, rendered, env=None):
+    """Write one build as an archive or a directory; returns the exit status."""
+    label = f'[{env}] ' if env else ''
+
+    if args.archive:
+        if args.archive == '-':
+            digest, size = build_archive(sys.stdout.buffer, targets, rendered, archive_format('', args.format))
+            print(f'sha256:{digest} {size} bytes', file=sys.stderr)
+            return 0
+        path = Path(args.archive.replace('{env}', env or '')).resolve()
+        digest, size, changed = write_archive(path, targets, rendered, archive_format(path, args.format))
+        state = 'written' if changed else 'unchanged'
+        print(f'✅ {label}{path} {state}: {len(targets)} files, {size} bytes, sha256:{digest}')
+        return 0
+
+    out_dir = Path(args.out).resolve()
+    if env:
+        out_dir = out_dir / env
+    result = generate(out_dir, targets, rendered, check=args.check)
+
+    verb = 'Out of date' if args.check else 'Wrote'
+    for key in result['written']:
+        print(f'{label}{verb}: {key}')
+    print(f"✅ {label}{len(result['written'])} {'out of date' if args.check else 'written'}, "
+          f"{len(result['unchanged'])} unchanged ({out_dir})")
+    return 1 if args.check and result['written'] else 0
+
+
+def apply_lazy_routes(rendered):
+    """Swap in the lazily-required routes variant of server.js (see graph.py)."""
+    if 'server.js' not in rendered:
+        return rendered
+    rendered = dict(rendered)
+    rendered['server.js'] = graph.lazy_routes(rendered['server.js'].decode('utf-8')).encode('utf-8')
+    return rendered
+
+
+def run_checks(args, builds, all_keys):
+    """Validate each build's targets; prints problems and returns True if all pass."""
+    cache = validate.ResultCache(args.validate_cache or None)
+    ok = True
+    for env, files in builds:
+        label = f'[{env}] ' if env else ''
+        errors, notes = validate.validate(files, all_keys=all_keys, jobs=args.jobs or os.cpu_count() or 1, cache=cache)
+        for note in notes:
+            print(f'{label}⚠️  {note}', file=sys.stderr)
+        for key in sorted(errors):
+            for error in errors[key]:
+                print(f'{label}❌ {key}: {error}', file=sys.stderr)
+        ok = ok and not errors
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the SpeakAI backend files.')
+    parser.add_argument('--out', default=str(HERE / 'build'),
+                        help='output directory (default: ./build next to this script)')
+    parser.add_argument('--only', action='append', metavar='TARGET',
+                        help='regenerate only this target; repeat or comma-separate for more')
+    parser.add_argument('--check', action='store_true',
+                        help="don't write anything; exit 1 if any target is out of date")
+    parser.add_argument('--list', action='store_true', help='list the targets and exit')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='write a zip or tar.gz to PATH (- for stdout) instead of a directory; '
+                             'with --config, {env} in PATH is replaced by the environment name')
+    parser.add_argument('--format', choices=ARCHIVE_FORMATS,
+                        help='archive format (default: from the --archive suffix)')
+    parser.add_argument('--config', metavar='FILE',
+                        help='build one variant per environment in this JSON file (see templates.py)')
+    parser.add_argument('--env', action='append', metavar='NAME',
+                        help='with --config, build only this environment; repeat for more')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='render processes for --config (default: one per CPU)')
+    parser.add_argument('--render-cache', metavar='DIR', default=str(HERE / '.render-cache'),
+                        help="where --config keeps rendered files between runs ('' to disable)")
+    parser.add_argument('--no-validate', action='store_true',
+                        help='skip the syntax, lint and require checks (see validate.py)')
+    parser.add_argument('--validate-only', action='store_true',
+                        help='run the checks and exit without writing anything')
+    parser.add_argument('--validate-cache', metavar='DIR', default=str(HERE / '.validate-cache'),
+                        help="where check results are cached by content hash ('' to disable)")
+    parser.add_argument('--lazy-routes', action='store_true',
+                        help='emit a server.js that requires each router on its first request')
+    parser.add_argument('--report', action='store_true',
+                        help='print the require graph: startup order, unreachable modules and '
+                             'unused imports, then exit')
+    parser.add_argument('--list-parameters', action='store_true',
+                        help='list the parameters a --config environment can set and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for key, name in MANIFEST.items():
+            print(f'{key:40} {name}')
+        return 0
+    if args.list_parameters:
+        for name, parameter in templates.PARAMETERS.items():
+            print(f'{name:30} {parameter.target:28} {parameter.description}')
+        return 0
+    if args.archive and args.check:
+        parser.error('--check applies to directory output only')
+    if args.env and not args.config:
+        parser.error('--env requires --config')
+
+    targets = resolve_targets(args.only)
+    backend_files = load_backend_files()
+
+    if args.report:
+        try:
+            lazy = dict(backend_files, **{'server.js': graph.lazy_routes(backend_files['server.js'])})
+            print(graph.format_report(graph.analyze(backend_files), graph.analyze(lazy)))
+        except graph.GraphError as error:
+            raise SystemExit(f'Cannot build the require graph: {error}')
+        return 0
+
+    if args.no_validate and args.validate_only:
+        parser.error('--validate-only and --no-validate are exclusive')
+
+    if not args.config:
+        rendered = render(backend_files)
+        if args.lazy_routes:
+            rendered = apply_lazy_routes(rendered)
+        if not args.no_validate:
+            if not run_checks(args, [(None, {key: rendered[key] for key in targets})], set(backend_files)):
+                return 1
+            if args.validate_only:
+                print('✅ All checks passed')
+                return 0
+        return emit(args, targets, rendered)
+
+    try:
+        environments = templates.load_config(args.config)
+        if args.env:
+            unknown = [env for env in args.env if env not in environments]
+            if unknown:
+                raise templates.TemplateError(f"Unknown environment(s): {', '.join(unknown)}")
+            environments = {env: environments[env] for env in args.env}
+        if args.archive and len(environments) > 1 and (args.archive == '-' or '{env}' not in args.archive):
+            parser.error('--archive needs {env} in its path to build several environments')
+
+        cache = templates.RenderCache(args.render_cache or None)
+        builds = templates.render_environments(
+            templates.build_templates(backend_files), environments, targets, cache, jobs=args.jobs
+        )
+    except templates.TemplateError as error:
+        raise SystemExit(f'{args.config}: {error}')
+    if args.lazy_routes:
+        builds = {env: apply_lazy_routes(rendered) for env, rendered in builds.items()}
+
+    print(f'Rendered {len(builds)} environment(s): {cache.misses} renders, {cache.hits} from cache',
+          file=sys.stderr)
+    if not args.no_validate:
+        if not run_checks(args, list(builds.items()), set(backend_files)):
+            return 1
+        if args.validate_only:
+            print('✅ All checks passed')
+            return 0
+    status = 0
+    for env, rendered in builds.items():
+        status = max(status, emit(args, targets, rendered, env))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
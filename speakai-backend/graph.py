@@ -0,0 +1,188 @@
+"""Require graph of the generated backend files.
+
+``analyze`` builds the graph of relative requires between the generated
+JavaScript files, starting from the package.json "main" entry (server.js).
+It reports:
+
+* unused imports: a binding from ``const x = require(...)`` (or a
+  destructured name) that is never referenced again in its file;
+* unreachable modules: generated files that nothing loaded from the entry
+  requires;
+* startup order: the local modules loaded before the server listens, in
+  the order Node finishes evaluating them (dependencies first). Routers
+  deferred by ``lazy_routes`` are reachable but not part of it.
+
+``lazy_routes`` rewrites server.js so each router is required on its first
+request rather than at startup, which keeps the route modules and their
+dependencies out of the cold start. The checks are textual: a name that
+appears only in a string or comment counts as used, so the report errs
+toward missing an unused import rather than flagging a used one.
+"""
+
+import json
+import re
+
+from validate import kind_of, resolve_require
+
+BINDING_PATTERN = re.compile(
+    r'''^[ \t]*(?:const|let|var)\s+(\{[^}]*\}|[A-Za-z_$][\w$]*)\s*=\s*'''
+    r'''require\(\s*(['"])([^'"]+)\2\s*\)[\w$.]*\s*;?[ \t]*\n?''',
+    re.MULTILINE
+)
+REQUIRE_PATTERN = re.compile(r'''require\(\s*(['"])([^'"]+)\1\s*\)''')
+ROUTE_BINDING = re.compile(
+    r'''^const\s+([A-Za-z_$][\w$]*)\s*=\s*require\(\s*(['"])(\./routes/[^'"]+)\2\s*\);[ \t]*\n''',
+    re.MULTILINE
+)
+
+LAZY_ROUTER = '''// Routers are required on their first request instead of at startup, so
+// their modules stay out of the cold start until a client needs them
+function lazyRouter(load) {
+    let router;
+    return (req, res, next) => {
+        router = router || load();
+        return router(req, res, next);
+    };
+}
+'''
+
+
+class GraphError(ValueError):
+    pass
+
+
+def _bound_names(binding):
+    """Names a require binding introduces: 'x' or '{ a, b: c }' -> a, c."""
+    if not binding.startswith('{'):
+        return [binding]
+    names = []
+    for part in binding.strip('{} \t\n').split(','):
+        part = part.strip()
+        if part:
+            names.append(part.split(':')[-1].strip())
+    return names
+
+
+def unused_imports(key, text):
+    """[(line, name, request)] for require bindings never used again in text."""
+    unused = []
+    for match in BINDING_PATTERN.finditer(text):
+        rest = text[:match.start()] + text[match.end():]
+        line = text.count('\n', 0, match.start()) + 1
+        for name in _bound_names(match.group(1)):
+            if not re.search(rf'(?<![\w$.]){re.escape(name)}(?![\w$])', rest):
+                unused.append((line, name, match.group(3)))
+    return unused
+
+
+def entry_point(files):
+    try:
+        main = json.loads(files['package.json']).get('main', 'server.js')
+    except (KeyError, ValueError):
+        main = 'server.js'
+    return main[2:] if main.startswith('./') else main
+
+
+def local_requires(key, text, keys, eager_only=False):
+    """Generated files required by key, in source order. With eager_only,
+    requires deferred through lazyRouter(() => require(...)) are left out."""
+    found = []
+    for match in REQUIRE_PATTERN.finditer(text):
+        if eager_only and text[:match.start()].endswith('lazyRouter(() => '):
+            continue
+        request = match.group(2)
+        if request.startswith('.'):
+            target = resolve_require(key, request, keys)
+            if target and target not in found:
+                found.append(target)
+    return found
+
+
+def load_order(files, entry, eager_only=False):
+    """Local modules reachable from entry, in the order Node first finishes
+    evaluating them (dependencies before dependents)."""
+    keys = set(files)
+    order = []
+    seen = set()
+
+    def visit(key):
+        seen.add(key)
+        for dependency in local_requires(key, files[key], keys, eager_only):
+            if dependency not in seen:
+                visit(dependency)
+        order.append(key)
+
+    if entry in files:
+        visit(entry)
+    return order
+
+
+def analyze(files):
+    """Report on {key: str}; returns a dict (see module docstring)."""
+    js = {key: text for key, text in files.items() if kind_of(key) == 'js'}
+    entry = entry_point(files)
+    if entry not in js:
+        raise GraphError(f'entry point {entry} is not a generated file')
+
+    order = load_order(files, entry, eager_only=True)
+    reachable = set(load_order(files, entry))
+    unused = {}
+    for key, text in sorted(js.items()):
+        found = unused_imports(key, text)
+        if found:
+            unused[key] = found
+    return {
+        'entry': entry,
+        'startupOrder': order,
+        'startupBytes': sum(len(files[key].encode('utf-8')) for key in order),
+        'unreachable': sorted(key for key in js if key not in reachable),
+        'unusedImports': unused,
+        'graph': {key: local_requires(key, text, set(files)) for key, text in sorted(js.items())},
+    }
+
+
+def lazy_routes(server_js):
+    """server.js with each `app.use(path, xRoutes)` router required lazily."""
+    text = server_js
+    converted = 0
+    for match in list(ROUTE_BINDING.finditer(server_js)):
+        name, request = match.group(1), match.group(3)
+        mount = re.compile(rf'''(app\.use\(\s*(['"])[^'"]+\2\s*,\s*){re.escape(name)}(\s*\))''')
+        uses = re.findall(rf'(?<![\w$.]){re.escape(name)}(?![\w$])', text)
+        # Only routers whose sole use is a single mount can be deferred
+        if len(uses) != 2 or len(mount.findall(text)) != 1:
+            continue
+        text = text.replace(match.group(0), '', 1)
+        text = mount.sub(lambda m: f"{m.group(1)}lazyRouter(() => require('{request}')){m.group(3)}", text)
+        converted += 1
+
+    if converted == 0:
+        raise GraphError('server.js has no `const x = require(\'./routes/...\')` routers mounted with app.use')
+
+    anchor = '// Import routes\n'
+    if anchor in text:
+        return text.replace(anchor, LAZY_ROUTER, 1)
+    first_mount = text.index('lazyRouter(')
+    line_start = text.rfind('\n', 0, first_mount) + 1
+    return text[:line_start] + LAZY_ROUTER + text[line_start:]
+
+
+def format_report(report, lazy_report=None):
+    lines = [f"Entry point: {report['entry']}", '', 'Startup order:']
+    lines += [f'  {i + 1:2}. {key}' for i, key in enumerate(report['startupOrder'])]
+    lines += ['', f"Loaded at startup: {len(report['startupOrder'])} local modules, "
+                  f"{report['startupBytes']} bytes of source"]
+    if lazy_report:
+        lines.append(f"With --lazy-routes: {len(lazy_report['startupOrder'])} local modules, "
+                     f"{lazy_report['startupBytes']} bytes of source")
+
+    lines += ['', 'Unreachable modules:']
+    lines += [f'  {key}' for key in report['unreachable']] or ['  (none)']
+
+    lines += ['', 'Unused imports:']
+    for key, unused in report['unusedImports'].items():
+        for line, name, request in unused:
+            lines.append(f"  {key}:{line}: {name} (require('{request}'))")
+    if not report['unusedImports']:
+        lines.append('  (none)')
+    return '\n'.join(lines)
@@ -0,0 +1,235 @@
+"""Per-environment parameters for the generated backend files.
+
+The backend_files sources are plain strings. Each entry in ``PARAMETERS``
+names a snippet of one of them, such as ``maxPoolSize: 10`` in
+config/database.js. ``build_templates`` turns the snippet into a
+``{{name}}`` marker, and an environment from the config file fills the
+marker in. A parameter an environment leaves out renders as the original
+snippet, so an empty environment reproduces backend_files exactly.
+
+The config file is JSON:
+
+    {
+      "environments": {
+        "production": {"max_pool_size": 50, "rate_limit_max": 300},
+        "staging": {"max_pool_size": 10, "body_limit": "25mb"}
+      }
+    }
+
+Renders are keyed by the template's hash plus the parameters it uses.
+Environments that agree on a file share one render, and the results are
+kept in a cache directory between runs. Whatever is not cached is rendered
+across a process pool.
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class Parameter:
+    target: str      # backend_files key
+    source: str      # snippet replaced by the marker (every occurrence)
+    template: str    # replacement, with {value}
+    kind: str        # 'int' or 'size'
+    description: str
+
+
+PARAMETERS = {
+    'port': Parameter(
+        'server.js', 'process.env.PORT || 5000', 'process.env.PORT || {value}', 'int',
+        'Default HTTP port'),
+    'env_port': Parameter(
+        '.env.example', '\nPORT=5000\n', '\nPORT={value}\n', 'int',
+        'PORT in .env.example'),
+    'body_limit': Parameter(
+        'server.js', "limit: '10mb'", "limit: '{value}'", 'size',
+        'JSON and urlencoded body size limit, e.g. 10mb'),
+    'max_pool_size': Parameter(
+        'config/database.js', 'maxPoolSize: 10', 'maxPoolSize: {value}', 'int',
+        'MongoDB connection pool size'),
+    'server_selection_timeout_ms': Parameter(
+        'config/database.js', 'serverSelectionTimeoutMS: 5000', 'serverSelectionTimeoutMS: {value}', 'int',
+        'MongoDB server selection timeout'),
+    'socket_timeout_ms': Parameter(
+        'config/database.js', 'socketTimeoutMS: 45000', 'socketTimeoutMS: {value}', 'int',
+        'MongoDB socket timeout'),
+    'rate_limit_window_ms': Parameter(
+        'middleware/rateLimiter.js', 'parseInt(process.env.RATE_LIMIT_WINDOW_MS) || 15 * 60 * 1000',
+        'parseInt(process.env.RATE_LIMIT_WINDOW_MS) || {value}', 'int',
+        'Default rate-limit window'),
+    'rate_limit_max': Parameter(
+        'middleware/rateLimiter.js', 'parseInt(process.env.RATE_LIMIT_MAX) || 100',
+        'parseInt(process.env.RATE_LIMIT_MAX) || {value}', 'int',
+        'Default requests per rate-limit window'),
+    'upload_max_bytes': Parameter(
+        'routes/sessions.js', 'fileSize: 10 * 1024 * 1024 // 10MB', 'fileSize: {value}', 'int',
+        'Largest audio upload accepted'),
+}
+
+SIZE_PATTERN = re.compile(r'^\d+(b|kb|mb|gb)?$')
+MARKER = '{{%s}}'
+
+
+class TemplateError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Template:
+    text: str
+    sha256: str
+    parameters: tuple  # names of the markers in text
+
+
+def build_templates(backend_files):
+    """Return {key: Template} for every backend_files entry."""
+    texts = dict(backend_files)
+    names_by_key = {}
+    for name, parameter in PARAMETERS.items():
+        text = texts.get(parameter.target)
+        if text is None or parameter.source not in text:
+            # The build scripts changed under the parameter definition
+            raise TemplateError(f'{name}: {parameter.source!r} not found in {parameter.target}')
+        texts[parameter.target] = text.replace(parameter.source, MARKER % name)
+        names_by_key.setdefault(parameter.target, []).append(name)
+
+    return {
+        key: Template(text, hashlib.sha256(text.encode('utf-8')).hexdigest(), tuple(names_by_key.get(key, ())))
+        for key, text in texts.items()
+    }
+
+
+def validate(name, value):
+    """Return value formatted for the source, or raise TemplateError."""
+    parameter = PARAMETERS.get(name)
+    if parameter is None:
+        raise TemplateError(f'Unknown parameter: {name}')
+    if parameter.kind == 'int':
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise TemplateError(f'{name} must be a positive integer, got {value!r}')
+        return str(value)
+    if not isinstance(value, str) or not SIZE_PATTERN.match(value):
+        raise TemplateError(f'{name} must be a size such as 10mb, got {value!r}')
+    return value
+
+
+def load_config(path):
+    """Read a config file; returns {environment: {parameter: value}}."""
+    try:
+        config = json.loads(Path(path).read_text(encoding='utf-8'))
+    except json.JSONDecodeError as error:
+        raise TemplateError(f'{path}: {error}') from None
+    environments = config.get('environments') if isinstance(config, dict) else None
+    if not isinstance(environments, dict) or not environments:
+        raise TemplateError(f'{path}: expected a non-empty "environments" object')
+
+    for env, params in environments.items():
+        if not re.match(r'^[A-Za-z0-9_.-]+$', env):
+            raise TemplateError(f'Invalid environment name: {env!r}')
+        if not isinstance(params, dict):
+            raise TemplateError(f'{env}: parameters must be an object')
+        for name, value in params.items():
+            try:
+                validate(name, value)
+            except TemplateError as error:
+                raise TemplateError(f'{env}: {error}') from None
+    return environments
+
+
+def render_template(text, values):
+    """Fill in a template's markers. values: ((name, formatted value), ...)"""
+    for name, value in values:
+        text = text.replace(MARKER % name, value)
+    return text.encode('utf-8')
+
+
+def _render_values(template, params):
+    """The marker values for one template in one environment, in a stable order."""
+    values = []
+    for name in template.parameters:
+        parameter = PARAMETERS[name]
+        if name in params:
+            values.append((name, parameter.template.format(value=validate(name, params[name]))))
+        else:
+            values.append((name, parameter.source))
+    return tuple(values)
+
+
+def _cache_key(template, values):
+    return hashlib.sha256(
+        (template.sha256 + json.dumps(values, separators=(',', ':'))).encode('utf-8')
+    ).hexdigest()
+
+
+class RenderCache:
+    """Rendered files by cache key, in memory and optionally on disk."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else None
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.memory:
+            self.hits += 1
+            return self.memory[key]
+        if self.directory:
+            try:
+                data = (self.directory / key).read_bytes()
+            except FileNotFoundError:
+                pass
+            else:
+                self.hits += 1
+                self.memory[key] = data
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        self.memory[key] = data
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f'.{key}.{os.getpid()}'
+            tmp.write_bytes(data)
+            os.replace(tmp, self.directory / key)
+
+
+def render_environments(templates, environments, targets, cache, jobs=None):
+    """Return {environment: {key: bytes}} for targets in every environment.
+
+    Each distinct (template, parameters) pair is rendered once; renders not
+    in the cache are spread over a pool of ``jobs`` processes.
+    """
+    plan = {}     # environment -> {key: cache key}
+    pending = {}  # cache key -> (text, values)
+    for env, params in environments.items():
+        plan[env] = {}
+        for key in targets:
+            template = templates[key]
+            values = _render_values(template, params)
+            cache_key = _cache_key(template, values)
+            plan[env][key] = cache_key
+            if cache_key not in pending and cache.get(cache_key) is None:
+                pending[cache_key] = (template.text, values)
+
+    if pending:
+        if jobs == 1 or len(pending) == 1:
+            rendered = {cache_key: render_template(*job) for cache_key, job in pending.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = pool.map(render_template, *zip(*pending.values()), chunksize=8)
+                rendered = dict(zip(pending, results))
+        for cache_key, data in rendered.items():
+            cache.put(cache_key, data)
+
+    return {
+        env: {key: cache.memory[cache_key] for key, cache_key in keys.items()}
+        for env, keys in plan.items()
+    }
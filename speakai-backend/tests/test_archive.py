@@ -0,0 +1,104 @@
+"""Archives are byte-identical for the same inputs."""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+import generate
+
+FILES = {
+    'server.js': b"require('./routes/auth');\n",
+    'routes/auth.js': b'module.exports = {};\n',
+    'package.json': b'{"main": "server.js"}\n',
+}
+
+
+def build(fmt, targets=None, files=FILES):
+    buffer = io.BytesIO()
+    digest, size = generate.build_archive(buffer, list(targets or files), files, fmt)
+    data = buffer.getvalue()
+    assert digest == generate.sha256(data)
+    assert size == len(data)
+    return data
+
+
+@pytest.mark.parametrize('fmt', generate.ARCHIVE_FORMATS)
+def test_same_inputs_give_the_same_bytes(fmt, monkeypatch):
+    first = build(fmt)
+    # Nothing may depend on the clock
+    monkeypatch.setattr(time, 'time', lambda: 2_000_000_000.0)
+    assert build(fmt) == first
+
+
+@pytest.mark.parametrize('fmt', generate.ARCHIVE_FORMATS)
+def test_target_order_does_not_matter(fmt):
+    assert build(fmt, targets=reversed(list(FILES))) == build(fmt)
+
+
+@pytest.mark.parametrize('fmt', generate.ARCHIVE_FORMATS)
+def test_different_content_gives_different_bytes(fmt):
+    assert build(fmt, files=dict(FILES, **{'server.js': b'// changed\n'})) != build(fmt)
+
+
+def test_zip_entries_are_sorted_with_fixed_metadata():
+    with zipfile.ZipFile(io.BytesIO(build('zip'))) as archive:
+        infos = archive.infolist()
+        assert [info.filename for info in infos] == sorted(FILES)
+        for info in infos:
+            assert info.date_time == generate.ARCHIVE_DATE_TIME
+            assert info.external_attr >> 16 == 0o100644
+            assert archive.read(info) == FILES[info.filename]
+
+
+def test_tar_entries_are_sorted_with_fixed_metadata():
+    data = build('tar.gz')
+    # gzip header: no file name flag and a zero mtime
+    assert data[3] & 0x08 == 0
+    assert data[4:8] == b'\0\0\0\0'
+
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as archive:
+        members = archive.getmembers()
+        assert [member.name for member in members] == sorted(FILES)
+        for member in members:
+            assert member.mtime == generate.ARCHIVE_MTIME
+            assert (member.mode, member.uid, member.gid, member.uname, member.gname) == (0o644, 0, 0, '', '')
+            assert archive.extractfile(member).read() == FILES[member.name]
+
+
+def test_write_archive_leaves_an_identical_archive_alone(tmp_path):
+    path = tmp_path / 'dist' / 'backend.tar.gz'
+    digest, _, changed = generate.write_archive(path, list(FILES), FILES, 'tar.gz')
+    assert changed
+    past = 1_000_000_000
+    os.utime(path, (past, past))
+
+    again, _, changed = generate.write_archive(path, list(FILES), FILES, 'tar.gz')
+
+    assert (again, changed) == (digest, False)
+    assert path.stat().st_mtime == past
+    assert [p.name for p in path.parent.iterdir()] == ['backend.tar.gz']
+
+
+def test_archive_matches_the_directory_build(tmp_path):
+    backend_files = generate.load_backend_files()
+    rendered = generate.render(backend_files)
+    targets = list(generate.MANIFEST)
+
+    generate.generate(tmp_path, targets, rendered)
+    with tarfile.open(fileobj=io.BytesIO(build('tar.gz', targets, rendered)), mode='r:gz') as archive:
+        for member in archive.getmembers():
+            assert archive.extractfile(member).read() == (tmp_path / member.name).read_bytes()
+
+
+@pytest.mark.parametrize('name, fmt', [('a.zip', 'zip'), ('a.tar.gz', 'tar.gz'), ('a.tgz', 'tar.gz')])
+def test_format_follows_the_suffix(name, fmt):
+    assert generate.archive_format(name) == fmt
+
+
+def test_unknown_suffix_needs_format():
+    with pytest.raises(SystemExit):
+        generate.archive_format('a.rar')
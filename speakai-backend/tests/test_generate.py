@@ -0,0 +1,119 @@
+"""Incremental directory output: only changed targets are rewritten."""
+
+import json
+import os
+import stat
+
+import pytest
+
+import generate
+
+FILES = {
+    'server.js': b"require('./routes/auth');\n",
+    'routes/auth.js': b'module.exports = {};\n',
+    'package.json': b'{"main": "server.js"}\n',
+}
+
+
+def mtimes(out_dir, keys):
+    return {key: (out_dir / key).stat().st_mtime_ns for key in keys}
+
+
+def age(out_dir, keys):
+    """Push the files' mtimes into the past so a rewrite is visible."""
+    for key in keys:
+        os.utime(out_dir / key, ns=(1_000_000_000, 1_000_000_000))
+
+
+def test_first_run_writes_every_target_and_the_manifest(tmp_path):
+    result = generate.generate(tmp_path, list(FILES), FILES)
+
+    assert sorted(result['written']) == sorted(FILES)
+    assert result['unchanged'] == []
+    for key, data in FILES.items():
+        assert (tmp_path / key).read_bytes() == data
+    manifest = json.loads((tmp_path / generate.MANIFEST_FILE).read_text())
+    assert manifest == {key: generate.sha256(data) for key, data in FILES.items()}
+
+
+def test_rerun_with_the_same_content_touches_nothing(tmp_path):
+    generate.generate(tmp_path, list(FILES), FILES)
+    keys = [*FILES, generate.MANIFEST_FILE]
+    age(tmp_path, keys)
+    before = mtimes(tmp_path, keys)
+
+    result = generate.generate(tmp_path, list(FILES), FILES)
+
+    assert result['written'] == []
+    assert sorted(result['unchanged']) == sorted(FILES)
+    assert mtimes(tmp_path, keys) == before
+
+
+def test_only_the_changed_target_is_rewritten(tmp_path):
+    generate.generate(tmp_path, list(FILES), FILES)
+    age(tmp_path, FILES)
+    before = mtimes(tmp_path, FILES)
+
+    changed = dict(FILES, **{'routes/auth.js': b'module.exports = { changed: true };\n'})
+    result = generate.generate(tmp_path, list(FILES), changed)
+
+    assert result['written'] == ['routes/auth.js']
+    after = mtimes(tmp_path, FILES)
+    assert after['routes/auth.js'] != before['routes/auth.js']
+    assert after['server.js'] == before['server.js']
+    manifest = json.loads((tmp_path / generate.MANIFEST_FILE).read_text())
+    assert manifest['routes/auth.js'] == generate.sha256(changed['routes/auth.js'])
+
+
+def test_a_file_edited_on_disk_is_restored(tmp_path):
+    generate.generate(tmp_path, list(FILES), FILES)
+    (tmp_path / 'server.js').write_bytes(b'// local edit\n')
+
+    result = generate.generate(tmp_path, list(FILES), FILES)
+
+    assert result['written'] == ['server.js']
+    assert (tmp_path / 'server.js').read_bytes() == FILES['server.js']
+
+
+def test_check_reports_without_writing(tmp_path):
+    generate.generate(tmp_path, ['server.js'], FILES)
+
+    result = generate.generate(tmp_path, list(FILES), FILES, check=True)
+
+    assert sorted(result['written']) == ['package.json', 'routes/auth.js']
+    assert not (tmp_path / 'routes/auth.js').exists()
+    assert list(json.loads((tmp_path / generate.MANIFEST_FILE).read_text())) == ['server.js']
+
+
+def test_a_partial_run_keeps_other_targets_in_the_manifest(tmp_path):
+    generate.generate(tmp_path, list(FILES), FILES)
+
+    generate.generate(tmp_path, ['server.js'], dict(FILES, **{'server.js': b'// new\n'}))
+
+    manifest = json.loads((tmp_path / generate.MANIFEST_FILE).read_text())
+    assert sorted(manifest) == sorted(FILES)
+    assert manifest['server.js'] == generate.sha256(b'// new\n')
+
+
+def test_written_files_get_the_umask_mode_and_no_temp_files(tmp_path):
+    generate.generate(tmp_path, list(FILES), FILES)
+
+    assert stat.S_IMODE((tmp_path / 'server.js').stat().st_mode) == generate.FILE_MODE
+    assert not [path for path in tmp_path.rglob('.*') if path.name != generate.MANIFEST_FILE]
+
+
+def test_only_accepts_project_paths_and_download_names():
+    assert generate.resolve_targets(['routes/auth.js,auth-routes.js', 'Dockerfile-backend']) == [
+        'routes/auth.js', 'Dockerfile'
+    ]
+    with pytest.raises(SystemExit):
+        generate.resolve_targets(['nope.js'])
+
+
+def test_main_rerun_reports_everything_unchanged(tmp_path, capsys):
+    out = tmp_path / 'build'
+    assert generate.main(['--out', str(out), '--no-validate']) == 0
+    capsys.readouterr()
+
+    assert generate.main(['--out', str(out), '--no-validate', '--check']) == 0
+    assert f"0 out of date, {len(generate.MANIFEST)} unchanged" in capsys.readouterr().out
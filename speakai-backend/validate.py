@@ -0,0 +1,200 @@
+"""Static checks for the generated backend files.
+
+Run by generate.py before anything is written, so a broken build fails
+before a container build starts rather than at ``node server.js``. It
+checks:
+
+* JavaScript: syntax, by compiling each file as a CommonJS module in Node
+  (``vm.Script`` over ``Module.wrap``). Nothing is executed. Files are
+  split across ``jobs`` Node processes.
+* JSON: parses.
+* YAML: parses, if PyYAML is installed; otherwise it is reported as
+  skipped.
+* ``require('./...')``: every relative require names another
+  backend_files entry (as given, or with .js, .json or /index.js added).
+
+Syntax and lint results depend only on a file's content, so they are
+cached by content hash; an unchanged file is never checked twice.
+Require resolution depends on the whole file set and is cheap, so it
+always runs.
+"""
+
+import hashlib
+import json
+import posixpath
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Bump when a check changes, to invalidate cached results
+CHECKS_VERSION = '1'
+
+REQUIRE_PATTERN = re.compile(r'''require\(\s*(['"])(\.{1,2}/[^'"]+)\1\s*\)''')
+
+# Reads [[name, source], ...] on stdin; prints [[name, error or null], ...]
+NODE_CHECKER = r'''
+const vm = require('vm');
+const { wrap } = require('module');
+let input = '';
+process.stdin.setEncoding('utf8');
+process.stdin.on('data', chunk => { input += chunk; });
+process.stdin.on('end', () => {
+    const results = JSON.parse(input).map(([name, source]) => {
+        try {
+            new vm.Script(wrap(source), { filename: name });
+            return [name, null];
+        } catch (error) {
+            const where = String(error.stack).split('\n')[0];
+            return [name, `${where}: ${error.message}`];
+        }
+    });
+    process.stdout.write(JSON.stringify(results));
+});
+'''
+
+
+def kind_of(key):
+    if key.endswith('.js'):
+        return 'js'
+    if key.endswith('.json'):
+        return 'json'
+    if key.endswith(('.yml', '.yaml')):
+        return 'yaml'
+    return None
+
+
+def _cache_key(kind, data):
+    return hashlib.sha256(f'{CHECKS_VERSION}:{kind}:'.encode('utf-8') + data).hexdigest()
+
+
+class ResultCache:
+    """Check results (a list of error strings) by content hash."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else None
+        self.hits = 0
+
+    def get(self, key):
+        if not self.directory:
+            return None
+        try:
+            errors = json.loads((self.directory / key).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        self.hits += 1
+        return errors
+
+    def put(self, key, errors):
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / key).write_text(json.dumps(errors), encoding='utf-8')
+
+
+def check_json(data):
+    try:
+        json.loads(data.decode('utf-8'))
+    except ValueError as error:
+        return [f'invalid JSON: {error}']
+    return []
+
+
+def check_yaml(data):
+    try:
+        yaml.safe_load(data.decode('utf-8'))
+    except yaml.YAMLError as error:
+        return [f"invalid YAML: {str(error).replace(chr(10), ' ')}"]
+    return []
+
+
+def check_js(files):
+    """Syntax-check {name: bytes} in one Node process; returns {name: [errors]}."""
+    payload = json.dumps([[name, data.decode('utf-8')] for name, data in files.items()])
+    proc = subprocess.run(
+        ['node', '-e', NODE_CHECKER], input=payload.encode('utf-8'),
+        capture_output=True, timeout=120, check=False
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"node syntax checker failed: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    return {name: [error] if error else [] for name, error in json.loads(proc.stdout)}
+
+
+def resolve_require(key, request, keys):
+    base = posixpath.normpath(posixpath.join(posixpath.dirname(key), request))
+    for candidate in (base, f'{base}.js', f'{base}.json', f'{base}/index.js'):
+        if candidate in keys:
+            return candidate
+    return None
+
+
+def check_requires(key, data, keys):
+    errors = []
+    text = data.decode('utf-8')
+    for match in REQUIRE_PATTERN.finditer(text):
+        if resolve_require(key, match.group(2), keys) is None:
+            line = text.count('\n', 0, match.start()) + 1
+            errors.append(f"line {line}: require('{match.group(2)}') matches no generated file")
+    return errors
+
+
+def validate(files, all_keys=None, jobs=4, cache=None):
+    """Check {key: bytes}; returns ({key: [errors]} for failing keys, notes).
+
+    ``all_keys`` is the set requires may resolve to (default: files' keys).
+    """
+    cache = cache or ResultCache()
+    keys = set(all_keys if all_keys is not None else files)
+    errors = {}
+    notes = []
+    pending = {'js': {}, 'json': {}, 'yaml': {}}
+    cache_keys = {}
+
+    for key, data in files.items():
+        kind = kind_of(key)
+        if kind == 'js':
+            found = check_requires(key, data, keys)
+            if found:
+                errors.setdefault(key, []).extend(found)
+        if kind is None:
+            continue
+        cache_keys[key] = _cache_key(kind, data)
+        cached = cache.get(cache_keys[key])
+        if cached is None:
+            pending[kind][key] = data
+        elif cached:
+            errors.setdefault(key, []).extend(cached)
+
+    if pending['yaml'] and yaml is None:
+        notes.append(f"YAML not checked (PyYAML not installed): {', '.join(sorted(pending['yaml']))}")
+        pending['yaml'] = {}
+    if pending['js'] and shutil.which('node') is None:
+        notes.append(f"JavaScript not checked (node not found): {len(pending['js'])} file(s)")
+        pending['js'] = {}
+
+    checked = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = []
+        js = sorted(pending['js'].items())
+        chunks = max(1, min(jobs, len(js)))
+        for i in range(chunks):
+            chunk = dict(js[i::chunks])
+            if chunk:
+                futures.append(pool.submit(check_js, chunk))
+        for key, data in pending['json'].items():
+            futures.append(pool.submit(lambda key=key, data=data: {key: check_json(data)}))
+        for key, data in pending['yaml'].items():
+            futures.append(pool.submit(lambda key=key, data=data: {key: check_yaml(data)}))
+        for future in futures:
+            checked.update(future.result())
+
+    for key, found in checked.items():
+        cache.put(cache_keys[key], found)
+        if found:
+            errors.setdefault(key, []).extend(found)
+    return errors, notes
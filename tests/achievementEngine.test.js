@@ -0,0 +1,76 @@
+const { AchievementEngine } = require('../services/achievementEngine');
+
+function rule(id, dependsOn, checkCondition = () => true) {
+    return { id, dependsOn, checkCondition };
+}
+
+const rules = [
+    rule('streak', ['streak'], user => user.streak >= 3),
+    rule('easy_level', ['levels.easy.progress'], user => user.levels.easy.progress >= 100),
+    rule('confident_session', ['session.confidenceScore'], (user, session) => session.confidenceScore >= 80)
+];
+
+const user = { streak: 5, levels: { easy: { progress: 100 } } };
+const session = { confidenceScore: 90 };
+
+function ids(found) {
+    return [...found].map(r => r.id).sort();
+}
+
+describe('AchievementEngine', () => {
+    const engine = new AchievementEngine(rules);
+
+    test('requires every rule to declare dependsOn', () => {
+        expect(() => new AchievementEngine([rule('bad', [])])).toThrow('must declare');
+    });
+
+    test('a changed path selects only the rules that read it', () => {
+        expect(ids(engine.candidates(['streak'], new Set()))).toEqual(['streak']);
+        expect(ids(engine.candidates(['totalSessions'], new Set()))).toEqual([]);
+    });
+
+    test('a changed parent path reaches rules on its leaves', () => {
+        expect(ids(engine.candidates(['levels'], new Set()))).toEqual(['easy_level']);
+        expect(ids(engine.candidates(['levels.easy'], new Set()))).toEqual(['easy_level']);
+        expect(ids(engine.candidates(['levels.medium'], new Set()))).toEqual([]);
+    });
+
+    test('null changedPaths selects every locked rule', () => {
+        expect(ids(engine.candidates(null, new Set(['streak'])))).toEqual(['confident_session', 'easy_level']);
+    });
+
+    test('unlocked rules are never candidates', () => {
+        expect(ids(engine.candidates(['streak', 'session'], new Set(['streak'])))).toEqual(['confident_session']);
+    });
+
+    test('userFields lists the user roots, not session fields', () => {
+        expect(engine.userFields().sort()).toEqual(['levels', 'streak']);
+    });
+
+    test('evaluate returns the candidates whose condition holds', () => {
+        const found = engine.evaluate({ user: { ...user, streak: 1 }, session, changedPaths: ['streak', 'session'], unlockedIds: new Set() });
+
+        expect(ids(found)).toEqual(['confident_session']);
+    });
+
+    test('evaluate skips rules that read the session when there is none', () => {
+        const found = engine.evaluate({ user, session: null, changedPaths: null, unlockedIds: new Set() });
+
+        expect(ids(found)).toEqual(['easy_level', 'streak']);
+    });
+
+    test('a rule that throws counts as unmet and is reported', () => {
+        const errors = [];
+        const broken = new AchievementEngine([rule('broken', ['streak'], () => { throw new Error('boom'); })]);
+
+        const found = broken.evaluate({
+            user,
+            changedPaths: ['streak'],
+            unlockedIds: new Set(),
+            onError: (failed, error) => errors.push([failed.id, error.message])
+        });
+
+        expect(found).toEqual([]);
+        expect(errors).toEqual([['broken', 'boom']]);
+    });
+});
@@ -0,0 +1,132 @@
+const { CircuitBreaker, ClientBusyError, Semaphore } = require('../services/mlClient');
+
+describe('CircuitBreaker', () => {
+    let now;
+
+    beforeEach(() => {
+        now = 1000000;
+        jest.spyOn(Date, 'now').mockImplementation(() => now);
+    });
+
+    afterEach(() => {
+        jest.restoreAllMocks();
+    });
+
+    test('opens after failureThreshold consecutive failures', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 3, resetMs: 1000 });
+
+        breaker.failure();
+        breaker.failure();
+        expect(breaker.state).toBe('closed');
+        expect(breaker.allow()).toBe(true);
+
+        breaker.failure();
+        expect(breaker.state).toBe('open');
+        expect(breaker.allow()).toBe(false);
+        expect(breaker.getStats()).toMatchObject({ state: 'open', consecutiveFailures: 3, trips: 1 });
+    });
+
+    test('a success resets the failure count', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 2, resetMs: 1000 });
+
+        breaker.failure();
+        breaker.success();
+        breaker.failure();
+        expect(breaker.state).toBe('closed');
+    });
+
+    test('lets a single probe through once resetMs has passed', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 1, resetMs: 1000 });
+        breaker.failure();
+
+        now += 999;
+        expect(breaker.allow()).toBe(false);
+
+        now += 1;
+        expect(breaker.allow()).toBe(true);
+        expect(breaker.state).toBe('half-open');
+        expect(breaker.allow()).toBe(false);
+    });
+
+    test('a successful probe closes the circuit', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 1, resetMs: 1000 });
+        breaker.failure();
+        now += 1000;
+        breaker.allow();
+
+        breaker.success();
+        expect(breaker.state).toBe('closed');
+        expect(breaker.allow()).toBe(true);
+    });
+
+    test('a failed probe re-opens the circuit for another resetMs', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 5, resetMs: 1000 });
+        for (let i = 0; i < 5; i++) breaker.failure();
+        now += 1000;
+        breaker.allow();
+
+        breaker.failure();
+        expect(breaker.state).toBe('open');
+        expect(breaker.getStats().trips).toBe(2);
+        now += 999;
+        expect(breaker.allow()).toBe(false);
+    });
+
+    test('an abandoned probe frees the slot for another', () => {
+        const breaker = new CircuitBreaker({ failureThreshold: 1, resetMs: 1000 });
+        breaker.failure();
+        now += 1000;
+        expect(breaker.allow()).toBe(true);
+
+        breaker.abandon();
+        expect(breaker.allow()).toBe(true);
+    });
+});
+
+describe('Semaphore', () => {
+    test('grants up to max slots at once', async () => {
+        const slots = new Semaphore(2, { maxWaiting: 10, waitTimeoutMs: 1000 });
+
+        await slots.acquire();
+        await slots.acquire();
+        expect(slots.active).toBe(2);
+        expect(slots.waiting).toHaveLength(0);
+    });
+
+    test('hands a released slot to the oldest waiter', async () => {
+        const slots = new Semaphore(1, { maxWaiting: 10, waitTimeoutMs: 1000 });
+        const release = await slots.acquire();
+
+        const order = [];
+        const first = slots.acquire().then(next => { order.push('first'); return next; });
+        const second = slots.acquire().then(next => { order.push('second'); return next; });
+        expect(slots.waiting).toHaveLength(2);
+
+        release();
+        (await first)();
+        (await second)();
+        expect(order).toEqual(['first', 'second']);
+        expect(slots.active).toBe(0);
+    });
+
+    test('rejects a waiter after waitTimeoutMs', async () => {
+        const slots = new Semaphore(1, { maxWaiting: 10, waitTimeoutMs: 20 });
+        await slots.acquire();
+
+        await expect(slots.acquire()).rejects.toThrow(ClientBusyError);
+        expect(slots.waiting).toHaveLength(0);
+        expect(slots.active).toBe(1);
+    });
+
+    test('rejects immediately once maxWaiting callers are queued', async () => {
+        const slots = new Semaphore(1, { maxWaiting: 1, waitTimeoutMs: 1000 });
+        const release = await slots.acquire();
+        const queued = slots.acquire();
+
+        await expect(slots.acquire()).rejects.toMatchObject({ code: 'ML_CLIENT_BUSY' });
+
+        release();
+        (await queued)();
+        expect(slots.active).toBe(0);
+    });
+});
@@ -0,0 +1,76 @@
+const { MemoryBucketStore } = require('../services/rateLimitStore');
+
+const policy = { capacity: 10, refillMs: 1000, cost: 1 };
+
+describe('MemoryBucketStore', () => {
+    let now;
+    let store;
+
+    beforeEach(() => {
+        now = 1000000;
+        jest.spyOn(Date, 'now').mockImplementation(() => now);
+        store = new MemoryBucketStore();
+    });
+
+    afterEach(() => {
+        jest.restoreAllMocks();
+    });
+
+    test('a new bucket starts full', async () => {
+        expect(await store.take('a', policy)).toEqual({ allowed: true, tokens: 9 });
+    });
+
+    test('refuses once the bucket is empty, without going negative', () => {
+        for (let i = 0; i < 10; i++) {
+            expect(store.takeSync('a', policy).allowed).toBe(true);
+        }
+
+        expect(store.takeSync('a', policy)).toEqual({ allowed: false, tokens: 0 });
+        expect(store.takeSync('a', policy)).toEqual({ allowed: false, tokens: 0 });
+    });
+
+    test('refills in proportion to the time elapsed', () => {
+        for (let i = 0; i < 10; i++) store.takeSync('a', policy);
+
+        now += 250;
+        expect(store.takeSync('a', policy)).toEqual({ allowed: true, tokens: 1.5 });
+    });
+
+    test('never refills past capacity', () => {
+        store.takeSync('a', policy);
+
+        now += 60 * 1000;
+        expect(store.takeSync('a', policy)).toEqual({ allowed: true, tokens: 9 });
+    });
+
+    test('a take costing more than the tokens left is refused whole', () => {
+        expect(store.takeSync('a', { ...policy, cost: 8 }).tokens).toBe(2);
+
+        expect(store.takeSync('a', { ...policy, cost: 3 })).toEqual({ allowed: false, tokens: 2 });
+        expect(store.takeSync('a', { ...policy, cost: 2 })).toEqual({ allowed: true, tokens: 0 });
+    });
+
+    test('keeps a separate bucket per key', () => {
+        for (let i = 0; i < 10; i++) store.takeSync('a', policy);
+
+        expect(store.takeSync('a', policy).allowed).toBe(false);
+        expect(store.takeSync('b', policy).allowed).toBe(true);
+    });
+
+    test('sweep drops only buckets that have refilled', () => {
+        store.takeSync('a', policy);
+        for (let i = 0; i < 10; i++) store.takeSync('b', policy);
+
+        now += 50;
+        store.sweep();
+        expect(store.size).toBe(2);
+
+        now += 50;
+        store.sweep();
+        expect(store.size).toBe(1);
+
+        now += 900;
+        store.sweep();
+        expect(store.size).toBe(0);
+    });
+});
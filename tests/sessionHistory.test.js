@@ -0,0 +1,72 @@
+const mongoose = require('mongoose');
+const Session = require('../models/Session');
+
+const userId = new mongoose.Types.ObjectId();
+
+function completed(minutesAgo) {
+    return {
+        _id: new mongoose.Types.ObjectId(),
+        completedAt: new Date(Date.UTC(2024, 0, 1) - minutesAgo * 60 * 1000)
+    };
+}
+
+// Stands in for the find().select().sort().limit().lean() chain
+function mockFind(results) {
+    const calls = [];
+    jest.spyOn(Session, 'find').mockImplementation((filter) => {
+        const call = { filter };
+        calls.push(call);
+        const chain = {
+            select: (projection) => { call.projection = projection; return chain; },
+            sort: (sort) => { call.sort = sort; return chain; },
+            limit: (limit) => { call.limit = limit; return chain; },
+            lean: async () => results.shift()
+        };
+        return chain;
+    });
+    return calls;
+}
+
+describe('history cursors', () => {
+    afterEach(() => {
+        jest.restoreAllMocks();
+    });
+
+    test('decode returns the completedAt and _id a cursor was built from', () => {
+        const session = completed(5);
+
+        const decoded = Session.decodeHistoryCursor(Session.encodeHistoryCursor(session));
+
+        expect(decoded.completedAt.getTime()).toBe(session.completedAt.getTime());
+        expect(String(decoded._id)).toBe(String(session._id));
+    });
+
+    test('cursors are URL-safe', () => {
+        expect(Session.encodeHistoryCursor(completed(5))).toMatch(/^[A-Za-z0-9_-]+$/);
+    });
+
+    test.each([
+        ['not base64 JSON', 'not-a-cursor'],
+        ['a non-numeric time', Buffer.from(JSON.stringify(['yesterday', String(new mongoose.Types.ObjectId())])).toString('base64url')],
+        ['an invalid id', Buffer.from(JSON.stringify([Date.now(), 'nope'])).toString('base64url')]
+    ])('rejects a cursor with %s', (_, cursor) => {
+        expect(() => Session.decodeHistoryCursor(cursor)).toThrow('Invalid history cursor');
+    });
+
+    test('nextCursor from one page starts the next page after its last session', async () => {
+        const sessions = [completed(1), completed(2), completed(3)];
+        const calls = mockFind([sessions.slice(), sessions.slice(2)]);
+
+        const first = await Session.getHistoryPage(userId, { limit: 2 });
+        expect(first.sessions).toHaveLength(2);
+        expect(calls[0].limit).toBe(3);
+        expect(first.nextCursor).not.toBeNull();
+
+        const second = await Session.getHistoryPage(userId, { limit: 2, cursor: first.nextCursor });
+        const [before, tie] = calls[1].filter.$or;
+        expect(before.completedAt.$lt.getTime()).toBe(sessions[1].completedAt.getTime());
+        expect(tie.completedAt.getTime()).toBe(sessions[1].completedAt.getTime());
+        expect(String(tie._id.$lt)).toBe(String(sessions[1]._id));
+        expect(second.nextCursor).toBeNull();
+    });
+});
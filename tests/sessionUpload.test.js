@@ -0,0 +1,98 @@
+const Session = require('../models/Session');
+const sessionService = require('../services/sessionService');
+
+// routes/sessions destructures these when it loads, so spy on them first
+const completeSessionAnalysis = jest.spyOn(sessionService, 'completeSessionAnalysis');
+const completeWithBasicMetrics = jest.spyOn(sessionService, 'completeWithBasicMetrics');
+jest.spyOn(sessionService, 'formatAnalyzedSession').mockImplementation(session => ({ session: { id: session._id } }));
+const router = require('../routes/sessions');
+
+function routeHandlers(path, method) {
+    const layer = router.stack.find(l => l.route && l.route.path === path && l.route.methods[method]);
+    return layer.route.stack.map(l => l.handle);
+}
+
+// [auth, loadUploadSession, multer, handler]
+const [, loadUploadSession, , uploadHandler] = routeHandlers('/:sessionId/upload', 'post');
+
+function response() {
+    const res = { statusCode: 200 };
+    res.status = jest.fn(code => {
+        res.statusCode = code;
+        return res;
+    });
+    res.json = jest.fn(body => {
+        res.body = body;
+        return res;
+    });
+    return res;
+}
+
+function uploadRequest() {
+    return {
+        params: { sessionId: 'session-1' },
+        userId: 'user-1',
+        query: { async: 'false' },
+        body: { duration: '30' },
+        file: { size: 1024 },
+        get: () => undefined
+    };
+}
+
+// Loads the session through the route's own middleware, then runs the handler
+async function upload() {
+    const req = uploadRequest();
+    const res = response();
+    let loaded = false;
+
+    await loadUploadSession(req, res, () => {
+        loaded = true;
+    });
+    if (loaded) await uploadHandler(req, res);
+    return res;
+}
+
+describe('POST /:sessionId/upload, synchronous analysis', () => {
+    let stored;
+
+    beforeEach(() => {
+        stored = { _id: 'session-1', userId: 'user-1', status: 'started', save: jest.fn(async () => {}) };
+        jest.spyOn(Session, 'findOne').mockImplementation(async filter =>
+            filter.status.$in.includes(stored.status) ? stored : null);
+        jest.spyOn(Session, 'updateOne').mockImplementation(async (filter, update) => {
+            Object.assign(stored, update);
+            return { modifiedCount: 1 };
+        });
+    });
+
+    afterEach(() => {
+        completeSessionAnalysis.mockReset();
+        completeWithBasicMetrics.mockReset();
+        Session.findOne.mockRestore();
+        Session.updateOne.mockRestore();
+    });
+
+    test('a failed fallback marks the session failed instead of leaving it analyzing', async () => {
+        completeSessionAnalysis.mockRejectedValue(new Error('ML service unavailable'));
+        completeWithBasicMetrics.mockRejectedValue(new Error('database unavailable'));
+
+        const res = await upload();
+
+        expect(res.statusCode).toBe(500);
+        expect(stored.status).toBe('failed');
+    });
+
+    test('the session takes a new upload after a synchronous failure', async () => {
+        completeSessionAnalysis.mockRejectedValue(new Error('ML service unavailable'));
+        completeWithBasicMetrics.mockRejectedValue(new Error('database unavailable'));
+        await upload();
+
+        completeSessionAnalysis.mockReset();
+        completeSessionAnalysis.mockResolvedValue({ user: {}, newAchievements: [] });
+        const res = await upload();
+
+        expect(res.statusCode).toBe(200);
+        expect(res.body).toMatchObject({ success: true, session: { id: 'session-1' } });
+        expect(completeSessionAnalysis).toHaveBeenCalledTimes(1);
+    });
+});
@@ -0,0 +1,118 @@
+const { TtlCache } = require('../utils/ttlCache');
+
+function deferred() {
+    let resolve;
+    let reject;
+    const promise = new Promise((res, rej) => {
+        resolve = res;
+        reject = rej;
+    });
+    return { promise, resolve, reject };
+}
+
+describe('TtlCache', () => {
+    let now;
+
+    beforeEach(() => {
+        now = 1000000;
+        jest.spyOn(Date, 'now').mockImplementation(() => now);
+    });
+
+    afterEach(() => {
+        jest.restoreAllMocks();
+    });
+
+    test('entries expire ttlMs after being set', () => {
+        const cache = new TtlCache({ ttlMs: 1000 });
+        cache.set('a', 1);
+
+        now += 999;
+        expect(cache.get('a')).toBe(1);
+        now += 1;
+        expect(cache.get('a')).toBeUndefined();
+        expect(cache.size).toBe(0);
+    });
+
+    test('evicts the least recently used entry past maxEntries', () => {
+        const cache = new TtlCache({ maxEntries: 2 });
+        cache.set('a', 1);
+        cache.set('b', 2);
+        cache.get('a');
+        cache.set('c', 3);
+
+        expect(cache.get('b')).toBeUndefined();
+        expect(cache.get('a')).toBe(1);
+        expect(cache.getStats().evictions).toBe(1);
+    });
+
+    describe('getOrLoad', () => {
+        test('loads once and serves the cached value after', async () => {
+            const cache = new TtlCache();
+            const load = jest.fn(async () => 'value');
+
+            expect(await cache.getOrLoad('a', load)).toBe('value');
+            expect(await cache.getOrLoad('a', load)).toBe('value');
+            expect(load).toHaveBeenCalledTimes(1);
+        });
+
+        test('does not cache null or undefined', async () => {
+            const cache = new TtlCache();
+
+            expect(await cache.getOrLoad('a', async () => null)).toBeNull();
+            expect(cache.size).toBe(0);
+        });
+
+        test('a delete during the load keeps its stale result out of the cache', async () => {
+            const cache = new TtlCache();
+            const pending = deferred();
+
+            const loading = cache.getOrLoad('a', () => pending.promise);
+            cache.delete('a');
+            pending.resolve('outdated');
+
+            expect(await loading).toBe('outdated');
+            expect(cache.get('a')).toBeUndefined();
+        });
+
+        test('a clear during the load keeps its stale result out of the cache', async () => {
+            const cache = new TtlCache();
+            const pending = deferred();
+
+            const loading = cache.getOrLoad('a', () => pending.promise);
+            cache.clear();
+            pending.resolve('outdated');
+
+            await loading;
+            expect(cache.get('a')).toBeUndefined();
+        });
+
+        test('a failed load caches nothing and the next call loads again', async () => {
+            const cache = new TtlCache();
+
+            await expect(cache.getOrLoad('a', async () => {
+                throw new Error('database unavailable');
+            })).rejects.toThrow('database unavailable');
+            expect(cache.size).toBe(0);
+            expect(cache.loading.size).toBe(0);
+
+            expect(await cache.getOrLoad('a', async () => 'fresh')).toBe('fresh');
+            expect(cache.get('a')).toBe('fresh');
+        });
+
+        test('a delete after an earlier load finished still catches the newer one in flight', async () => {
+            const cache = new TtlCache();
+            const first = deferred();
+            const second = deferred();
+
+            const older = cache.getOrLoad('a', () => first.promise);
+            const newer = cache.getOrLoad('a', () => second.promise);
+            first.resolve('old');
+            await older;
+            cache.delete('a');
+            second.resolve('new');
+
+            await newer;
+            expect(cache.get('a')).toBeUndefined();
+        });
+    });
+});
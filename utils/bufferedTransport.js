@@ -0,0 +1,134 @@
+const path = require('path');
+const { Worker } = require('worker_threads');
+const winston = require('winston');
+
+const MESSAGE = Symbol.for('message');
+// Batches posted to the writer and not yet written; past this, records
+// wait in the ring (and eventually drop) instead of queueing in the worker.
+const MAX_IN_FLIGHT = 2;
+
+// Winston transport for LOG_MODE=buffered. log() only stores the record in
+// a fixed-size ring; a timer formats whole batches as JSON and hands them to
+// a worker thread (utils/logWriter.js) that does the file I/O. When the ring
+// is full new records are dropped and counted rather than blocking the
+// caller - except errors, which evict the oldest record instead.
+class BufferedTransport extends winston.Transport {
+    constructor({ dirname, capacity, batchSize, flushIntervalMs, maxsize, maxFiles, ...options }) {
+        super(options);
+        this.capacity = capacity;
+        this.batchSize = batchSize;
+        this.ring = new Array(capacity);
+        this.head = 0;
+        this.length = 0;
+        this.inFlight = new Map();
+        this.nextBatchId = 1;
+        this.flushScheduled = false;
+        this.drainWaiters = [];
+        this.json = winston.format.json();
+        this.stats = { written: 0, dropped: 0, batches: 0, writeErrors: 0 };
+
+        this.worker = new Worker(path.join(__dirname, 'logWriter.js'), {
+            workerData: { dirname, maxsize, maxFiles }
+        });
+        this.worker.unref();
+        this.worker.on('message', message => this.onWritten(message));
+        this.worker.on('error', (error) => {
+            // Can't log through winston from its own transport
+            process.stderr.write(`Log writer failed: ${error.stack}\n`);
+        });
+
+        setInterval(() => this.flush(), flushIntervalMs).unref();
+    }
+
+    log(info, callback) {
+        if (this.length === this.capacity) {
+            this.stats.dropped += 1;
+            if (info.level !== 'error') return callback();
+            this.ring[this.head] = undefined;
+            this.head = (this.head + 1) % this.capacity;
+            this.length -= 1;
+        }
+
+        this.ring[(this.head + this.length) % this.capacity] = info;
+        this.length += 1;
+
+        if (this.length >= this.batchSize && !this.flushScheduled) {
+            this.flushScheduled = true;
+            setImmediate(() => {
+                this.flushScheduled = false;
+                this.flush();
+            });
+        }
+        callback();
+    }
+
+    flush() {
+        if (this.length === 0 || this.inFlight.size >= MAX_IN_FLIGHT) return;
+
+        const count = Math.min(this.length, this.batchSize);
+        let combinedText = '';
+        let errorText = '';
+
+        for (let i = 0; i < count; i++) {
+            const info = this.ring[this.head];
+            this.ring[this.head] = undefined;
+            this.head = (this.head + 1) % this.capacity;
+
+            const line = `${this.json.transform(info)[MESSAGE]}\n`;
+            combinedText += line;
+            if (info.level === 'error') errorText += line;
+        }
+        this.length -= count;
+
+        const id = this.nextBatchId++;
+        this.inFlight.set(id, count);
+        this.worker.postMessage({ id, combinedText, errorText });
+    }
+
+    onWritten({ id, error }) {
+        const count = this.inFlight.get(id) || 0;
+        this.inFlight.delete(id);
+        this.stats.batches += 1;
+
+        if (error) {
+            this.stats.writeErrors += 1;
+            this.stats.dropped += count;
+            process.stderr.write(`Log write failed: ${error}\n`);
+        } else {
+            this.stats.written += count;
+        }
+
+        if (this.length > 0) {
+            this.flush();
+        } else if (this.inFlight.size === 0) {
+            this.drainWaiters.splice(0).forEach(resolve => resolve());
+        }
+    }
+
+    // Resolves once everything logged so far is on disk, e.g. before exit.
+    drain() {
+        if (this.length === 0 && this.inFlight.size === 0) return Promise.resolve();
+        // The worker is unref'd; keep the process alive until it answers
+        this.worker.ref();
+        return new Promise((resolve) => {
+            this.drainWaiters.push(() => {
+                this.worker.unref();
+                resolve();
+            });
+            this.flush();
+        });
+    }
+
+    getStats() {
+        return {
+            buffered: this.length,
+            capacity: this.capacity,
+            inFlight: this.inFlight.size,
+            ...this.stats
+        };
+    }
+}
+
+module.exports = {
+    BufferedTransport
+};
@@ -0,0 +1,96 @@
+const cluster = require('cluster');
+const EventEmitter = require('events');
+
+// IPC between cluster workers, relayed by the primary (see cluster.js).
+// publish() fans a message out to every other worker; request() asks the
+// primary, which owns state shared by all workers (e.g. rate-limit
+// counters). Outside cluster mode publish() is a no-op and there are no
+// other processes to tell.
+const REQUEST_TIMEOUT_MS = parseInt(process.env.CLUSTER_IPC_TIMEOUT_MS) || 1000;
+
+const channels = new EventEmitter();
+channels.setMaxListeners(0);
+
+const isWorker = cluster.isWorker && typeof process.send === 'function';
+const pending = new Map();
+let nextId = 1;
+
+if (isWorker) {
+    process.on('message', (message) => {
+        if (!message || !message.speakaiBus) return;
+
+        if (message.speakaiBus === 'publish') {
+            channels.emit(message.channel, message.payload);
+        } else if (message.speakaiBus === 'response') {
+            const waiter = pending.get(message.id);
+            if (!waiter) return;
+            pending.delete(message.id);
+            clearTimeout(waiter.timer);
+            if (message.error) {
+                waiter.reject(new Error(message.error));
+            } else {
+                waiter.resolve(message.result);
+            }
+        }
+    });
+}
+
+function publish(channel, payload) {
+    if (!isWorker || !process.connected) return;
+    process.send({ speakaiBus: 'publish', channel, payload });
+}
+
+function subscribe(channel, handler) {
+    channels.on(channel, handler);
+    return () => channels.removeListener(channel, handler);
+}
+
+function request(op, payload) {
+    if (!isWorker || !process.connected) {
+        return Promise.reject(new Error('Not connected to a cluster primary'));
+    }
+
+    return new Promise((resolve, reject) => {
+        const id = nextId++;
+        const timer = setTimeout(() => {
+            pending.delete(id);
+            reject(new Error(`Cluster request ${op} timed out`));
+        }, REQUEST_TIMEOUT_MS);
+        pending.set(id, { resolve, reject, timer });
+        process.send({ speakaiBus: 'request', id, op, payload });
+    });
+}
+
+// Primary side: relays publishes and answers requests with `handlers`,
+// a map of op name -> function(payload) returning the result.
+function attachPrimary(handlers) {
+    cluster.on('message', (worker, message) => {
+        if (!message || !message.speakaiBus) return;
+
+        if (message.speakaiBus === 'publish') {
+            for (const other of Object.values(cluster.workers)) {
+                if (other && other !== worker && other.isConnected()) {
+                    other.send(message);
+                }
+            }
+        } else if (message.speakaiBus === 'request') {
+            const handler = handlers[message.op];
+            const reply = { speakaiBus: 'response', id: message.id };
+            try {
+                if (!handler) throw new Error(`Unknown cluster request: ${message.op}`);
+                reply.result = handler(message.payload);
+            } catch (error) {
+                reply.error = error.message;
+            }
+            if (worker.isConnected()) worker.send(reply);
+        }
+    });
+}
+
+module.exports = {
+    isWorker,
+    publish,
+    subscribe,
+    request,
+    attachPrimary
+};
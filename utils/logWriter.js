@@ -0,0 +1,56 @@
+const fs = require('fs');
+const path = require('path');
+const { parentPort, workerData } = require('worker_threads');
+
+// Worker thread behind utils/bufferedTransport.js: appends batches of
+// already-formatted lines to the log files. Files are rotated by size like
+// winston's tailable File transport: combined.log is always the current
+// file, combined1.log the one before it, and so on up to maxFiles.
+class RotatingFile {
+    constructor(filename, maxsize, maxFiles) {
+        this.filename = filename;
+        this.maxsize = maxsize;
+        this.maxFiles = maxFiles;
+        this.open();
+    }
+
+    open() {
+        this.fd = fs.openSync(this.filename, 'a');
+        this.size = fs.fstatSync(this.fd).size;
+    }
+
+    rotatedName(index) {
+        const ext = path.extname(this.filename);
+        return index === 0 ? this.filename : `${this.filename.slice(0, -ext.length || undefined)}${index}${ext}`;
+    }
+
+    rotate() {
+        fs.closeSync(this.fd);
+        for (let index = this.maxFiles - 1; index > 0; index--) {
+            const from = this.rotatedName(index - 1);
+            if (fs.existsSync(from)) fs.renameSync(from, this.rotatedName(index));
+        }
+        this.open();
+    }
+
+    write(text) {
+        const bytes = Buffer.byteLength(text);
+        if (this.size > 0 && this.size + bytes > this.maxsize) this.rotate();
+        fs.writeSync(this.fd, text);
+        this.size += bytes;
+    }
+}
+
+const { dirname, maxsize, maxFiles } = workerData;
+const combined = new RotatingFile(path.join(dirname, 'combined.log'), maxsize, maxFiles);
+const errors = new RotatingFile(path.join(dirname, 'error.log'), maxsize, maxFiles);
+
+parentPort.on('message', ({ id, combinedText, errorText }) => {
+    try {
+        if (combinedText) combined.write(combinedText);
+        if (errorText) errors.write(errorText);
+        parentPort.postMessage({ id });
+    } catch (error) {
+        parentPort.postMessage({ id, error: error.message });
+    }
+});
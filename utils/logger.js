@@ -1,5 +1,6 @@
 const winston = require('winston');
 const path = require('path');
+const { BufferedTransport } = require('./bufferedTransport');
 
 const fs = require('fs');
 const logDir = 'logs';
@@ -7,9 +8,13 @@ if (!fs.existsSync(logDir)) {
     fs.mkdirSync(logDir);
 }
 
-const logFormat = winston.format.combine(
+const baseFormat = winston.format.combine(
     winston.format.timestamp({ format: 'YYYY-MM-DD HH:mm:ss' }),
-    winston.format.errors({ stack: true }),
+    winston.format.errors({ stack: true })
+);
+
+const logFormat = winston.format.combine(
+    baseFormat,
     winston.format.json()
 );
 
@@ -21,25 +26,43 @@ const consoleFormat = winston.format.combine(
     })
 );
 
+// LOG_MODE=buffered moves log file I/O and JSON formatting off the calling
+// code path (see utils/bufferedTransport.js); the default writes through
+// winston's File transports as each line is logged.
+const LOG_MODE = process.env.LOG_MODE || 'sync';
+let bufferedTransport = null;
+
 const logger = winston.createLogger({
     level: process.env.LOG_LEVEL || 'info',
-    format: logFormat,
+    format: LOG_MODE === 'buffered' ? baseFormat : logFormat,
     defaultMeta: { service: 'speakai-backend' },
-    transports: [
-        new winston.transports.File({
-            filename: path.join(logDir, 'error.log'),
-            level: 'error',
-            maxsize: 5242880,
-            maxFiles: 5
-        }),
-        new winston.transports.File({
-            filename: path.join(logDir, 'combined.log'),
-            maxsize: 5242880,
-            maxFiles: 5
-        })
-    ]
+    transports: []
 });
 
+if (LOG_MODE === 'buffered') {
+    bufferedTransport = new BufferedTransport({
+        dirname: logDir,
+        capacity: parseInt(process.env.LOG_BUFFER_CAPACITY) || 10000,
+        batchSize: parseInt(process.env.LOG_BATCH_SIZE) || 500,
+        flushIntervalMs: parseInt(process.env.LOG_FLUSH_INTERVAL_MS) || 250,
+        maxsize: 5242880,
+        maxFiles: 5
+    });
+    logger.add(bufferedTransport);
+} else {
+    logger.add(new winston.transports.File({
+        filename: path.join(logDir, 'error.log'),
+        level: 'error',
+        maxsize: 5242880,
+        maxFiles: 5
+    }));
+    logger.add(new winston.transports.File({
+        filename: path.join(logDir, 'combined.log'),
+        maxsize: 5242880,
+        maxFiles: 5
+    }));
+}
+
 if (process.env.NODE_ENV !== 'production') {
     logger.add(new winston.transports.Console({
         format: consoleFormat
@@ -52,4 +75,12 @@ logger.stream = {
     }
 };
 
+// Waits for buffered records to reach the log files; call before exiting.
+logger.flush = () => (bufferedTransport ? bufferedTransport.drain() : Promise.resolve());
+
+logger.getStats = () => ({
+    mode: LOG_MODE,
+    ...(bufferedTransport && bufferedTransport.getStats())
+});
+
 module.exports = logger;
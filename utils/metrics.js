@@ -0,0 +1,222 @@
+const { monitorEventLoopDelay } = require('perf_hooks');
+
+// Minimal Prometheus registry rendered in the text exposition format by
+// GET /metrics. Counters, gauges and histograms are kept per label set;
+// values are per process (in cluster mode, per worker).
+const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+const registry = new Map();
+
+function escapeLabel(value) {
+    return String(value).replace(/\\/g, '\\\\').replace(/\n/g, '\\n').replace(/"/g, '\\"');
+}
+
+function formatLabels(labelNames, values, extra = '') {
+    const parts = labelNames.map((name, i) => `${name}="${escapeLabel(values[i])}"`);
+    if (extra) parts.push(extra);
+    return parts.length > 0 ? `{${parts.join(',')}}` : '';
+}
+
+class Metric {
+    constructor(type, { name, help, labelNames = [] }) {
+        if (registry.has(name)) throw new Error(`Metric ${name} is already registered`);
+        this.type = type;
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.series = new Map();
+        registry.set(name, this);
+    }
+
+    // Label values in labelNames order, plus the series key
+    resolve(labels = {}) {
+        const values = this.labelNames.map(name => (labels[name] === undefined ? '' : labels[name]));
+        return { key: values.join('\u0000'), values };
+    }
+
+    header() {
+        return `# HELP ${this.name} ${this.help}\n# TYPE ${this.name} ${this.type}\n`;
+    }
+}
+
+// `collect`, if given, is called before rendering to copy in running
+// totals kept elsewhere; it should only ever `set` a series higher.
+class Counter extends Metric {
+    constructor({ collect, ...options }) {
+        super('counter', options);
+        this.collect = collect;
+    }
+
+    set(labels, value) {
+        const { key, values } = this.resolve(labels);
+        this.series.set(key, { values, value });
+    }
+
+    inc(labels, value = 1) {
+        const { key, values } = this.resolve(labels);
+        const series = this.series.get(key);
+        if (series) {
+            series.value += value;
+        } else {
+            this.series.set(key, { values, value });
+        }
+    }
+
+    render() {
+        if (this.collect) this.collect(this);
+        let text = this.header();
+        for (const { values, value } of this.series.values()) {
+            text += `${this.name}${formatLabels(this.labelNames, values)} ${value}\n`;
+        }
+        return text;
+    }
+}
+
+// `collect`, if given, is called before rendering to set current values.
+class Gauge extends Metric {
+    constructor({ collect, ...options }) {
+        super('gauge', options);
+        this.collect = collect;
+    }
+
+    set(labels, value) {
+        const { key, values } = this.resolve(labels);
+        this.series.set(key, { values, value });
+    }
+
+    inc(labels, value = 1) {
+        const { key, values } = this.resolve(labels);
+        const series = this.series.get(key);
+        if (series) {
+            series.value += value;
+        } else {
+            this.series.set(key, { values, value });
+        }
+    }
+
+    dec(labels, value = 1) {
+        this.inc(labels, -value);
+    }
+
+    render() {
+        if (this.collect) this.collect(this);
+        let text = this.header();
+        for (const { values, value } of this.series.values()) {
+            text += `${this.name}${formatLabels(this.labelNames, values)} ${value}\n`;
+        }
+        return text;
+    }
+}
+
+class Histogram extends Metric {
+    constructor({ buckets = DEFAULT_BUCKETS, ...options }) {
+        super('histogram', options);
+        this.buckets = buckets;
+    }
+
+    observe(labels, seconds) {
+        const { key, values } = this.resolve(labels);
+        let series = this.series.get(key);
+        if (!series) {
+            series = { values, counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 };
+            this.series.set(key, series);
+        }
+        for (let i = 0; i < this.buckets.length; i++) {
+            if (seconds <= this.buckets[i]) {
+                series.counts[i] += 1;
+                break;
+            }
+        }
+        series.sum += seconds;
+        series.count += 1;
+    }
+
+    // Returns a function that observes the seconds elapsed since this call,
+    // with `labels` merged over the ones given here.
+    startTimer(labels = {}) {
+        const start = process.hrtime.bigint();
+        return (moreLabels = {}) => {
+            this.observe({ ...labels, ...moreLabels }, Number(process.hrtime.bigint() - start) / 1e9);
+        };
+    }
+
+    render() {
+        let text = this.header();
+        for (const { values, counts, sum, count } of this.series.values()) {
+            let cumulative = 0;
+            for (let i = 0; i < this.buckets.length; i++) {
+                cumulative += counts[i];
+                text += `${this.name}_bucket${formatLabels(this.labelNames, values, `le="${this.buckets[i]}"`)} ${cumulative}\n`;
+            }
+            text += `${this.name}_bucket${formatLabels(this.labelNames, values, 'le="+Inf"')} ${count}\n`;
+            text += `${this.name}_sum${formatLabels(this.labelNames, values)} ${sum}\n`;
+            text += `${this.name}_count${formatLabels(this.labelNames, values)} ${count}\n`;
+        }
+        return text;
+    }
+}
+
+function counter(options) {
+    return new Counter(options);
+}
+
+function gauge(options) {
+    return new Gauge(options);
+}
+
+function histogram(options) {
+    return new Histogram(options);
+}
+
+// Process metrics: event-loop lag and memory. The delay histogram times a
+// 20 ms libuv timer, so the resolution is subtracted to leave the lag; it
+// is reset on each scrape.
+const LOOP_RESOLUTION_MS = 20;
+const loopDelay = monitorEventLoopDelay({ resolution: LOOP_RESOLUTION_MS });
+loopDelay.enable();
+
+function lagSeconds(nanoseconds) {
+    return Math.max(0, nanoseconds / 1e6 - LOOP_RESOLUTION_MS) / 1000;
+}
+
+gauge({
+    name: 'nodejs_eventloop_lag_seconds',
+    help: 'Event loop delay since the previous scrape',
+    labelNames: ['quantile'],
+    collect(metric) {
+        metric.set({ quantile: '0.5' }, lagSeconds(loopDelay.percentile(50)));
+        metric.set({ quantile: '0.99' }, lagSeconds(loopDelay.percentile(99)));
+        metric.set({ quantile: '1' }, lagSeconds(loopDelay.max));
+        loopDelay.reset();
+    }
+});
+
+gauge({
+    name: 'nodejs_memory_bytes',
+    help: 'Process memory usage',
+    labelNames: ['type'],
+    collect(metric) {
+        const usage = process.memoryUsage();
+        metric.set({ type: 'rss' }, usage.rss);
+        metric.set({ type: 'heap_total' }, usage.heapTotal);
+        metric.set({ type: 'heap_used' }, usage.heapUsed);
+        metric.set({ type: 'external' }, usage.external);
+        metric.set({ type: 'array_buffers' }, usage.arrayBuffers);
+    }
+});
+
+function metricsText() {
+    let text = '';
+    for (const metric of registry.values()) {
+        text += metric.render();
+    }
+    return text;
+}
+
+module.exports = {
+    counter,
+    gauge,
+    histogram,
+    metricsText,
+    CONTENT_TYPE: 'text/plain; version=0.0.4; charset=utf-8'
+};
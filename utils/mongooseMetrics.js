@@ -0,0 +1,68 @@
+const mongoose = require('mongoose');
+const metrics = require('./metrics');
+
+// Times every mongoose query, aggregation and document save. Global
+// plugins only apply to schemas compiled after they are registered, so
+// this must be required before any model (see server.js).
+const operationDuration = metrics.histogram({
+    name: 'mongodb_operation_duration_seconds',
+    help: 'Mongoose operation latency',
+    labelNames: ['model', 'operation', 'outcome'],
+    buckets: [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+});
+
+const QUERY_OPERATIONS = [
+    'countDocuments', 'deleteMany', 'deleteOne', 'distinct', 'estimatedDocumentCount',
+    'find', 'findOne', 'findOneAndDelete', 'findOneAndReplace', 'findOneAndUpdate',
+    'replaceOne', 'updateMany', 'updateOne'
+];
+
+const START = Symbol('metricsStart');
+
+function observe(target, model, operation, outcome) {
+    if (target[START] === undefined) return;
+    operationDuration.observe({ model, operation, outcome }, Number(process.hrtime.bigint() - target[START]) / 1e9);
+    target[START] = undefined;
+}
+
+function start() {
+    this[START] = process.hrtime.bigint();
+}
+
+function queryMetricsPlugin(schema) {
+    schema.pre(QUERY_OPERATIONS, { document: false, query: true }, start);
+    schema.post(QUERY_OPERATIONS, { document: false, query: true }, function() {
+        observe(this, this.model.modelName, this.op, 'success');
+    });
+    schema.post(QUERY_OPERATIONS, { document: false, query: true }, function(error, res, next) {
+        observe(this, this.model.modelName, this.op, 'error');
+        next(error);
+    });
+
+    schema.pre('aggregate', start);
+    schema.post('aggregate', function() {
+        observe(this, this.model().modelName, 'aggregate', 'success');
+    });
+    schema.post('aggregate', function(error, res, next) {
+        observe(this, this.model().modelName, 'aggregate', 'error');
+        next(error);
+    });
+
+    // Subdocuments run save hooks too; only time the top-level document
+    schema.pre('save', function() {
+        if (!this.$isSubdocument) this[START] = process.hrtime.bigint();
+    });
+    schema.post('save', function(doc) {
+        observe(this, doc.constructor.modelName, 'save', 'success');
+    });
+    schema.post('save', function(error, doc, next) {
+        observe(this, this.constructor.modelName, 'save', 'error');
+        next(error);
+    });
+}
+
+mongoose.plugin(queryMetricsPlugin);
+
+module.exports = {
+    operationDuration
+};
@@ -0,0 +1,88 @@
+// Bounded LRU map whose entries also expire `ttlMs` after being set.
+// Map iteration order doubles as recency order, as in analysisCache.
+class TtlCache {
+    constructor({ maxEntries = 1000, ttlMs = 60000 } = {}) {
+        this.maxEntries = maxEntries;
+        this.ttlMs = ttlMs;
+        this.entries = new Map();
+        this.loading = new Map();
+        this.stats = { hits: 0, misses: 0, evictions: 0, invalidations: 0 };
+    }
+
+    get(key) {
+        const entry = this.entries.get(key);
+        if (!entry || entry.expiresAt <= Date.now()) {
+            if (entry) this.entries.delete(key);
+            this.stats.misses += 1;
+            return undefined;
+        }
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        this.stats.hits += 1;
+        return entry.value;
+    }
+
+    set(key, value) {
+        this.entries.delete(key);
+        this.entries.set(key, { value, expiresAt: Date.now() + this.ttlMs });
+
+        while (this.entries.size > this.maxEntries) {
+            const [oldestKey] = this.entries.keys();
+            this.entries.delete(oldestKey);
+            this.stats.evictions += 1;
+        }
+    }
+
+    // Returns the cached value or caches what `load()` resolves to. A
+    // delete() that lands while the load is in flight keeps its (possibly
+    // outdated) result out of the cache. null/undefined are not cached.
+    async getOrLoad(key, load) {
+        const cached = this.get(key);
+        if (cached !== undefined) return cached;
+
+        const ticket = { stale: false };
+        this.loading.set(key, ticket);
+
+        let value;
+        try {
+            value = await load();
+        } finally {
+            if (this.loading.get(key) === ticket) this.loading.delete(key);
+        }
+
+        if (!ticket.stale && value !== undefined && value !== null) {
+            this.set(key, value);
+        }
+        return value;
+    }
+
+    delete(key) {
+        if (this.entries.delete(key)) {
+            this.stats.invalidations += 1;
+        }
+        const ticket = this.loading.get(key);
+        if (ticket) ticket.stale = true;
+    }
+
+    clear() {
+        this.entries.clear();
+        for (const ticket of this.loading.values()) {
+            ticket.stale = true;
+        }
+    }
+
+    get size() {
+        return this.entries.size;
+    }
+
+    getStats() {
+        return {
+            entries: this.entries.size,
+            maxEntries: this.maxEntries,
+            ttlMs: this.ttlMs,
+            ...this.stats
+        };
+    }
+}
+
+module.exports = { TtlCache };